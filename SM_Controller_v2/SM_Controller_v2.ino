@@ -0,0 +1,197 @@
+//framed binary protocol for the probe stepper, the host side is FramedStepper in stepper.py
+//frame: 0xA5 cmd len payload[len] checksum, checksum is the xor of cmd, len and payload
+//positions are absolute step counts as little endian int32, the zero limit switch is the origin
+
+//pin assignments, same wiring as SM_Controller
+int stp=2; //pin connected to easydriver stp port
+int dir=3; //pin connected to easydriver dir port
+int pls=4; //pin location of positive limit switch
+int plsanalog=A1; //pin to read analog voltage output of the positive limit switch
+int zlsanalog=A2; //pin to read analog voltage output of the zero limit switch 
+int zls=5; //pin location of zero limit switch 
+int ms1=6;//pin to control step size 
+int ms2=7;//pin to control step size 
+
+//protocol
+const byte SYNC=0xA5;
+const byte CMD_MOVE_TO=0x01; //int32 target
+const byte CMD_STOP=0x02;
+const byte CMD_ZERO=0x03;
+const byte CMD_STATUS=0x04;
+const byte EVT_ACK=0x81; //byte command
+const byte EVT_PROGRESS=0x82; //int32 position
+const byte EVT_DONE=0x83; //int32 position
+const byte EVT_LIMIT=0x84; //byte switch, int32 position
+const byte EVT_ERROR=0x85; //byte code
+const byte EVT_POSITION=0x86; //int32 position
+const byte LIMIT_POS=1;
+const byte LIMIT_ZERO=2;
+const byte ERR_LENGTH=1;
+const byte ERR_CHECKSUM=2;
+const byte ERR_COMMAND=3;
+
+//motion, 2 ms per step matches the pulse timing of SM_Controller
+const unsigned long STEP_PERIOD_US=2000;
+const unsigned int PULSE_US=20;
+const long PROGRESS_STEPS=500; //progress report interval
+const int SWITCH_LEVEL=300; //analog reading below this means the switch is pressed
+
+long position=0; //current position in steps
+long target=0; //goal of the current move
+bool moving=false;
+unsigned long last_step=0;
+long since_progress=0;
+
+//receive state
+byte rx[8];
+byte rx_cmd;
+byte rx_len;
+byte rx_count;
+byte rx_sum;
+byte rx_state=0;
+
+void setup() {
+  Serial.begin(115200);
+  pinMode(stp,OUTPUT);
+  pinMode(dir,OUTPUT);
+  pinMode(ms1,OUTPUT);
+  pinMode(ms2,OUTPUT);
+  pinMode(pls,INPUT_PULLUP);
+  pinMode(zls,INPUT_PULLUP);
+  resetPins(); }
+
+void loop() {
+  //commands are parsed between steps so a STOP takes effect at once
+  while (Serial.available()>0){
+    parseByte(Serial.read()); }
+  if (moving && micros()-last_step>=STEP_PERIOD_US){
+    last_step=micros();
+    stepOnce(); }
+}
+
+void parseByte(byte b){
+  switch (rx_state){
+    case 0:
+      if (b==SYNC){rx_state=1;}
+      break;
+    case 1:
+      rx_cmd=b;
+      rx_sum=b;
+      rx_state=2;
+      break;
+    case 2:
+      rx_len=b;
+      rx_sum^=b;
+      rx_count=0;
+      if (rx_len>sizeof(rx)){sendByte(EVT_ERROR,ERR_LENGTH); rx_state=0;}
+      else if (rx_len==0){rx_state=4;}
+      else {rx_state=3;}
+      break;
+    case 3:
+      rx[rx_count++]=b;
+      rx_sum^=b;
+      if (rx_count==rx_len){rx_state=4;}
+      break;
+    case 4:
+      rx_state=0;
+      if (b!=rx_sum){sendByte(EVT_ERROR,ERR_CHECKSUM);}
+      else {handleCommand();}
+      break; }
+}
+
+void handleCommand(){
+  if (rx_cmd==CMD_MOVE_TO && rx_len==4){
+    target=readLong(rx);
+    sendByte(EVT_ACK,rx_cmd);
+    if (target==position){moving=false; sendPosition(EVT_DONE);}
+    else {
+      digitalWrite(dir,target>position ? HIGH : LOW);
+      since_progress=0;
+      moving=true; }
+    }
+  else if (rx_cmd==CMD_STOP){
+    sendByte(EVT_ACK,rx_cmd);
+    if (moving){moving=false; resetPins(); sendPosition(EVT_DONE);}
+    }
+  else if (rx_cmd==CMD_ZERO){
+    moving=false;
+    position=0;
+    target=0;
+    resetPins();
+    sendByte(EVT_ACK,rx_cmd);
+    }
+  else if (rx_cmd==CMD_STATUS){
+    sendPosition(EVT_POSITION);
+    }
+  else {sendByte(EVT_ERROR,ERR_COMMAND);}
+}
+
+void stepOnce(){
+  bool forward=target>position;
+  if (analogRead(forward ? plsanalog : zlsanalog)<SWITCH_LEVEL){
+    backOff(forward);
+    return; }
+  Pulse();
+  position+=forward ? 1 : -1;
+  if (position==target){
+    moving=false;
+    resetPins();
+    sendPosition(EVT_DONE);
+    return; }
+  if (++since_progress>=PROGRESS_STEPS){
+    since_progress=0;
+    sendPosition(EVT_PROGRESS); }
+}
+
+void backOff(bool forward){
+  //step back off the switch like SM_Controller does, then report where we stopped
+  int sensor=forward ? plsanalog : zlsanalog;
+  digitalWrite(dir,forward ? LOW : HIGH);
+  while (analogRead(sensor)<SWITCH_LEVEL){
+    Pulse();
+    delayMicroseconds(STEP_PERIOD_US);
+    position+=forward ? -1 : 1; }
+  moving=false;
+  if (!forward){position=0;}
+  target=position;
+  resetPins();
+  byte payload[5];
+  payload[0]=forward ? LIMIT_POS : LIMIT_ZERO;
+  writeLong(payload+1,position);
+  sendFrame(EVT_LIMIT,payload,5);
+}
+
+void Pulse(){
+  digitalWrite(stp,HIGH);
+  delayMicroseconds(PULSE_US);
+  digitalWrite(stp,LOW); }
+
+void resetPins(){
+  digitalWrite(stp,LOW);
+  digitalWrite(dir,LOW);
+  digitalWrite(ms1,LOW);
+  digitalWrite(ms2,LOW);}
+
+long readLong(byte *p){
+  return (long)p[0] | ((long)p[1]<<8) | ((long)p[2]<<16) | ((long)p[3]<<24); }
+
+void writeLong(byte *p,long value){
+  for (int i=0;i<4;i++){p[i]=(value>>(8*i)) & 0xFF;} }
+
+void sendFrame(byte cmd,byte *payload,byte len){
+  byte sum=cmd^len;
+  Serial.write(SYNC);
+  Serial.write(cmd);
+  Serial.write(len);
+  for (byte i=0;i<len;i++){
+    Serial.write(payload[i]);
+    sum^=payload[i]; }
+  Serial.write(sum); }
+
+void sendByte(byte cmd,byte value){
+  sendFrame(cmd,&value,1); }
+
+void sendPosition(byte cmd){
+  byte payload[4];
+  writeLong(payload,position);
+  sendFrame(cmd,payload,4); }
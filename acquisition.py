@@ -0,0 +1,185 @@
+#background acquisition, one worker drives the scope and stepper while another writes and analyses shots
+import threading
+import queue
+import logging
+import time
+
+import telemetry
+from scan_scheduler import ScanPlan,move_to
+
+class Cancelled(Exception):
+    pass
+
+class Acquisition:
+    def __init__(self,read_shot,writer,plan=None,delay=0.0,stepper=None,analyse=None,queue_size=16,check=None,retries=0):
+        #plan is a ScanPlan, shots at one position are written while the probe moves to the next
+        #read_shot returns a shot, or (shot,meta) when it has its own metadata to record
+        #delay is only needed when read_shot does not wait for a trigger itself
+        #check(shot) returns the reasons a shot is bad (quality.ShotCheck), a rejected shot is taken again
+        #up to retries times, after that the last read is written with its reasons in meta['quality'] so a
+        #dead source cannot stall the run and the shot is still there to look at
+        self.read_shot = read_shot
+        self.writer = writer
+        self.plan = plan or ScanPlan.stationary(1)
+        self.delay = delay
+        self.stepper = stepper
+        self.analyse = analyse
+        self.check = check
+        self.retries = retries
+
+        self.total = self.plan.total
+        self.acquired = 0
+        self.rejected = 0
+        self.flagged = 0
+        self.reasons = {}
+        self.written = 0
+        self.results = []
+        self.error = None
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._cancel = threading.Event()
+        self._running = threading.Event()
+        self._running.set()
+        self._producer = threading.Thread(target=self._produce,name='acquire',daemon=True)
+        self._consumer = threading.Thread(target=self._consume,name='write',daemon=True)
+
+    def start(self):
+        self._producer.start()
+        self._consumer.start()
+        return self
+
+    def cancel(self):
+        self._cancel.set()
+        self._running.set()
+
+    def pause(self):
+        self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    @property
+    def paused(self):
+        return not self._running.is_set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def done(self):
+        return not (self._producer.is_alive() or self._consumer.is_alive())
+
+    def join(self,timeout=None):
+        self._producer.join(timeout)
+        self._consumer.join(timeout)
+
+    def _checkpoint(self):
+        self._running.wait()
+        if self._cancel.is_set():
+            raise Cancelled()
+
+    def _sleep(self,seconds):
+        if self._cancel.wait(seconds):
+            raise Cancelled()
+
+    def _put(self,item):
+        #bounded queue, keep checking for cancel while the writer catches up
+        while True:
+            try:
+                self._queue.put(item,timeout=0.1)
+                return
+            except queue.Full:
+                if self._cancel.is_set() and item is not None:
+                    raise Cancelled()
+
+    def _produce(self):
+        try:
+            for target in self.plan:
+                self._checkpoint()
+                if target is not None:
+                    with telemetry.span('move',target=target):
+                        move_to(self.stepper,target)
+                position = self.stepper.mm_loc if self.stepper is not None else None
+                for j in range(self.plan.samples):
+                    data,meta = self._acquire(position)
+                    with telemetry.span('queue'):
+                        self._put((data,meta))
+                    self.acquired += 1
+                    telemetry.count('shots.acquired')
+                    if self.delay:
+                        with telemetry.span('sleep'):
+                            self._sleep(self.delay)
+        except Cancelled:
+            logging.info('Acquisition cancelled after {} shots'.format(self.acquired))
+        except Exception as e:
+            logging.exception('Acquisition failed')
+            self.error = e
+        finally:
+            self._put(None)
+            if self.plan.return_to is not None and self.stepper is not None:
+                logging.info('Returning to {:.2f}mm'.format(self.plan.return_to))
+                move_to(self.stepper,self.plan.return_to)
+
+    def _acquire(self,position):
+        #(shot,meta) of the first read that passes the check, or of the last one when every retry failed
+        attempts = 0
+        while True:
+            self._checkpoint()
+            with telemetry.span('read'):
+                data = self.read_shot()
+            meta = {'position':position,'timestamp':time.time()}
+            if isinstance(data,tuple):
+                data,extra = data
+                meta.update(extra)
+            if self.check is None:
+                return data,meta
+            with telemetry.span('check'):
+                reasons = self.check(data)
+            if not reasons:
+                return data,meta
+            self.rejected += 1
+            telemetry.count('shots.rejected')
+            for reason in reasons:
+                self.reasons[reason] = self.reasons.get(reason,0) + 1
+            if attempts < self.retries:
+                attempts += 1
+                logging.warning('Shot rejected ({}), taking it again'.format(', '.join(reasons)))
+                if self.delay:
+                    with telemetry.span('sleep'):
+                        self._sleep(self.delay)
+                continue
+            self.flagged += 1
+            telemetry.count('shots.flagged')
+            logging.warning('Shot rejected ({}) with no retries left, written flagged'.format(', '.join(reasons)))
+            meta['quality'] = reasons
+            return data,meta
+
+    def _consume(self):
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                data,meta = item
+                with telemetry.span('write'):
+                    self.writer.append(data,**meta)
+                if self.analyse is not None:
+                    try:
+                        with telemetry.span('analyse'):
+                            self.results.append((meta['position'],self.analyse(data)))
+                    except Exception as e:
+                        logging.warning('Analysis of shot {} failed: {}'.format(self.written,e))
+                self.written += 1
+                telemetry.count('shots.written')
+        except Exception as e:
+            logging.exception('Writing shots failed')
+            self.error = e
+            self.cancel()
+            #drain so the producer is never left blocked on a full queue
+            while self._producer.is_alive() or not self._queue.empty():
+                try:
+                    self._queue.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+        finally:
+            self.writer.close()
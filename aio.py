@@ -0,0 +1,197 @@
+#asyncio layer over the scope and stepper so motion and triggers can be awaited together, with timeouts
+#and cancellation; runs and scans are still taken by acquisition.Acquisition, this is for scripts
+#pyvisa and the legacy stepper block, so they run on one worker thread per instrument,
+#the framed stepper protocol is read straight off the port without blocking
+import time
+import struct
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import scope
+import stepper
+import telemetry
+
+class AsyncScope:
+    #every call goes through a single thread so the instrument only ever sees one request at a time
+    def __init__(self,session,poll=0.005):
+        self.session = session if isinstance(session,scope.ScopeSession) else scope.ScopeSession(session)
+        self.poll = poll
+        self.executor = ThreadPoolExecutor(max_workers=1,thread_name_prefix='visa')
+
+    async def call(self,fn,*args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor,fn,*args)
+
+    async def setup(self):
+        return await self.call(self.session.ensure)
+
+    async def query(self,cmd):
+        return await self.call(self.session.resource.query,cmd)
+
+    async def arm(self):
+        await self.call(scope.arm,self.session.resource)
+
+    async def run_continuous(self):
+        await self.call(scope.run_continuous,self.session.resource)
+
+    async def wait_for_trigger(self,timeout=10.0):
+        #ACQ:STATE? is polled rather than a blocking *OPC? so waiting can be cancelled between polls
+        async def poll():
+            while int((await self.query('ACQ:STATE?')).strip()) != 0:
+                await asyncio.sleep(self.poll)
+        await asyncio.wait_for(poll(),timeout)
+
+    async def read(self):
+        return await self.call(self.session.read)
+
+    async def read_codes(self):
+        return await self.call(self.session.read_codes)
+
+    async def capture(self,trigger=True,timeout=10.0,codes=False):
+        if trigger:
+            await self.arm()
+            await self.wait_for_trigger(timeout)
+        return await (self.read_codes() if codes else self.read())
+
+    def close(self):
+        self.executor.shutdown()
+
+class SerialTransport:
+    #non blocking reads off a pyserial port (or a stand-in with in_waiting), frames are parsed as they arrive
+    def __init__(self,ser,poll=0.002):
+        self.ser = ser
+        self.poll = poll
+        self.reader = stepper.FrameReader()
+        self.frames = []
+
+    def send(self,cmd,payload=b''):
+        self.ser.write(stepper.frame(cmd,payload))
+        telemetry.count('stepper.frames_sent')
+
+    def drain(self):
+        #every frame received so far, taken out of the way of the next command
+        waiting = self.ser.in_waiting
+        if waiting:
+            self.frames += self.reader.feed(self.ser.read(waiting))
+        frames,self.frames = self.frames,[]
+        return frames
+
+    async def read_frame(self,timeout=None):
+        #the timeout is checked here rather than with a nested wait_for, which can swallow an outer cancel
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        while not self.frames:
+            waiting = self.ser.in_waiting
+            if waiting:
+                self.frames += self.reader.feed(self.ser.read(waiting))
+            elif deadline is not None and loop.time() > deadline:
+                raise asyncio.TimeoutError()
+            else:
+                await asyncio.sleep(self.poll)
+        telemetry.count('stepper.frames_received')
+        return self.frames.pop(0)
+
+class AsyncFramedStepper:
+    #moves on SM_Controller_v2 that can be awaited, timed out and cancelled (cancelling stops the motor)
+    def __init__(self,ser,margin=2.0):
+        self.transport = SerialTransport(ser)
+        self.margin = margin
+        self.mm_loc = 0.0
+        self.step_loc = 0
+        self.transport.send(stepper.CMD_ZERO)
+
+    def _set_steps(self,steps):
+        self.step_loc = steps
+        self.mm_loc = steps / stepper.STEPS_PER_MM
+
+    async def _next(self):
+        #silence longer than one progress interval plus margin means the controller is gone
+        timeout = 500.0 / stepper.STEPS_PER_SECOND + self.margin
+        try:
+            return await self.transport.read_frame(timeout)
+        except asyncio.TimeoutError:
+            raise IOError('Stepper controller stopped responding at {:.2f} mm'.format(self.mm_loc))
+
+    async def move_to(self,mm):
+        goal = int(round(mm*stepper.STEPS_PER_MM))
+        #frames before the ack of this move are left over from an earlier one, e.g. the ack and done that
+        #follow the stop sent when a move is cancelled, and must not end this one
+        for cmd,payload in self.transport.drain():
+            if cmd in (stepper.EVT_PROGRESS,stepper.EVT_POSITION,stepper.EVT_DONE):
+                self._set_steps(struct.unpack('<i',payload)[0])
+        self.transport.send(stepper.CMD_MOVE_TO,struct.pack('<i',goal))
+        acked = False
+        try:
+            while True:
+                cmd,payload = await self._next()
+                if not acked and cmd != stepper.EVT_ERROR:
+                    if cmd == stepper.EVT_ACK and payload[:1] == bytes([stepper.CMD_MOVE_TO]):
+                        acked = True
+                    elif cmd in (stepper.EVT_PROGRESS,stepper.EVT_POSITION,stepper.EVT_DONE):
+                        self._set_steps(struct.unpack('<i',payload)[0])
+                    continue
+                if cmd in (stepper.EVT_PROGRESS,stepper.EVT_POSITION):
+                    self._set_steps(struct.unpack('<i',payload)[0])
+                elif cmd == stepper.EVT_DONE:
+                    self._set_steps(struct.unpack('<i',payload)[0])
+                    return 'normal'
+                elif cmd == stepper.EVT_LIMIT:
+                    which,steps = struct.unpack('<Bi',payload)
+                    self._set_steps(steps)
+                    telemetry.count('stepper.limits')
+                    return 'pos_limit' if which == stepper.LIMIT_POS else 'neg_limit'
+                elif cmd == stepper.EVT_ERROR:
+                    logging.error('Stepper controller rejected a frame, code {}'.format(payload[0]))
+                    return None
+        except asyncio.CancelledError:
+            self.transport.send(stepper.CMD_STOP)
+            logging.info('Move cancelled at {:.2f} mm'.format(self.mm_loc))
+            raise
+
+    async def go_to(self,disp):
+        return await self.move_to(self.mm_loc + disp)
+
+class AsyncBlockingStepper:
+    #any other stepper (the legacy SM_Controller) on its own thread, a cancelled move finishes its current chunk
+    def __init__(self,device):
+        self.device = device
+        self.executor = ThreadPoolExecutor(max_workers=1,thread_name_prefix='stepper')
+
+    @property
+    def mm_loc(self):
+        return self.device.mm_loc
+
+    async def move_to(self,mm):
+        return await asyncio.get_running_loop().run_in_executor(self.executor,self.device.move_to,mm)
+
+    async def go_to(self,disp):
+        return await self.move_to(self.device.mm_loc + disp)
+
+if __name__=='__main__':
+    import fake_visa
+    import stepper_sim
+
+    logging.basicConfig(level=logging.INFO)
+
+    async def main():
+        #a shot is taken while the probe moves, then a move that is timed out and a trigger that never comes
+        scope_io = AsyncScope(fake_visa.FakeScope(seed=0,rep_rate=20.0))
+        await scope_io.setup()
+        motor = AsyncFramedStepper(stepper_sim.SimulatedController(speed=100.0))
+        t = time.perf_counter()
+        result,shot = await asyncio.gather(motor.move_to(4.0),scope_io.capture())
+        print('{} at {:.2f} mm and a {} shot in {:.2f} s'.format(result,motor.mm_loc,shot.shape,time.perf_counter() - t))
+        try:
+            await asyncio.wait_for(motor.move_to(50.0),0.05)
+        except asyncio.TimeoutError:
+            print('move timed out at {:.2f} mm'.format(motor.mm_loc))
+        print(await motor.move_to(0.0),'back at {:.2f} mm'.format(motor.mm_loc))
+        scope_io.session.resource.rep_rate = 0.01
+        await scope_io.arm()
+        try:
+            await scope_io.wait_for_trigger(timeout=0.1)
+        except asyncio.TimeoutError:
+            print('no trigger within 0.1 s')
+        scope_io.close()
+
+    asyncio.run(main())
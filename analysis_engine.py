@@ -0,0 +1,179 @@
+#parallel shot analysis with an on-disk cache of per-shot results
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+import probe_math as pmath
+import shot_store
+
+CACHE_FILE = '.lprobe_cache.sqlite'
+
+#density is cached for A = M = 1 and scaled on the way out, so only these need a recompute
+WINDOW_PARAMS = ('buffer_size','threshold','V_bias')
+DEFAULTS = {'buffer_size':0.2,'threshold':40,'V_bias':100,'A':0.66,'M':40}
+
+def source_id(source,created=None):
+    #path and version of a shot, text files change with mtime, run shots never change once written
+    if isinstance(source,tuple):
+        base,index = source
+        if created is None:
+            created = {}
+        if not base in created:
+            with open(base + shot_store.INDEX_EXT) as f:
+                created[base] = json.loads(f.readline())['created']
+        return '{}#{}'.format(os.path.abspath(base),index),created[base]
+    return os.path.abspath(source),os.path.getmtime(source)
+
+def _analyze_chunk(sources,params,skiprows=0):
+    shots = shot_store.load_shots(sources,skiprows)
+    return pmath.calc_plasma_props_batch(shots,A=1.0,M=1.0,**params)
+
+class ShotCache:
+    def __init__(self,path=CACHE_FILE,max_entries=200000):
+        self.path = path
+        self.max_entries = max_entries
+        self.db = sqlite3.connect(path)
+        self.db.execute('CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, path TEXT, version REAL, '
+                        'params TEXT, result BLOB, used REAL)')
+        self.db.commit()
+
+    def key(self,path,version,params):
+        return hashlib.sha1(json.dumps([path,version,params],sort_keys=True).encode()).hexdigest()
+
+    def get(self,keys):
+        found = {}
+        for start in range(0,len(keys),500):
+            chunk = keys[start:start+500]
+            rows = self.db.execute('SELECT key,result FROM results WHERE key IN ({})'.format(','.join('?'*len(chunk))),chunk)
+            for key,result in rows:
+                found[key] = np.frombuffer(result,dtype=float)
+        if found:
+            now = time.time()
+            self.db.executemany('UPDATE results SET used=? WHERE key=?',[(now,key) for key in found])
+            self.db.commit()
+        return found
+
+    def put(self,entries):
+        #entries are (key,path,version,params,result)
+        now = time.time()
+        self.db.executemany('INSERT OR REPLACE INTO results VALUES (?,?,?,?,?,?)',
+                            [(key,path,version,json.dumps(params,sort_keys=True),np.asarray(result,dtype=float).tobytes(),now)
+                             for key,path,version,params,result in entries])
+        self.db.commit()
+        self.evict()
+
+    def evict(self):
+        #least recently used entries go first
+        count = self.db.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+        if count > self.max_entries:
+            self.db.execute('DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY used LIMIT ?)',
+                            (count - self.max_entries,))
+            self.db.commit()
+
+    def clear(self):
+        self.db.execute('DELETE FROM results')
+        self.db.commit()
+
+    def __len__(self):
+        return self.db.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+
+    def close(self):
+        self.db.close()
+
+class AnalysisEngine:
+    def __init__(self,cache_path=CACHE_FILE,workers=None,chunk_size=64,max_entries=200000,skiprows=0,**params):
+        #skiprows is the number of header lines of text shots, it does not change results so it is not in the cache key
+        unknown = set(params) - set(DEFAULTS)
+        if unknown:
+            raise TypeError('Unknown analysis parameters {}'.format(sorted(unknown)))
+        self.params = dict(DEFAULTS,**params)
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.skiprows = skiprows
+        #worker processes are started on the first parallel batch and kept until close()
+        self.pool = None
+        self.cache = ShotCache(cache_path,max_entries) if cache_path else None
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def window_params(self):
+        return {name:self.params[name] for name in WINDOW_PARAMS}
+
+    def _compute(self,sources):
+        params = self.window_params
+        chunks = [sources[i:i+self.chunk_size] for i in range(0,len(sources),self.chunk_size)]
+        if len(chunks) <= 1 or self.workers == 1:
+            return np.concatenate([_analyze_chunk(chunk,params,self.skiprows) for chunk in chunks])
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(self.workers)
+        return np.concatenate(list(self.pool.map(_analyze_chunk,chunks,[params]*len(chunks),[self.skiprows]*len(chunks))))
+
+    def analyze(self,sources):
+        #(n,4) rows of mean T, std T, mean density, std density for each shot source
+        sources = list(sources)
+        result = np.empty((len(sources),4))
+        if not sources:
+            return result
+
+        params = self.window_params
+        created = {}
+        ids = [source_id(source,created) for source in sources]
+        if self.cache is not None:
+            keys = [self.cache.key(path,version,params) for path,version in ids]
+            cached = self.cache.get(keys)
+        else:
+            keys = [None]*len(sources)
+            cached = {}
+
+        missing = [i for i,key in enumerate(keys) if not key in cached]
+        for i,key in enumerate(keys):
+            if key in cached:
+                result[i] = cached[key]
+        if missing:
+            computed = self._compute([sources[i] for i in missing])
+            result[missing] = computed
+            if self.cache is not None:
+                self.cache.put([(keys[i],ids[i][0],ids[i][1],params,row) for i,row in zip(missing,computed)])
+        self.hits += len(sources) - len(missing)
+        self.misses += len(missing)
+        logging.debug('Analyzed {} shots, {} from cache'.format(len(sources),len(sources) - len(missing)))
+
+        scale = self.params['M']**0.5 / self.params['A']
+        result[:,2:] *= scale
+        return result
+
+    def analyze_folder(self,folder,position=None):
+        sources = shot_store.folder_shots(folder,position=position)
+        return sources,self.analyze(sources)
+
+    def walk(self,root):
+        #every run or text shot folder under a day folder, {folder:(sources,results)}
+        results = {}
+        for folder,dirs,files in os.walk(root):
+            dirs.sort()
+            if shot_store.is_run(folder) or any(shot_store.TEXT_SHOT.match(name) for name in files):
+                results[folder] = self.analyze_folder(folder)
+        return results
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+        if self.cache is not None:
+            self.cache.close()
+
+if __name__=='__main__':
+    import sys
+    logging.basicConfig(level=logging.INFO)
+    engine = AnalysisEngine()
+    for root in sys.argv[1:] or ['data']:
+        for folder,(sources,results) in engine.walk(root).items():
+            logging.info('{}: {} shots, T = {:.3} eV, n = {:.3e} cm^-3'.format(
+                folder,len(sources),np.nanmean(results[:,0]),np.nanmean(results[:,2])))
+    logging.info('{} cached, {} computed'.format(engine.hits,engine.misses))
@@ -2,54 +2,55 @@ import numpy as np
 import logging
 import matplotlib.pyplot as plt
 import probe_math as pmath
+import decimate
+import catalog
+import shot_store
 
 def plot_data(data):
     fig,ax = plt.subplots()
 
     for i in range(1,5):
-        ax.plot(data[0],data[i])
+        decimate.plot(ax,data[0],data[i])
     
     fig2,ax2 = plt.subplots()
-    ax2.plot(data[0],data[3]-data[4])
-    ax2.plot(data[0],data[3]-data[1])
+    decimate.plot(ax2,data[0],data[3]-data[4])
+    decimate.plot(ax2,data[0],data[3]-data[1])
      
 def calc(data,ax=''):
     #fig,ax = plt.subplots()
     #data = pmath.apply_filter(data)
     return pmath.calculate_plasma_params(data,ax2=ax)
     
-def scan_plot():
-    base_filename = 'data/08_03_2018'
-    key = np.loadtxt('{}/run_key.txt'.format(base_filename),skiprows=1)
+def scan_plot(date='08_03_2018',cat=None,skiprows=1,engine=None):
+    #the 08_03_2018 shots start with a header line, skiprows=0 for days without one
+    #shots go through calculate_plasma_trace and the trigger window like calc, in one batch per run;
+    #an analysis_engine.AnalysisEngine can be passed instead for its cache and worker processes, it uses
+    #the shunt current and a current threshold window (calc_plasma_props_batch) so its values differ
+    cat = cat or catalog.Catalog()
+    #pressure and solenoid current come from run_key.txt through the catalog
+    runs = [run for run in cat.runs(date=date,kind='raw') if run.solenoid_current is not None]
     
     #plot the plasma density vs chamber pressure w/ different lines for each solenoid value
-    unique_solenoid_currents = np.unique(key.T[3])
-    
-    #sort points into bins for each solenoid current
-    bins = [[] for i in range(len(unique_solenoid_currents))]
-    
-    for ele in key:
-        bins[np.where(unique_solenoid_currents==ele[3])[0][0]].append(ele)
-        
+    unique_solenoid_currents = np.unique([run.solenoid_current for run in runs])
         
     plot_data = []    
         
-    for bin in bins:
-        shots = np.array(bin)
-        #logging.info(shots)
+    for solenoid_current in unique_solenoid_currents:
         temp = []
-        for shot in shots:
-            index = shot[0]
-            pressure = shot[1]
+        for run in runs:
+            if run.solenoid_current != solenoid_current:
+                continue
+            pressure = run.pressure
             
             #average over 10 shots
             n_samples = 10
-            dens = []
-            for i in range(n_samples):
-                data = np.loadtxt('data/08_03_2018/{}/data_{}.txt'.format(int(index),i),skiprows=1).T
-                plasma_density,plasma_temp = calc(data)
-                dens.append(plasma_temp[0])
-            ndens = np.asfarray(dens)
+            sources = [shot.source for shot in cat.shots(date=date,kind='raw',number=run.number)][:n_samples]
+            if engine is None:
+                results = pmath.calc_trace_params_batch(shot_store.load_shots(sources,skiprows))
+            else:
+                engine.skiprows = skiprows
+                results = engine.analyze(sources)
+            ndens = results[:,0]
             avg = np.mean(ndens)
             std = np.std(ndens)
             
@@ -57,7 +58,7 @@ def scan_plot():
                 temp.append([pressure,avg,std])
             #logging.info(temp[-1])
             
-        plot_data.append(np.asfarray(temp))
+        plot_data.append(np.array(temp,dtype=float).reshape(-1,3))
     #logging.info(plot_data)
     #plotting
     fig,ax = plt.subplots()
@@ -1,12 +1,15 @@
 import numpy as np
-import numpy.ma as ma
-import matplotlib.pyplot as plt
 import probe_math as pmath
-from scipy.ndimage import filters
+import shot_store
+import windows
+import catalog
+from analysis_engine import AnalysisEngine
 import logging
 
-def calc_plasma_prop(fname,plotting=False):
-    data = np.loadtxt(fname).T
+#matplotlib is only imported by the functions that plot, so the tables can be made headless
+
+def calc_plasma_prop(fname,plotting=False,policy=None):
+    data = shot_store.load_shot(fname)
     
     t = data[0]
     F = data[1]
@@ -15,105 +18,134 @@ def calc_plasma_prop(fname,plotting=False):
     low = data[4]
 
     #get t range where we want to calculate properties
-    buffer_size = 0.2
-    indicies = np.argwhere(current > 40)
-    l = len(indicies)
-    indicies = indicies[int(l*buffer_size):-int(l*buffer_size)]
-
-    mask_array = np.ones(len(t))
-    mask_array[indicies] = 0
+    start,stop,mask = (policy or windows.Threshold(40,0.2)).select(data)
+    window = windows.samples(start,stop,mask)
     
-    
-    signals = [t,F,high,low,current]
-    msignals = []
-    for signal in signals:
-        msignals.append(ma.array(signal,mask=mask_array))
-        
-    shunt_current = (msignals[2]-msignals[3])/98
+    shunt_current = (high[window]-low[window])/98
     
     A = 0.66 #mm^2 (probe cross section area
     M = 40 #effective ion weight
     V_bias = 100
         
-    T = pmath.T_e(msignals[2]-msignals[1],V_bias)    
-    density = (M**0.5 / A) * shunt_current*1e6*pmath.f1(msignals[2]-msignals[1],T)
+    T = pmath.T_e(high[window]-F[window],V_bias)    
+    density = (M**0.5 / A) * shunt_current*1e6*pmath.f1(high[window]-F[window],T)
 
 
     if plotting:
+        import matplotlib.pyplot as plt
+        import os
+        import decimate
+        #pyramids of a shot file are kept, so plotting it again only re-decimates
+        key = (fname,os.path.getmtime(fname),int(start),int(stop)) if isinstance(fname,str) else None
         fig,ax = plt.subplots()
         
 
         labels = ['t','F','high','low','current']
+        signals = [t,F,high,low,current]
         for i in range(1,4):
-            ax.plot(msignals[0],msignals[i],label=labels[i])
+            decimate.plot(ax,t[window],signals[i][window],label=labels[i],key=key and key + (labels[i],))
 
         axa = ax.twinx()
-        axa.plot(t,current)    
+        decimate.plot(axa,t,current,key=key and key + ('current',))    
         ax.legend()
 
         fig2,ax2 = plt.subplots()
-        ax2.plot(t,T,'g')
+        decimate.plot(ax2,t[window],T,'g',key=key and key + ('T',))
         ax3 = ax2.twinx()
-        ax3.semilogy(t,density)
+        decimate.semilogy(ax3,t[window],density,key=key and key + ('density',))
 
     return (np.mean(T),np.std(T),np.mean(density),np.std(density))
 
-def solenoid_scan(indicies,ax):
-    index = indicies
-    scan_vals = [15,20,25,30]
+#columns of the tables made by solenoid_table and longitudinal_table
+TABLE_COLUMNS = ('value','T','std_T','density','std_density')
 
-    #fig,ax = plt.subplots()
-    #ax2 = ax.twinx()
-    
+def summarize(props,owners,keys,shift=0):
+    #one row per key of the mean parameters of its shots, errors are the per shot spreads added in quadrature
     tdata = []
-    for ind,val in zip(index,scan_vals):
-        data = []
-        n_samples = 10
-        for i in range(n_samples):
-            data.append(calc_plasma_prop('11_01_2018/raw/{}/data_{}.txt'.format(ind,i)))
-        ndata = np.asfarray(data).T
+    for key in keys:
+        ndata = props[owners == key].T
+        n_samples = ndata.shape[1]
 
         avg_T = np.mean(ndata[0])
         std_T = np.sqrt(np.sum(ndata[1]**2)) / n_samples
         avg_D = np.mean(ndata[2])
         std_D = np.sqrt(np.sum(ndata[3]**2)) / n_samples
-        tdata.append((val,avg_T,std_T,avg_D,std_D))
-    ntdata = np.asfarray(tdata).T
+        tdata.append((key+shift,avg_T,std_T,avg_D,std_D))
+    return np.array(tdata,dtype=float).reshape(-1,5)
+
+def _analyze(sources,engine=None):
+    #(n,4) parameters of the sources, an engine made here is closed again so its sqlite cache
+    #and worker processes do not outlive the call
+    if engine is not None:
+        return engine.analyze(sources)
+    engine = AnalysisEngine(buffer_size=0.2)
+    try:
+        return engine.analyze(sources)
+    finally:
+        engine.close()
+
+def solenoid_table(indicies,date='11_01_2018',scan_vals=(15,20,25,30),n_samples=10,cat=None,engine=None,propagation=None):
+    #run indicies[i] was taken at solenoid current scan_vals[i]
+    #with an uncertainty.Propagation the errors come from resampling the shots and the constants instead
+    cat = cat or catalog.Catalog()
+    sources = []
+    owners = []
+    groups = []
+    for ind,val in zip(indicies,scan_vals):
+        shots = [shot.source for shot in cat.shots(date=date,kind='raw',number=ind)][:n_samples]
+        sources += shots
+        owners += [val]*len(shots)
+        groups.append((val,shots))
+    if propagation is not None:
+        return propagation.table(groups)
+    return summarize(_analyze(sources,engine),np.array(owners),scan_vals)
+
+def longitudinal_table(date,scan_number,loc=None,shift=0,n_samples=10,cat=None,engine=None,propagation=None):
+    #loc = np.arange(2,26,2), every position in the scan is used when loc is None
+    #errors come from propagation when one is given, as in solenoid_table
+    cat = cat or catalog.Catalog()
+    scan = cat.by_scan(date,scan_number)
+    positions = np.array([shot.position for shot in scan],dtype=float)
+    if loc is None:
+        loc = np.unique(positions[~np.isnan(positions)])
+    
+    sources = []
+    owners = []
+    groups = []
+    for a in loc:
+        shots = [shot.source for shot,p in zip(scan,positions) if abs(p - a) <= 1e-3][:n_samples]
+        sources += shots
+        owners += [a]*len(shots)
+        groups.append((a + shift,shots))
+    if propagation is not None:
+        return propagation.table(groups)
+    return summarize(_analyze(sources,engine),np.array(owners),loc,shift)
+
+def solenoid_scan(indicies,ax,date='11_01_2018',cat=None):
+    #fig,ax = plt.subplots()
+    #ax2 = ax.twinx()
+    ntdata = solenoid_table(indicies,date,cat=cat).T
 
     ax.errorbar(ntdata[0],ntdata[3],ntdata[4],fmt='o',capsize = 3)
 
-def longitudinal_scan(base,loc,scan_number,ax,shift=0):
-    #loc = np.arange(2,26,2)
+def longitudinal_scan(date,scan_number,ax,loc=None,shift=0,cat=None):
     #fig,ax = plt.subplots()
     #ax2 = ax.twinx()
-    
-    tdata = []
-    for a in loc:
-        data = []
-        n_samples = 10
-        for i in range(n_samples):
-            data.append(calc_plasma_prop(base.format(scan_number,a,i)))
-        ndata = np.asfarray(data).T
-
-        avg_T = np.mean(ndata[0])
-        std_T = np.sqrt(np.sum(ndata[1]**2)) / n_samples
-        avg_D = np.mean(ndata[2])
-        std_D = np.sqrt(np.sum(ndata[3]**2)) / n_samples
-        tdata.append((a+shift,avg_T,std_T,avg_D,std_D))
-    ntdata = np.asfarray(tdata).T
+    ntdata = longitudinal_table(date,scan_number,loc,shift,cat=cat).T
     logging.info(ntdata)
     ax[0].errorbar(ntdata[0],ntdata[3],ntdata[4],fmt='o',capsize = 3,label='scan {}'.format(scan_number))
     ax[1].errorbar(ntdata[0],ntdata[1],ntdata[2],fmt='o',capsize = 3,label='scan {}'.format(scan_number))
 
 def longitudinal_plot():
+    import matplotlib.pyplot as plt
     fig,ax = plt.subplots(2,1,sharex=True)
-    longitudinal_scan('data/02_06_2019/scans/scan_{}/data_{}.0mm_{}.txt',np.arange(2,80,2),1,ax)
-    #longitudinal_scan('11_12_2018/scans/scan_{}/data_{}.0mm_{}.txt',np.arange(2,80,2),2,ax)
-    #longitudinal_scan('11_13_2018/scans/scan_{}/data_{}.0mm_{}.txt',np.arange(2,80,2),1,ax)
+    longitudinal_scan('02_06_2019',1,ax,np.arange(2,80,2))
+    #longitudinal_scan('11_12_2018',2,ax,np.arange(2,80,2))
+    #longitudinal_scan('11_13_2018',1,ax,np.arange(2,80,2))
 
-#    longitudinal_scan('11_19_2018/scans/scan_{}/data_{}.0mm_{}.txt',np.arange(52,81,1),0,ax)
-#    longitudinal_scan('11_17_2018/scans/scan_{}/data_{}.0mm_{}.txt',np.arange(4,80,4),1,ax)
-#    longitudinal_scan('11_17_2018/scans/scan_{}/data_{}.0mm_{}.txt',np.arange(4,80,4),2,ax)
+#    longitudinal_scan('11_19_2018',0,ax,np.arange(52,81,1))
+#    longitudinal_scan('11_17_2018',1,ax,np.arange(4,80,4))
+#    longitudinal_scan('11_17_2018',2,ax,np.arange(4,80,4))
     
     for ele in ax:
         ele.legend()
@@ -122,12 +154,14 @@ def longitudinal_plot():
     ax[1].set_ylabel('Electron Temperature [eV]')
     ax[1].set_xlabel('Longitudinal Position')
 
-    #longitudinal_scan(np.arange(2,22,2),2,ax,48)
+    #longitudinal_scan(date,2,ax,np.arange(2,22,2),48)
     
-logging.basicConfig(level = logging.INFO)
-#fig,ax = plt.subplots()
-#solenoid_scan([3,0,2,1],ax)
-#solenoid_scan([4,5,6,7],ax)
-#calc_plasma_prop('11_12_2018/scans/scan_1/data_2.0mm_1.txt',plotting=True)
-longitudinal_plot()
-plt.show()
+if __name__=='__main__':
+    logging.basicConfig(level = logging.INFO)
+    #fig,ax = plt.subplots()
+    #solenoid_scan([3,0,2,1],ax)
+    #solenoid_scan([4,5,6,7],ax)
+    #calc_plasma_prop('11_12_2018/scans/scan_1/data_2.0mm_1.txt',plotting=True)
+    longitudinal_plot()
+    import matplotlib.pyplot as plt
+    plt.show()
@@ -3,14 +3,20 @@
 import tkinter as ttk
 import logging
 import os
-import serial
-from struct import unpack
 import time
 
 import stepper
+import scope
+import shot_store
+import acquisition
+import catalog
+import live_monitor
+import telemetry
+import instrument_pool
+import quality
+import calibration
+from scan_scheduler import ScanPlan
 import probe_math as pmath
-import numpy as np
-import scipy.signal as signal
 
 import visa
 import pyvisa
@@ -37,17 +43,51 @@ class CopyPasteBox(ttk.Entry):
 
 
 class App():
-    def __init__(self):
+    def __init__(self,manager=None,stepper_device=None,framed_stepper=False,scopes=None,stepper_port='COM4'):
+        #scopes is a list of visa addresses (or (name,address) pairs) to acquire from together, one probe each
         logging.info('Starting application')
         
         self.root = ttk.Tk()
         
         self.delay = 1000
+        #visa timeout (ms) of transfers, waiting for a trigger uses trigger_timeout instead
         self.timeout = 1000
         self.rep_rate = 0.5
         self.loc= 0.00
         self._update_count = 0
 
+        #waveform transfer settings, the session configures the scope once and keeps the preamble
+        self.scope_encoding = 'RIBinary'
+        self.scope_width = 1
+        self.scope_check_interval = 60.0
+        self.session = None
+        #runs keep the raw scope codes and their scaling rather than volts
+        self.store_codes = True
+        self.run_preamble = None
+        self.run_conversion = None
+        #shots wait for the scope to trigger instead of sleeping between reads
+        self.trigger_sync = True
+        self.trigger_timeout = 10.0
+        #bad shots are taken again up to shot_retries times each and written flagged after that,
+        #the window is checked with the same policy shot_params analyses with
+        self.shot_check = quality.ShotCheck(policy=pmath.TRIGGER_WINDOW)
+        self.shot_retries = 3
+        self.scope_resources = scopes
+        self.pool = None
+
+        self.acquisition = None
+        self.catalog = None
+        self.poll_interval = 100
+
+        #live display redraws at frame_rate (1/s) over the last monitor_window shots
+        self.monitor = None
+        self.frame_rate = 10
+        self.monitor_window = 50
+        #a monitor that died is restarted after monitor_backoff s, doubling up to monitor_max_backoff while it keeps failing
+        self.monitor_backoff = 0.0
+        self.monitor_max_backoff = 60.0
+        self.monitor_retry_at = 0.0
+
         self.measure_plasma_params = False
         self.save_plasma_params = False
         self.save_raw = False
@@ -67,6 +107,12 @@ class App():
         self.scan_samples = ttk.StringVar()
         self.scan_samples.set('10')
 
+        self.scan_passes = ttk.StringVar()
+        self.scan_passes.set('1')
+
+        self.return_to_origin = ttk.BooleanVar()
+        self.return_to_origin.set(True)
+
         self.manual_disp = ttk.StringVar()
         self.manual_disp.set('2.0')
 
@@ -80,6 +126,9 @@ class App():
         
         self.status = ttk.StringVar()
         self.status.set('Starting')
+
+        self.timing_summary = ttk.StringVar()
+        self.timing_summary.set('')
         
         self.frame = ttk.Frame(self.root)
         self.frame.pack()
@@ -112,6 +161,14 @@ class App():
         scan_sample = CopyPasteBox(self.frame,textvariable = self.scan_samples)
         scan_sample.pack()
 
+        scan_passlabel = ttk.Label(self.frame,text = 'Scan passes (alternating direction): ')
+        scan_passlabel.pack()
+        scan_pass = CopyPasteBox(self.frame,textvariable = self.scan_passes)
+        scan_pass.pack()
+
+        return_check = ttk.Checkbutton(self.frame,text = 'Return to origin',variable = self.return_to_origin)
+        return_check.pack()
+
         manual_entrylabel = ttk.Label(self.frame,text = 'Manual displacement (+/- mm): ')
         manual_entrylabel.pack()
         manual_entry = CopyPasteBox(self.frame,textvariable = self.manual_disp)
@@ -120,17 +177,17 @@ class App():
         location_label = ttk.Label(self.frame,textvariable = self.curr_location)
         location_label.pack()
 
-        #plasma_density_label = ttk.Label(self.frame,textvariable = self.plasma_density)
-        #plasma_density_label.pack()
+        plasma_density_label = ttk.Label(self.frame,textvariable = self.plasma_density)
+        plasma_density_label.pack()
         
-        #plasma_temp_label = ttk.Label(self.frame,textvariable = self.plasma_temp)
-        #plasma_temp_label.pack()
+        plasma_temp_label = ttk.Label(self.frame,textvariable = self.plasma_temp)
+        plasma_temp_label.pack()
        
-        #saveparamsbutton = ttk.Button(self.frame,text = 'Measure Plasma Params',command = self.flip_measure_plasma_params)
-        #saveparamsbutton.pack()
+        measureparamsbutton = ttk.Button(self.frame,text = 'Measure Plasma Params',command = self.flip_measure_plasma_params)
+        measureparamsbutton.pack()
        
-        #saveparamsbutton = ttk.Button(self.frame,text = 'Save Plasma Params',command = self.flip_save_plasma_params)
-        #saveparamsbutton.pack()
+        saveparamsbutton = ttk.Button(self.frame,text = 'Save Plasma Params',command = self.flip_save_plasma_params)
+        saveparamsbutton.pack()
         
         self.saveshotsbutton = ttk.Button(self.frame,text = 'Save Shots',command = self.save_shots)
         self.saveshotsbutton.pack()
@@ -138,115 +195,272 @@ class App():
         self.scanbutton = ttk.Button(self.frame,text = 'Scan Plasma Chamber',command = self.scan)
         self.scanbutton.pack()
         
-        displacebutton = ttk.Button(self.frame,text = 'Manually Displace',command = self.manual_displacement)
-        displacebutton.pack()
+        self.pausebutton = ttk.Button(self.frame,text = 'Pause',command = self.pause_acquisition,state=ttk.DISABLED)
+        self.pausebutton.pack()
+        
+        self.cancelbutton = ttk.Button(self.frame,text = 'Cancel',command = self.cancel_acquisition,state=ttk.DISABLED)
+        self.cancelbutton.pack()
         
-        zerobutton = ttk.Button(self.frame,text = 'Zero',command = self.zero_stepper)
-        zerobutton.pack()
+        self.displacebutton = ttk.Button(self.frame,text = 'Manually Displace',command = self.manual_displacement)
+        self.displacebutton.pack()
         
-        self.init_scope()
-        self.stepper = stepper.Stepper('COM4')
+        self.zerobutton = ttk.Button(self.frame,text = 'Zero',command = self.zero_stepper)
+        self.zerobutton.pack()
+
+        #rolling per stage timings and counters of the current acquisition
+        timing_label = ttk.Label(self.frame,textvariable = self.timing_summary,font = ('Courier',9),justify = ttk.LEFT)
+        timing_label.pack()
+        
+        self.init_scope(manager)
+        #the original SM_Controller by default, framed_stepper for controllers flashed with SM_Controller_v2
+        if stepper_device is not None:
+            self.stepper = stepper_device
+        elif framed_stepper:
+            self.stepper = stepper.FramedStepper(stepper_port)
+        else:
+            self.stepper = stepper.Stepper(stepper_port)
         self.continuous_update()
 
-    def init_scope(self):
-        self.manager = visa.ResourceManager()
+    def init_scope(self,manager=None):
+        self.manager = manager or visa.ResourceManager()
+        if self.scope_resources:
+            #the first scope is also the one used for live monitoring
+            self.pool = instrument_pool.InstrumentPool(self.manager,self.scope_resources,self.scope_encoding,self.scope_width,
+                                                       trigger=self.trigger_sync,timeout=self.trigger_timeout)
+            for instrument in self.pool.instruments:
+                instrument.resource.timeout = self.timeout
+            self.session = self.pool.instruments[0].session
+            self.scope = self.session.resource
+            return
         try: 
             self.scope = self.manager.open_resource('GPIB1::1::INSTR')
         except pyvisa.errors.VisaIOError: 
             try:
                 self.scope = self.manager.open_resource('TCPIP::169.254.4.83::INSTR')
-            except pyvis.errors.VisaIOError:
+            except pyvisa.errors.VisaIOError:
                 logging.warning('Scope not connected - data taking disabled')
-                self.scanbutton.configure(state=DISABLE)
-                self.saveshotbutton.configure(state=DISABLE)
-                
+                self.scanbutton.configure(state=ttk.DISABLED)
+                self.saveshotsbutton.configure(state=ttk.DISABLED)
+                return
+        self.scope.timeout = self.timeout
+        self.session = scope.ScopeSession(self.scope,self.scope_encoding,self.scope_width,self.scope_check_interval)
                 
-    def read_scope(self):
-        logging.info('Reading scope')
-        self.scope.write('DATA:SOURCE CH1,CH2,CH3,CH4')
-        self.scope.write('DATA:ENCDG ASCII')
-        self.scope.write('DATA:WID 1')
-
-        nsettings = 10
-        self.preambles = self.scope.query('WFMPR?').strip().split(';')
-        logging.debug(len(self.preambles))
-            
-        self.channel_settings = []
-        for j in range(4):
-            self.channel_settings.append(self.preambles[5+j*nsettings:5+(j+1)*nsettings])
-
-        npts = int(self.channel_settings[0][-9])
-        curv = self.scope.query_ascii_values('CURV?',container=list,separator=',')
-
-        data = []
-        for i in range(4):
-            data.append(np.asfarray(curv[i*npts:(i+1)*npts]))
-        
-        ch_data = [np.linspace(0.0,len(data[0])*float(self.channel_settings[0][-6]),len(data[0]))]
-    
-        for ch,setting in zip(data,self.channel_settings):
-            logging.debug(setting)
-            ydata = (ch - float(setting[-2])) * float(setting[-3]) + float(setting[-1])
-            ch_data.append(ydata)
-        return np.asfarray(ch_data)
+    def setup_scope(self,refresh=False):
+        #only talks to the scope if the transfer settings changed since the last setup,
+        #refresh (start of a run) also checks the preamble in case the scope was changed by hand
+        self.session.set(self.scope_encoding,self.scope_width)
+        if self.session.preamble is None:
+            logging.info('Configuring scope for {} transfer'.format(self.scope_encoding))
+        return self.session.refresh() if refresh else self.session.ensure()
+
+    def read_scope(self,out=None):
+        logging.debug('Reading scope')
+        data = self.session.read(out)
+        self.scope_encoding = self.session.encoding
+        return data
     
-    def update_plasma_params(self,data):
-        density,temp = pmath.calculate_plasma_params(data)#[0.0,1.0],[2.0,3.0]
-        
-        self.plasma_density.set('{:.2e} +/- {:.2e}'.format(*density_meas))
-        self.plasma_temp.set('{:.2e} +/- {:.2e}'.format(*temp_meas))
+    def update_plasma_params(self,snapshot):
+        #snapshot comes from LiveMonitor.snapshot, rows are density then temperature
+        if not snapshot['n']:
+            return
+        density,temp = snapshot['mean']
+        std_density,std_temp = snapshot['std']
+        self.plasma_density.set('{:.2e} +/- {:.2e}'.format(density,std_density))
+        self.plasma_temp.set('{:.2e} +/- {:.2e}'.format(temp,std_temp))
+        self.status.set('Live: {} shots, {} rejected, {} queued'.format(snapshot['shots'],snapshot['failed'],snapshot['backlog']))
      
         self._update_count += 1
     
     def save_plasma_params_to_file(self,data,filename,data_append=''):
-        density,temp = pmath.calculate_plasma_params(data)#[0.0,1.0],[2.0,3.0]        
+        density,temp = self.shot_params(data)
     
         logging.info('Writing to file')
         self.status.set('Writing: On')
         with open(filename,'a') as file:
             file.write('{:.4e},{:.4e},{:.4e},{:.4e},{}\n'.format(*density,*temp,data_append))
     
+    def get_catalog(self):
+        root = self.raw_data_folder.get()
+        if self.catalog is None or os.path.normpath(self.catalog.root) != os.path.normpath(root):
+            self.catalog = catalog.Catalog(root)
+        return self.catalog
+
     def save_shots(self):
         logging.info('Saving shots')        
-        foldername = '{}{}'.format(self.raw_data_folder.get(),time.strftime('%m_%d_%Y',time.gmtime()))
-        
-        #search for a folder of a with the date and create it if the name is not found
-        if not os.path.isdir(foldername):
-            logging.info('Making folder {}'.format(foldername))
-            os.makedirs(foldername)
-               
-        #make a raw directory if one is not found
-        raw_foldername = '{}/raw'.format(foldername)
-        if not os.path.isdir(raw_foldername):
-            logging.info('Making folder {}'.format(raw_foldername))
-            os.makedirs(raw_foldername)
-        
-        #make a folder for the particular index number
-        for i in range(10000):
-            fullpth = '{}/{}'.format(raw_foldername,i)
-            if not os.path.isdir(fullpth):
-                os.makedirs(fullpth)
-                break
+        self.stop_monitor()
+        cat = self.get_catalog()
+        run_id,i,fullpth = cat.new_run('raw')
         logging.info('Index {}'.format(i))
         
-        
-        for j in range(int(self.scan_samples.get())):
-            data = self.read_scope()
-            np.savetxt('{}/data_{}.txt'.format(fullpth,j),data.T)
-            time.sleep(1.25*(1 / self.rep_rate))
-            
+        writer = self.new_writer(fullpth,cat.shot_listener(run_id))
+        self.start_acquisition(acquisition.Acquisition(self.capture_shot,writer,
+                                                       plan=ScanPlan.stationary(int(self.scan_samples.get())),
+                                                       delay=self.shot_delay(1.25*(1 / self.rep_rate)),
+                                                       stepper=self.stepper,
+                                                       analyse=self.shot_params,
+                                                       check=self.check_shot,
+                                                       retries=self.shot_retries),fullpth)
+
+    def new_writer(self,folder,listener,**settings):
+        #with several scopes each shot is their channels stacked, 5 rows per scope in pool order
+        if self.pool is not None:
+            self.pool.setup(refresh=True)
+            settings.update(self.pool.settings())
+            return shot_store.RunWriter(folder,self.pool.npts,self.pool.nchannels,listener=listener,**settings)
+        preamble = self.setup_scope(refresh=True)
+        self.run_preamble = preamble
+        if self.store_codes:
+            self.run_conversion = calibration.Conversion().tabulate_codes(preamble)
+            return shot_store.RunWriter(folder,preamble.npts,4,preamble.code_dtype.str,listener=listener,
+                                        scaling=preamble.scaling(),preamble=preamble.as_dict(),**settings)
+        return shot_store.RunWriter(folder,preamble.npts,preamble=preamble.as_dict(),listener=listener,**settings)
+
+    def capture_shot(self):
+        #one shot per trigger, the scope is armed for a single sequence and read once it has fired
+        if self.pool is not None:
+            return self.pool.read_shot()
+        if self.trigger_sync:
+            with telemetry.span('trigger'):
+                scope.arm(self.scope)
+                scope.wait_for_trigger(self.scope,self.trigger_timeout)
+        if self.store_codes:
+            codes = self.session.read_codes()
+            if self.session.preamble is not self.run_preamble:
+                #codes from here on would not match the scaling in the run header
+                raise ValueError('Scope settings changed during the run')
+            return codes
+        return self.read_scope()
+
+    def free_run(self):
+        #capture_shot leaves the scope stopped after its last sequence, the live monitor needs it running again
+        if not self.trigger_sync:
+            return
+        try:
+            if self.pool is not None:
+                self.pool.run_continuous()
+            else:
+                scope.run_continuous(self.scope)
+        except scope.TRANSFER_ERRORS as e:
+            logging.warning('Could not set the scope back to free running: {}'.format(e))
+
+    def check_shot(self,data):
+        #the run preamble knows the digitizer range, pool shots come from several scopes and are checked without it
+        return self.shot_check(data,self.run_preamble if self.pool is None else None)
+
+    def shot_delay(self,delay):
+        return 0.0 if self.trigger_sync else delay
+
+    def shot_params(self,data):
+        #with several scopes the displayed values come from the first probe, raw codes go through the run's code tables
+        if len(data) == 4:
+            p = self.run_preamble
+            density,temp = self.run_conversion.trace_codes(data)
+            trigger = p.ymult[1]*(data[1] - p.yoff[1]) + p.yzero[1]
+            return pmath.calculate_plasma_params(density,temp,trigger,p.time_axis())
+        data = data[:5]
+        density,temp = pmath.calculate_plasma_trace(data)
+        return pmath.calculate_plasma_params(density,temp,data[2],data[0])
+
+    def acquiring(self):
+        return self.acquisition is not None and not self.acquisition.done()
+
+    def start_acquisition(self,acq,folder):
+        #per stage timings go next to the raw data
+        telemetry.current.start_log(os.path.join(folder,telemetry.LOG_FILE),
+                                    encoding=self.scope_encoding,trigger_sync=self.trigger_sync,total=acq.total)
+        self.acquisition = acq
+        for button in (self.saveshotsbutton,self.scanbutton,self.displacebutton,self.zerobutton):
+            button.configure(state=ttk.DISABLED)
+        self.pausebutton.configure(state=ttk.NORMAL,text='Pause')
+        self.cancelbutton.configure(state=ttk.NORMAL)
+        acq.start()
+        self.root.after(self.poll_interval,self.poll_acquisition)
+
+    def poll_acquisition(self):
+        acq = self.acquisition
+        self.curr_location.set('Current Location: {:.2f}mm'.format(self.stepper.mm_loc))
+        if acq.results:
+            density,temp = acq.results[-1][1]
+            self.plasma_density.set('{:.2e} +/- {:.2e}'.format(*density))
+            self.plasma_temp.set('{:.2e} +/- {:.2e}'.format(*temp))
+        self.timing_summary.set(telemetry.current.format_summary())
+
+        if not acq.done():
+            state = 'Paused' if acq.paused else 'Acquiring'
+            self.status.set('{}: {}/{} shots, {} written, {} rejected'.format(state,acq.acquired,acq.total,acq.written,acq.rejected))
+            self.root.after(self.poll_interval,self.poll_acquisition)
+            return
+
+        if acq.error is not None:
+            self.status.set('Failed after {} shots: {}'.format(acq.written,acq.error))
+        elif acq.cancelled:
+            self.status.set('Cancelled after {} shots'.format(acq.written))
+        else:
+            self.status.set('Done, {} shots written, {} rejected, {} flagged'.format(acq.written,acq.rejected,acq.flagged))
+        if acq.reasons:
+            logging.info('Rejected shots: {}'.format(acq.reasons))
+        self.free_run()
+        telemetry.current.stop_log()
         logging.info('done saving shots')
+        for button in (self.saveshotsbutton,self.scanbutton,self.displacebutton,self.zerobutton):
+            button.configure(state=ttk.NORMAL)
+        self.pausebutton.configure(state=ttk.DISABLED,text='Pause')
+        self.cancelbutton.configure(state=ttk.DISABLED)
+
+    def pause_acquisition(self):
+        if not self.acquiring():
+            return
+        if self.acquisition.paused:
+            self.acquisition.resume()
+            self.pausebutton.configure(text='Pause')
+        else:
+            self.acquisition.pause()
+            self.pausebutton.configure(text='Resume')
+
+    def cancel_acquisition(self):
+        if self.acquiring():
+            self.acquisition.cancel()
       
+    def start_monitor(self):
+        self.setup_scope()
+        self.monitor = live_monitor.LiveMonitor(self.read_scope,window=self.monitor_window).start()
+
+    def monitor_failed(self,error):
+        self.monitor_backoff = min(2*self.monitor_backoff,self.monitor_max_backoff) if self.monitor_backoff else 1.0
+        self.monitor_retry_at = time.monotonic() + self.monitor_backoff
+        logging.warning('Live monitor stopped ({}), restarting in {:.0f} s'.format(error,self.monitor_backoff))
+        self.status.set('Live monitor stopped, restarting in {:.0f} s'.format(self.monitor_backoff))
+
+    def stop_monitor(self):
+        if self.monitor is not None:
+            self.monitor.stop(timeout=5.0)
+            self.monitor = None
+
     def continuous_update(self): 
-        if self.measure_plasma_params:
-            data = self.read_scope()
-            self.update_plasma_params(data)
-            if self.save_plasma_params():
-                self.save_plasma_params_to_file(data,self.plasma_params_filename)
-        else:
-            if self.save_plasma_params:
-                self.measure_plasma_params = True
-        self.root.after(self.delay,self.continuous_update)
+        #fixed frame rate redraw, shots are read and reduced on the live monitor threads
+        if self.save_plasma_params:
+            self.measure_plasma_params = True
+        if self.measure_plasma_params and not self.acquiring():
+            if self.monitor is not None and not self.monitor.running:
+                error = self.monitor.error
+                self.stop_monitor()
+                self.monitor_failed(error)
+            #without a scope there is nothing to monitor
+            if self.monitor is None and self.session is not None and time.monotonic() >= self.monitor_retry_at:
+                try:
+                    self.start_monitor()
+                except scope.TRANSFER_ERRORS as e:
+                    self.monitor = None
+                    self.monitor_failed(e)
+            if self.monitor is not None:
+                self.monitor.filename = self.plasma_params_filename.get() if self.save_plasma_params else None
+                snapshot = self.monitor.snapshot()
+                if snapshot['shots']:
+                    self.monitor_backoff = 0.0
+                self.update_plasma_params(snapshot)
+        elif self.monitor is not None:
+            self.stop_monitor()
+        self.root.after(int(1000 / self.frame_rate),self.continuous_update)
 
     def manual_displacement(self):
         self.status.set('Stepping')
@@ -260,20 +474,7 @@ class App():
         
     def scan(self):
         logging.info('Zeroing probe')
-        foldername = '{}{}'.format(self.raw_data_folder.get(),time.strftime('%m_%d_%Y',time.gmtime()))
-        
-        #search for a folder of a name and create it if the name is not found
-        
-        if not os.path.isdir('{}/scans'.format(foldername)):
-            os.makedirs('{}/scans'.format(foldername))
-        
-        for i in range(10000):
-            fullpth = '{}/scans/scan_{}'.format(foldername,i)
-            if not os.path.isdir(fullpth):
-                os.makedirs(fullpth)
-                break
-        logging.info('Scan index {}'.format(i))
-        
+        self.stop_monitor()
         start = self.stepper.mm_loc
 
         logging.info('Start positition {}mm'.format(start))
@@ -283,20 +484,28 @@ class App():
         samples = int(self.scan_samples.get())
         scan_step_size = full_length / points
         
+        passes = int(self.scan_passes.get())
+        plan = ScanPlan.uniform(start,full_length,points,samples,self.return_to_origin.get())
+        if passes > 1:
+            plan = ScanPlan.serpentine(plan.positions,passes,samples,plan.return_to)
+        
+        settings = {'start':start,'points':points,'step_size':scan_step_size,'samples':samples,
+                    'passes':passes,'positions':plan.positions}
+        cat = self.get_catalog()
+        run_id,i,fullpth = cat.new_run('scan',**settings)
+        logging.info('Scan index {}'.format(i))
+
         logging.info('Doing scan with {} points,step size: {:.2}mm'.format(points,scan_step_size))
-        for i in range(0,points):
-            logging.info('stepping')
-            self.stepper.go_to(scan_step_size)
-            logging.info('Current stepper position: {:.2} mm'.format(self.stepper.mm_loc))
-            
-            #save raw data for each shot
-            for j in range(int(self.scan_samples.get())):
-                data = self.read_scope()
-                np.savetxt('{}/data_{}mm_{}.txt'.format(fullpth,self.stepper.mm_loc,j),data.T)
-                time.sleep(self.delay/1500)
-        logging.info('Done with scan,going to orig location')
-        self.stepper.go_to(-full_length)
-        logging.info('Ready')
+        writer = self.new_writer(fullpth,cat.shot_listener(run_id),**settings)
+        #shots at one position are saved while the probe moves to the next, and it goes back
+        #to the start when the scan ends or is cancelled if return to origin is set
+        self.start_acquisition(acquisition.Acquisition(self.capture_shot,writer,
+                                                       plan=plan,
+                                                       delay=self.shot_delay(self.delay/1500),
+                                                       stepper=self.stepper,
+                                                       analyse=self.shot_params,
+                                                       check=self.check_shot,
+                                                       retries=self.shot_retries),fullpth)
     def wait(self): 
         pass
     
@@ -310,11 +519,21 @@ class App():
         self.save_raw = not self.save_raw
         
     def destroy(self):
+        self.stop_monitor()
+        if self.pool is not None:
+            self.pool.close()
         self.root.destroy()
 
-def main():
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='Langmuir probe acquisition')
+    parser.add_argument('--framed-stepper',action='store_true',help='stepper controller runs the SM_Controller_v2 firmware')
+    parser.add_argument('--stepper-port',default='COM4')
+    parser.add_argument('--scope',action='append',default=None,dest='scopes',metavar='ADDRESS',
+                        help='visa address of a scope to acquire from, repeat for several probes')
+    args = parser.parse_args(argv)
     logging.basicConfig(level=logging.INFO)
-    app = App()
+    app = App(framed_stepper=args.framed_stepper,scopes=args.scopes,stepper_port=args.stepper_port)
     app.root.mainloop()
     #try:
         
@@ -0,0 +1,161 @@
+#timings of each stage between the scope and a plasma parameter, on synthetic shots
+#python benchmark.py --shots 200 --npts 500 2000 10000 --out bench.json
+import os
+import sys
+import time
+import json
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import subprocess
+import numpy as np
+
+import scope
+import fake_visa
+import probe_math as pmath
+import text_loader
+
+class ReplayScope(fake_visa.FakeScope):
+    #same waveform every read, so decode timings do not include making the waveform
+    def _curve(self):
+        key = (self.encoding,self.width)
+        if getattr(self,'_replay',(None,))[0] != key:
+            self._replay = (key,fake_visa.FakeScope._curve(self))
+        return self._replay[1]
+
+def make_shots(n,npts,seed=0):
+    return np.stack([fake_visa.synthetic_shot(npts,seed=seed + i) for i in range(n)])
+
+def measure(fn,items,repeat=3):
+    #best wall time of repeat passes over items, then one pass under tracemalloc for the peak
+    best = float('inf')
+    for r in range(repeat):
+        t = time.perf_counter()
+        for item in items:
+            fn(item)
+        best = min(best,time.perf_counter() - t)
+    tracemalloc.start()
+    for item in items:
+        fn(item)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'seconds':best,'shots':len(items),'shots_per_second':len(items)/best if best else None,'peak_bytes':peak}
+
+def decode_stages(npts,n):
+    stages = {}
+    for encoding,width in (('ASCII',1),('RIBinary',1),('RIBinary',2)):
+        fake = ReplayScope(npts=npts,seed=0)
+        scope.configure(fake,encoding,width)
+        preamble = scope.read_preamble(fake)
+        out = np.empty((5,npts))
+        stages['read_scope_{}{}'.format(encoding.lower(),width)] = measure(lambda i: scope.read_curve(fake,preamble,out),range(n))
+    return stages
+
+def text_stages(shots,folder):
+    files = [os.path.join(folder,'data_{}.txt'.format(i)) for i in range(len(shots))]
+    stages = {'savetxt':measure(lambda i: np.savetxt(files[i],shots[i].T),range(len(shots)),repeat=1),
+              'loadtxt':measure(lambda f: np.loadtxt(f).T,files),
+              'read_text':measure(text_loader.read_text,files)}
+    result = measure(text_loader.load_text,[files])
+    result['shots'] = len(files)
+    result['shots_per_second'] = len(files)/result['seconds']
+    stages['load_text'] = result
+    return stages,files
+
+def analysis_stages(shots,files):
+    import analyze2
+
+    def params(data):
+        density,temp = pmath.calculate_plasma_trace(data)
+        return pmath.calculate_plasma_params(density,temp,data[2],data[0])
+
+    stages = {'apply_filter':measure(pmath.apply_filter,shots),
+              'calculate_plasma_trace':measure(pmath.calculate_plasma_trace,shots),
+              'calculate_plasma_params':measure(params,shots),
+              'calc_plasma_prop':measure(analyze2.calc_plasma_prop,files)}
+    #whole stack in one call, reported per shot so it lines up with the rest
+    for name,fn in (('apply_filter_stacked',pmath.apply_filter),('calc_plasma_props_batch',pmath.calc_plasma_props_batch)):
+        result = measure(fn,[shots])
+        result['shots'] = len(shots)
+        result['shots_per_second'] = len(shots)/result['seconds']
+        stages[name] = result
+    return stages
+
+def run(npts_list,n_shots):
+    results = {}
+    for npts in npts_list:
+        logging.info('{} shots of {} points'.format(n_shots,npts))
+        shots = make_shots(n_shots,npts)
+        folder = tempfile.mkdtemp(prefix='lprobe_bench_')
+        try:
+            stages = decode_stages(npts,n_shots)
+            text,files = text_stages(shots,folder)
+            stages.update(text)
+            stages.update(analysis_stages(shots,files))
+        finally:
+            shutil.rmtree(folder)
+        results[str(npts)] = stages
+    return results
+
+def scaling(results):
+    #slope of log time against log npts for each stage, 1 is linear
+    npts = np.array([int(k) for k in results],dtype=float)
+    if len(npts) < 2:
+        return {}
+    slopes = {}
+    for stage in results[str(int(npts[0]))]:
+        seconds = np.array([results[str(int(n))][stage]['seconds'] for n in npts])
+        slopes[stage] = float(np.polyfit(np.log(npts),np.log(seconds),1)[0])
+    return slopes
+
+def commit():
+    try:
+        return subprocess.check_output(['git','rev-parse','--short','HEAD'],cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError,subprocess.CalledProcessError):
+        return None
+
+def report(results,slopes):
+    for npts,stages in results.items():
+        print('npts = {}'.format(npts))
+        for stage,r in stages.items():
+            print('  {:<26} {:>10.1f} shots/s {:>10.2f} ms {:>9.1f} kB peak'.format(stage,r['shots_per_second'],
+                                                                                     1e3*r['seconds'],r['peak_bytes']/1e3))
+    if slopes:
+        print('scaling with npts (log-log slope)')
+        for stage,slope in slopes.items():
+            print('  {:<26} {:.2f}'.format(stage,slope))
+
+def compare(results,baseline):
+    #ratio of throughput against an earlier json, below 1 is slower than the baseline
+    for npts,stages in results.items():
+        old = baseline['results'].get(npts,{})
+        for stage,r in stages.items():
+            if stage in old:
+                print('  {:>6} {:<26} {:.2f}x'.format(npts,stage,r['shots_per_second']/old[stage]['shots_per_second']))
+
+if __name__=='__main__':
+    parser = argparse.ArgumentParser(description='Time each stage of the acquisition to result pipeline')
+    parser.add_argument('--shots',type=int,default=100)
+    parser.add_argument('--npts',type=int,nargs='+',default=[500,2000,10000])
+    parser.add_argument('--out',default=None,help='json file to save results to')
+    parser.add_argument('--compare',default=None,help='earlier json to compare throughput against')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    results = run(args.npts,args.shots)
+    slopes = scaling(results)
+    report(results,slopes)
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        print('throughput relative to {}'.format(baseline.get('commit') or args.compare))
+        compare(results,baseline)
+    if args.out:
+        with open(args.out,'w') as file:
+            json.dump({'commit':commit(),'created':time.time(),'python':sys.version.split()[0],'numpy':np.__version__,
+                       'platform':platform.platform(),'shots':args.shots,'results':results,'scaling':slopes},file,indent=1)
+        logging.info('Saved {}'.format(args.out))
@@ -0,0 +1,150 @@
+#probe calibration and the conversion from channel voltages to temperature and density
+#the diode current and the f1 factor only depend on one voltage difference each, shots kept as raw codes
+#(runs written by the app) take one of a few hundred values per difference, so the difference of two
+#channels' codes indexes a table of the exact formula instead of evaluating it per sample
+#shots in volts (text archives, filtered traces) are evaluated with the formula
+import logging
+import numpy as np
+
+import probe_math as pmath
+
+class DiodeCalibration:
+    #I = 10**((V - offset)/slope) / R for the voltage V across the diode
+    def __init__(self,offset=2.65,slope=0.95,R=1.1,name=None,cov=None):
+        #cov is the 2x2 covariance of (offset,slope) when they come from a fit
+        self.offset = offset
+        self.slope = slope
+        self.R = R
+        self.name = name
+        self.cov = cov
+
+    def current(self,V):
+        return 10**((V - self.offset)/self.slope) / self.R
+
+    @classmethod
+    def fit(cls,V_diff,I,R=1.1,name='fit'):
+        #straight line through log10(I*R) against V, e.g. from circuit_benchmark_data.txt
+        x = np.asarray(V_diff,dtype=float)
+        y = np.log10(np.asarray(I,dtype=float)*R)
+        if len(x) < 4:
+            slope,intercept = np.polyfit(x,y,1)
+            return cls(-intercept/slope,1/slope,R,name)
+        (slope,intercept),cov = np.polyfit(x,y,1,cov=True)
+        #linear propagation from (slope,intercept) of the line to (offset,slope) of the calibration
+        J = np.array([[intercept/slope**2,-1/slope],[-1/slope**2,0.0]])
+        return cls(-intercept/slope,1/slope,R,name,J @ cov @ J.T)
+
+    @classmethod
+    def from_bench(cls,filename='circuit_benchmark_data.txt',V=54,R=1.1):
+        #columns are load resistance (kOhm), then the two diode voltages, as read by circuit_analysis.py
+        data = np.loadtxt(filename,skiprows=1).T
+        return cls.fit(data[2] - data[1],V / (data[0]*1000),R,filename)
+
+    def as_dict(self):
+        return {'name':self.name,'offset':self.offset,'slope':self.slope,'R':self.R}
+
+#the calibration calculate_plasma_trace has always used, and the bench fit from circuit_analysis.py
+NOMINAL = DiodeCalibration(2.65,0.95,1.1,'nominal')
+BENCH = DiodeCalibration(5.85,1.0,1.1,'bench')
+
+class CodeLut:
+    #fn(scale*d + zero) at every difference d = a - b of two channels' codes from low to high, looked up
+    #without interpolation, so it is the exact formula at the voltages the scope can send
+    def __init__(self,fn,scale,zero,low,high):
+        self.low = int(low)
+        d = np.arange(self.low,int(high) + 1)
+        self.n = len(d)
+        with np.errstate(divide='ignore',invalid='ignore'):
+            self.y = fn(scale*d + zero)
+
+    def __call__(self,a,b):
+        d = np.subtract(a,b,dtype=np.intp)
+        d -= self.low
+        return self.y[d]
+
+class Conversion:
+    #channel voltages to temperature and density for one probe
+    def __init__(self,diode=NOMINAL,A=0.66,M=40,V_bias=60):
+        self.diode = diode
+        self.A = A
+        self.M = M
+        self.V_bias = V_bias
+        self.code_preamble = None
+        self.current_codes = None
+        self.f1_codes = None
+        self.T_codes = None
+
+    def temperature(self,V_d2):
+        return pmath.T_e(V_d2,self.V_bias)
+
+    def _f1(self,V_d2):
+        return pmath.f1(V_d2,pmath.T_e(V_d2,self.V_bias))
+
+    def current(self,V_d3):
+        return self.diode.current(V_d3)
+
+    def f1(self,V_d2):
+        return self._f1(V_d2)
+
+    def trace(self,data):
+        #same as calculate_plasma_trace, CH1: F, CH2: trigger/current, CH3: +, CH4: -
+        V_d2 = data[3] - data[1]
+        I_3 = self.current(data[3] - data[4])
+        density = (self.M**0.5 / self.A) * I_3 * 1e6 * self.f1(V_d2)
+        return density,self.temperature(V_d2)
+
+    def trace_codes(self,codes):
+        #(density,T) of (...,4,npts) raw codes (scope.read_codes) in the preamble given to tabulate_codes
+        p = self.code_preamble
+        if self.f1_codes is None or self.current_codes is None:
+            volts = p.ymult[:,None]*(codes - p.yoff[:,None]) + p.yzero[:,None]
+            V_d2 = volts[...,2,:] - volts[...,0,:]
+            density = (self.M**0.5 / self.A) * self.current(volts[...,2,:] - volts[...,3,:]) * 1e6 * self.f1(V_d2)
+            return density,self.temperature(V_d2)
+        plus = codes[...,2,:]
+        I_3 = self.current_codes(plus,codes[...,3,:])
+        density = (self.M**0.5 / self.A) * I_3 * 1e6 * self.f1_codes(plus,codes[...,0,:])
+        return density,self.T_codes(plus,codes[...,0,:])
+
+    def tabulate_codes(self,preamble):
+        #tables over every code difference CH3 - CH4 and CH3 - CH1 of this preamble, a difference only maps to
+        #one voltage when both channels have the same ymult, otherwise trace_codes scales and uses the formula
+        info = np.iinfo(preamble.dtype)
+        low,high = info.min - info.max,info.max - info.min
+        def table(fn,plus,minus):
+            if preamble.ymult[plus] != preamble.ymult[minus]:
+                return None
+            zero = preamble.ymult[plus]*(preamble.yoff[minus] - preamble.yoff[plus]) + preamble.yzero[plus] - preamble.yzero[minus]
+            return CodeLut(fn,preamble.ymult[plus],zero,low,high)
+        self.code_preamble = preamble
+        self.current_codes = table(self.diode.current,2,3)
+        self.f1_codes = table(self._f1,2,0)
+        self.T_codes = table(self.temperature,2,0)
+        if self.current_codes is None or self.f1_codes is None:
+            logging.info('Channels have different scales, raw codes are scaled and converted with the formula')
+        return self
+
+DEFAULT = Conversion()
+
+if __name__=='__main__':
+    import time
+    import fake_visa
+    import scope
+
+    logging.basicConfig(level=logging.INFO)
+    fake = fake_visa.FakeScope(npts=10000,seed=0)
+    scope.configure(fake)
+    preamble = scope.read_preamble(fake)
+    codes = np.stack([scope.read_codes(fake,preamble) for i in range(50)])
+
+    #the same shots scaled to volts through the formula, and as raw codes through the code tables
+    exact = Conversion()
+    t = time.perf_counter()
+    for shot in codes:
+        exact.trace(preamble.scale(shot))
+    print('formula: {:.2f} ms per shot'.format(1e3*(time.perf_counter() - t)/len(codes)))
+    by_codes = Conversion().tabulate_codes(preamble)
+    t = time.perf_counter()
+    for shot in codes:
+        by_codes.trace_codes(shot)
+    print('codes: {:.2f} ms per shot, {} entry tables'.format(1e3*(time.perf_counter() - t)/len(codes),by_codes.current_codes.n))
@@ -0,0 +1,311 @@
+#sqlite catalog of every run, scan and shot in the data tree
+import os
+import re
+import json
+import time
+import sqlite3
+import logging
+import threading
+from collections import namedtuple
+
+import numpy as np
+import shot_store
+
+CATALOG_FILE = 'catalog.sqlite'
+DATE_FORMAT = '%m_%d_%Y'
+DATE_FOLDER = re.compile(r'^\d\d_\d\d_\d{4}$')
+
+Run = namedtuple('Run','id date kind number path created settings pressure solenoid_current')
+Shot = namedtuple('Shot','run date kind number shot position timestamp source')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (id INTEGER PRIMARY KEY, date TEXT, kind TEXT, number INTEGER, path TEXT UNIQUE,
+                                 created REAL, settings TEXT, pressure REAL, solenoid_current REAL);
+CREATE TABLE IF NOT EXISTS shots (id INTEGER PRIMARY KEY, run INTEGER REFERENCES runs(id), shot INTEGER,
+                                  position REAL, timestamp REAL, file TEXT, UNIQUE(run,shot));
+CREATE INDEX IF NOT EXISTS runs_by_date ON runs (date,kind,number);
+CREATE INDEX IF NOT EXISTS shots_by_position ON shots (run,position);
+CREATE TABLE IF NOT EXISTS dates (date TEXT PRIMARY KEY, stamp REAL, key_stamp REAL);
+'''
+
+#columns added since the first catalogs, (name,type) added to runs when missing
+#indexed is the folder's stamp when its shots were last read, null until then
+ADDED_COLUMNS = [('indexed','REAL')]
+
+def today():
+    return time.strftime(DATE_FORMAT,time.gmtime())
+
+def classify(rel):
+    #(date,kind,number) for a run folder relative to the catalog root, None if it is not one
+    parts = rel.replace('\\','/').split('/')
+    if len(parts) == 3 and DATE_FOLDER.match(parts[0]) and parts[1] == 'raw' and parts[2].isdigit():
+        return parts[0],'raw',int(parts[2])
+    if len(parts) == 3 and DATE_FOLDER.match(parts[0]) and parts[1] == 'scans' and parts[2].startswith('scan_') and parts[2][5:].isdigit():
+        return parts[0],'scan',int(parts[2][5:])
+    if len(parts) == 2 and DATE_FOLDER.match(parts[0]) and parts[1].isdigit():
+        #older days kept raw runs directly in the date folder
+        return parts[0],'raw',int(parts[1])
+    return None
+
+class Catalog:
+    def __init__(self,root='data',path=None):
+        self.root = root
+        self.path = path or os.path.join(root,CATALOG_FILE)
+        if not os.path.isdir(root):
+            os.makedirs(root)
+        #shots are recorded from the acquisition writer thread
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(self.path,check_same_thread=False)
+        self.db.executescript(SCHEMA)
+        columns = [row[1] for row in self.db.execute('PRAGMA table_info(runs)')]
+        for name,kind in ADDED_COLUMNS:
+            if not name in columns:
+                #an older catalog, its runs have no stamp and are indexed again when their date is next used
+                self.db.execute('ALTER TABLE runs ADD COLUMN {} {}'.format(name,kind))
+        self.db.commit()
+
+    def _rel(self,path):
+        return os.path.relpath(path,self.root).replace('\\','/')
+
+    def _abs(self,rel):
+        return os.path.join(self.root,rel)
+
+    def folder(self,date,kind,number):
+        if kind == 'scan':
+            return os.path.join(self.root,date,'scans','scan_{}'.format(number))
+        return os.path.join(self.root,date,'raw',str(number))
+
+    def known_date(self,date):
+        with self.lock:
+            return self.db.execute('SELECT 1 FROM runs WHERE date=? LIMIT 1',(date,)).fetchone() is not None
+
+    def date_stamp(self,date):
+        #changes when a run folder is made or removed under a date, the folders that hold runs are all that
+        #is looked at, None when the date has no folder
+        top = os.path.join(self.root,date)
+        stamps = [os.path.getmtime(folder) for folder in (top,os.path.join(top,'raw'),os.path.join(top,'scans'))
+                  if os.path.isdir(folder)]
+        return max(stamps) if stamps else None
+
+    def _key_stamp(self,date):
+        key = os.path.join(self.root,date,'run_key.txt')
+        return os.path.getmtime(key) if os.path.isfile(key) else None
+
+    def _seen(self,date):
+        #(stamp,key_stamp) the date had when it was last walked, (None,None) if it never was
+        with self.lock:
+            row = self.db.execute('SELECT stamp,key_stamp FROM dates WHERE date=?',(date,)).fetchone()
+        return row or (None,None)
+
+    def _saw(self,date,stamp,key_stamp):
+        with self.lock:
+            self.db.execute('INSERT OR REPLACE INTO dates (date,stamp,key_stamp) VALUES (?,?,?)',(date,stamp,key_stamp))
+            self.db.commit()
+
+    def stamp(self,folder):
+        #changes when shots are added to or removed from a run folder, text shots change the folder's mtime
+        #and binary runs append to their index
+        index = shot_store.run_base(folder) + shot_store.INDEX_EXT
+        return max(os.path.getmtime(folder),os.path.getmtime(index) if os.path.isfile(index) else 0.0)
+
+    def ensure_indexed(self,date,force=False):
+        #the date folder is only walked when a run folder was made or removed under it since the last walk
+        #(or force is set), runs written through new_run and shot_listener are recorded as they are written,
+        #shots added to an old run folder by hand need refresh(date)
+        #the walk indexes the run folders that are new or changed since they were last indexed
+        stamp = self.date_stamp(date)
+        if stamp is None:
+            return
+        seen,key_seen = self._seen(date)
+        key_stamp = self._key_stamp(date)
+        indexed = 0
+        if force or stamp != seen:
+            top = os.path.join(self.root,date)
+            with self.lock:
+                stamps = dict(self.db.execute('SELECT path,indexed FROM runs WHERE date=?',(date,)))
+            for folder,dirs,files in os.walk(top):
+                dirs.sort()
+                if classify(self._rel(folder)) is None or stamps.get(self._rel(folder)) == self.stamp(folder):
+                    continue
+                try:
+                    self.index_folder(folder)
+                    indexed += 1
+                except (OSError,ValueError) as e:
+                    #e.g. a run whose index line is half written, it is tried again next time
+                    logging.warning('Could not index {}: {}'.format(folder,e))
+                    stamp = None
+        #newly indexed runs need their keys too
+        if key_stamp is not None and (indexed or key_stamp != key_seen):
+            self.import_run_key(date)
+        self._saw(date,stamp,key_stamp)
+
+    def refresh(self,date=None):
+        #looks at every run folder of a date again, or of the whole tree
+        if date is None:
+            return self.index_tree()
+        self.ensure_indexed(date,force=True)
+
+    def add_run(self,path,date,kind,number,created=None,**settings):
+        with self.lock:
+            cur = self.db.execute('INSERT OR IGNORE INTO runs (date,kind,number,path,created,settings) VALUES (?,?,?,?,?,?)',
+                                  (date,kind,number,self._rel(path),created or time.time(),json.dumps(settings)))
+            self.db.commit()
+            if cur.rowcount:
+                return cur.lastrowid
+            return self.db.execute('SELECT id FROM runs WHERE path=?',(self._rel(path),)).fetchone()[0]
+
+    def new_run(self,kind,date=None,**settings):
+        #next free run number for the day, folder is created and recorded in one go
+        date = date or today()
+        self.ensure_indexed(date)
+        with self.lock:
+            last = self.db.execute('SELECT MAX(number) FROM runs WHERE date=? AND kind=?',(date,kind)).fetchone()[0]
+        number = 0 if last is None else last + 1
+        unchanged = self.date_stamp(date) == self._seen(date)[0]
+        while True:
+            folder = self.folder(date,kind,number)
+            try:
+                os.makedirs(folder)
+                break
+            except FileExistsError:
+                #a folder the catalog never saw, index it rather than reuse it
+                logging.warning('{} exists but is not in the catalog'.format(folder))
+                self.index_folder(folder)
+                number += 1
+        run_id = self.add_run(folder,date,kind,number,**settings)
+        if unchanged:
+            #the folder made here is already recorded, nothing else changed under the date since the last walk
+            self._saw(date,self.date_stamp(date),self._seen(date)[1])
+        logging.info('New {} run {} ({})'.format(kind,number,folder))
+        return run_id,number,folder
+
+    def add_shot(self,run,shot,position=None,timestamp=None,file=None):
+        with self.lock:
+            self.db.execute('INSERT OR REPLACE INTO shots (run,shot,position,timestamp,file) VALUES (?,?,?,?,?)',
+                            (run,shot,position,timestamp,self._rel(file) if file else None))
+            self.db.commit()
+
+    def shot_listener(self,run):
+        #callback for shot_store.RunWriter so shots are catalogued as they are written
+        def listener(shot,meta):
+            self.add_shot(run,shot,meta.get('position'),meta.get('timestamp'))
+        return listener
+
+    def index_folder(self,folder):
+        info = classify(self._rel(folder))
+        if info is None:
+            return None
+        date,kind,number = info
+        stamp = self.stamp(folder)
+        if shot_store.is_run(folder):
+            run = shot_store.open_run(folder)
+            run_id = self.add_run(folder,date,kind,number,run.created,**run.settings)
+            rows = [(run_id,i,m.get('position'),m.get('timestamp'),None) for i,m in enumerate(run.meta)]
+            stale = []
+        else:
+            run_id = self.add_run(folder,date,kind,number,os.path.getmtime(folder))
+            #scan files restart their shot number at every position, so text shots are numbered in folder order
+            rows = [(run_id,k,position,os.path.getmtime(path),self._rel(path))
+                    for k,(position,shot,path) in enumerate(shot_store.text_shots(folder))]
+            #the numbers move when files come or go (and older catalogs numbered them per position),
+            #so the folder's text shots are replaced rather than added to
+            stale = [(run_id,)]
+        with self.lock:
+            self.db.executemany('DELETE FROM shots WHERE run=? AND file IS NOT NULL',stale)
+            self.db.executemany('INSERT OR IGNORE INTO shots (run,shot,position,timestamp,file) VALUES (?,?,?,?,?)',rows)
+            self.db.execute('UPDATE runs SET indexed=? WHERE id=?',(stamp,run_id))
+            self.db.commit()
+        return run_id
+
+    def index_tree(self,root=None):
+        root = root or self.root
+        count = 0
+        dates = []
+        for folder,dirs,files in os.walk(root):
+            dirs.sort()
+            date = self._rel(folder)
+            if DATE_FOLDER.match(date):
+                #stamped before its runs are read, so anything made meanwhile is picked up next time
+                dates.append((date,self.date_stamp(date),self._key_stamp(date)))
+            if self.index_folder(folder) is not None:
+                count += 1
+        #runs have to be in before their keys can be attached
+        for date,stamp,key_stamp in dates:
+            if key_stamp is not None:
+                self.import_run_key(date)
+            self._saw(date,stamp,key_stamp)
+        logging.info('Indexed {} runs under {}'.format(count,root))
+        return count
+
+    def import_run_key(self,date):
+        #run_key.txt rows are index, pressure, ..., solenoid current
+        key = np.atleast_2d(np.loadtxt(os.path.join(self.root,date,'run_key.txt'),skiprows=1))
+        with self.lock:
+            for row in key:
+                self.db.execute('UPDATE runs SET pressure=?,solenoid_current=? WHERE date=? AND kind=? AND number=?',
+                                (float(row[1]),float(row[3]),date,'raw',int(row[0])))
+            self.db.commit()
+
+    def _where(self,date=None,kind=None,number=None,solenoid_current=None,position_range=None):
+        clauses = []
+        args = []
+        for column,value in (('r.date',date),('r.kind',kind),('r.number',number),('r.solenoid_current',solenoid_current)):
+            if value is not None:
+                clauses.append('{}=?'.format(column))
+                args.append(value)
+        if position_range is not None:
+            clauses.append('s.position BETWEEN ? AND ?')
+            args += list(position_range)
+        return (' WHERE ' + ' AND '.join(clauses)) if clauses else '',args
+
+    def runs(self,date=None,kind=None,number=None,solenoid_current=None):
+        if date is not None:
+            self.ensure_indexed(date)
+        where,args = self._where(date,kind,number,solenoid_current)
+        with self.lock:
+            rows = self.db.execute('SELECT r.id,r.date,r.kind,r.number,r.path,r.created,r.settings,r.pressure,r.solenoid_current '
+                                   'FROM runs r{} ORDER BY r.date,r.kind,r.number'.format(where),args).fetchall()
+        return [Run(*row[:4],self._abs(row[4]),row[5],json.loads(row[6] or '{}'),*row[7:]) for row in rows]
+
+    def shots(self,date=None,kind=None,number=None,solenoid_current=None,position_range=None):
+        #every matching shot, source is what shot_store.load_shot takes
+        return list(self.iter_shots(date,kind,number,solenoid_current,position_range,page=None))
+
+    def iter_shots(self,date=None,kind=None,number=None,solenoid_current=None,position_range=None,page=5000):
+        #same as shots but fetched page rows at a time from one query, for runs too long to list in one go
+        if date is not None:
+            self.ensure_indexed(date)
+        where,args = self._where(date,kind,number,solenoid_current,position_range)
+        query = ('SELECT r.id,r.date,r.kind,r.number,r.path,s.shot,s.position,s.timestamp,s.file '
+                 'FROM shots s JOIN runs r ON s.run=r.id{} ORDER BY r.date,r.kind,r.number,s.position,s.shot'.format(where))
+        with self.lock:
+            cursor = self.db.execute(query,args)
+        while True:
+            with self.lock:
+                rows = cursor.fetchall() if page is None else cursor.fetchmany(page)
+            for run,date,kind,number,path,shot,position,timestamp,file in rows:
+                source = self._abs(file) if file else (shot_store.run_base(self._abs(path)),shot)
+                yield Shot(run,date,kind,number,shot,position,timestamp,source)
+            if page is None or len(rows) < page:
+                return
+
+    def by_date(self,date,kind=None):
+        return self.shots(date=date,kind=kind)
+
+    def by_scan(self,date,number):
+        return self.shots(date=date,kind='scan',number=number)
+
+    def by_position(self,date,number,low,high):
+        return self.shots(date=date,kind='scan',number=number,position_range=(low,high))
+
+    def by_solenoid_current(self,current,date=None):
+        return self.shots(date=date,solenoid_current=current)
+
+    def close(self):
+        self.db.close()
+
+if __name__=='__main__':
+    import sys
+    logging.basicConfig(level=logging.INFO)
+    root = sys.argv[1] if len(sys.argv) > 1 else 'data'
+    Catalog(root).index_tree()
@@ -0,0 +1,187 @@
+#plots of long traces through decimation, a line only ever gets a few points per pixel of its axes
+#each trace has a pyramid of min/max envelopes, every level keeping the samples where the trace is lowest
+#and highest in bins FACTOR times longer than the level below, so any view is served from the level whose
+#bins are closest to one pixel wide and spikes are never lost; zooming re-decimates the visible range
+#pyramids are cached per shot when a key is given, matplotlib is never imported here
+from collections import OrderedDict
+import numpy as np
+
+FACTOR = 4
+
+def _extreme(values,index,pick):
+    #per row of index (bins, FACTOR) the entry where values is lowest (pick=np.argmin) or highest
+    return np.take_along_axis(index,pick(values[index],axis=1)[:,None],1)[:,0]
+
+def _bins(index,size):
+    #pads to whole bins with the last entry, which cannot change a bin's min or max
+    pad = -len(index) % size
+    if pad:
+        index = np.concatenate([index,np.full(pad,index[-1])])
+    return index.reshape(-1,size)
+
+class Pyramid:
+    def __init__(self,x,y):
+        self.x = np.asarray(x)
+        self.y = np.asarray(y)
+        #nan is never the min or max of a bin unless the whole bin is nan
+        low = np.where(np.isnan(self.y),np.inf,self.y)
+        high = np.where(np.isnan(self.y),-np.inf,self.y)
+        #levels[k] holds (lowest,highest) sample indices of bins FACTOR**(k+1) samples long
+        self.levels = []
+        lo = hi = np.arange(len(self.y))
+        while len(lo) > FACTOR:
+            lo = _extreme(low,_bins(lo,FACTOR),np.argmin)
+            hi = _extreme(high,_bins(hi,FACTOR),np.argmax)
+            self.levels.append((lo,hi))
+
+    def __len__(self):
+        return len(self.y)
+
+    @property
+    def nbytes(self):
+        return sum(lo.nbytes + hi.nbytes for lo,hi in self.levels)
+
+    def indices(self,start,stop,pixels):
+        #sample indices to draw samples start:stop on about pixels pixels, in time order
+        count = stop - start
+        if count <= 2*pixels or not self.levels:
+            return np.arange(start,stop)
+        #coarsest level that still has a bin per pixel
+        k = min(int(np.log(count/pixels)/np.log(FACTOR)),len(self.levels)) - 1
+        if k < 0:
+            return np.arange(start,stop)
+        size = FACTOR**(k + 1)
+        lo,hi = self.levels[k]
+        a = start // size
+        b = -(-stop // size)
+        lo = lo[a:b]
+        hi = hi[a:b]
+        pairs = np.stack([np.minimum(lo,hi),np.maximum(lo,hi)],axis=1).ravel()
+        #the end samples keep the line spanning the whole range
+        return np.concatenate([[start],pairs[(pairs >= start) & (pairs < stop)],[stop - 1]])
+
+    def view(self,xlim,pixels):
+        #(x,y) of the samples inside xlim, plus one either side so the line reaches the edges
+        start = max(int(np.searchsorted(self.x,xlim[0],side='left')) - 1,0)
+        stop = min(int(np.searchsorted(self.x,xlim[1],side='right')) + 1,len(self.x))
+        if stop <= start:
+            return self.x[:0],self.y[:0]
+        index = self.indices(start,stop,pixels)
+        return self.x[index],self.y[index]
+
+def lttb(x,y,n):
+    #indices of n points picked by largest triangle three buckets, which follows the shape of a trace
+    #better than the envelope at the same number of points but has no pyramid, so it costs a pass per view
+    N = len(y)
+    if n >= N or n < 3:
+        return np.arange(N)
+    edges = np.linspace(1,N - 1,n - 1).astype(int)
+    picked = np.empty(n,dtype=int)
+    picked[0] = 0
+    picked[-1] = N - 1
+    for i in range(n - 2):
+        a,b = edges[i],edges[i+1]
+        c,d = b,(edges[i+2] if i + 2 < n - 1 else N)
+        #average of the next bucket stands in for the point not picked yet
+        nx = np.mean(x[c:d])
+        ny = np.mean(y[c:d])
+        px,py = x[picked[i]],y[picked[i]]
+        area = np.abs((px - nx)*(y[a:b] - py) - (px - x[a:b])*(ny - py))
+        picked[i+1] = a + int(np.argmax(np.nan_to_num(area,nan=-1.0)))
+    return picked
+
+class PyramidCache:
+    #least recently used pyramids by key, e.g. (shot source,channel)
+    def __init__(self,max_bytes=256e6):
+        self.max_bytes = max_bytes
+        self.pyramids = OrderedDict()
+        self.nbytes = 0
+
+    def get(self,key,x,y):
+        if key in self.pyramids:
+            self.pyramids.move_to_end(key)
+            return self.pyramids[key]
+        pyramid = Pyramid(x,y)
+        self.pyramids[key] = pyramid
+        self.nbytes += pyramid.nbytes
+        while self.nbytes > self.max_bytes and len(self.pyramids) > 1:
+            self.nbytes -= self.pyramids.popitem(last=False)[1].nbytes
+        return pyramid
+
+    def clear(self):
+        self.pyramids.clear()
+        self.nbytes = 0
+
+CACHE = PyramidCache()
+
+class DecimatedLine:
+    #a Line2D whose data is redone for the visible range whenever the x limits change
+    def __init__(self,ax,x,y,*args,key=None,method='envelope',pixels=None,cache=CACHE,**kwargs):
+        self.ax = ax
+        self.method = method
+        self.pixels = pixels
+        self.pyramid = cache.get(key,x,y) if key is not None and cache is not None else Pyramid(x,y)
+        xd,yd = self.data(None)
+        self.line, = ax.plot(xd,yd,*args,**kwargs)
+        #the callback registry only holds a weak reference to update, the line keeps this object alive
+        self.line._decimated = self
+        self.cid = ax.callbacks.connect('xlim_changed',self.update)
+
+    def width(self):
+        return self.pixels or max(int(self.ax.bbox.width),100)
+
+    def data(self,xlim):
+        p = self.pyramid
+        if xlim is None:
+            xlim = (p.x[0],p.x[-1]) if len(p) else (0,0)
+        if self.method == 'lttb':
+            x,y = p.view(xlim,len(p))
+            index = lttb(x,y,2*self.width())
+            return x[index],y[index]
+        return p.view(xlim,self.width())
+
+    def update(self,ax=None):
+        self.line.set_data(*self.data(sorted(self.ax.get_xlim())))
+
+    def remove(self):
+        self.ax.callbacks.disconnect(self.cid)
+        self.line.remove()
+        del self.line._decimated
+
+def plot(ax,x,y,*args,**kwargs):
+    #drop in for ax.plot(x,y,...) that returns [line] the same way, key and method as for DecimatedLine
+    return [DecimatedLine(ax,x,y,*args,**kwargs).line]
+
+def semilogy(ax,x,y,*args,**kwargs):
+    #the envelope of a trace is also the envelope of its log, so decimation does not care about the scale
+    ax.set_yscale('log')
+    return plot(ax,x,y,*args,**kwargs)
+
+if __name__=='__main__':
+    import time
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import fake_visa
+
+    #30 shots of 100k points overlaid, drawn in full and decimated, then zoomed in
+    shots = [fake_visa.synthetic_shot(100000,seed=k) for k in range(30)]
+    for name in ('full','decimated'):
+        fig,ax = plt.subplots()
+        t = time.perf_counter()
+        for k,shot in enumerate(shots):
+            if name == 'full':
+                ax.plot(shot[0],shot[3])
+            else:
+                plot(ax,shot[0],shot[3],key=(k,3))
+        fig.canvas.draw()
+        t_draw = time.perf_counter() - t
+        before = len(ax.lines[0].get_xdata())
+        t = time.perf_counter()
+        ax.set_xlim(shots[0][0][29000],shots[0][0][31000])
+        fig.canvas.draw()
+        x = ax.lines[0].get_xdata()
+        inside = np.sum((x >= shots[0][0][29000]) & (x <= shots[0][0][31000]))
+        print('{}: first draw {:.2f} s, zoomed draw {:.2f} s, first line {} points, {} after zooming, {} in view'.format(
+            name,t_draw,time.perf_counter() - t,before,len(x),inside))
+        plt.close(fig)
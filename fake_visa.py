@@ -0,0 +1,165 @@
+#local stand-in for the scope so acquisition code can run without hardware
+import logging
+import time
+import numpy as np
+
+def synthetic_shot(npts=500,xincr=501.002,seed=None,pulse=(0.3,0.7),current=60.0,V_d2=3.0,shunt_drop=0.5):
+    #(5,npts) shot shaped like data/07_31_2018, CH2 carries the current pulse (current = -100*CH2)
+    rng = np.random.default_rng(seed)
+    t = np.linspace(0.0,npts*xincr,npts)
+    on = np.zeros(npts,dtype=bool)
+    on[int(pulse[0]*npts):int(pulse[1]*npts)] = True
+
+    high = 15.0 + 0.5*on + rng.normal(0.0,0.02,npts)
+    F = np.where(on,high - V_d2,14.6) + rng.normal(0.0,0.02,npts)
+    low = np.where(on,high - shunt_drop,15.4) + rng.normal(0.0,0.02,npts)
+    CH2 = np.where(on,-current/100.0,0.04) + rng.normal(0.0,0.005,npts)
+    return np.array([t,F,CH2,high,low])
+
+class FakeScope:
+    #speaks enough of the Tektronix command set for App.read_scope
+    def __init__(self,npts=500,xincr=501.002,supports_binary=True,seed=None,rep_rate=None,latency=0.0,misfire=0.0):
+        #latency (s) is added to every curve transfer, a stand-in for the bus
+        #misfire is the fraction of shots where the current pulse never comes
+        self.npts = npts
+        self.latency = latency
+        self.misfire = misfire
+        self.xincr = xincr
+        self.supports_binary = supports_binary
+        self.rng = np.random.default_rng(seed)
+
+        #with rep_rate set the plasma source fires at fixed times and single sequences wait for it
+        self.rep_rate = rep_rate
+        self._t0 = time.monotonic()
+        self._trigger_at = None
+
+        self.source = 'CH1,CH2,CH3,CH4'
+        self.encoding = 'ASCII'
+        self.width = 1
+        self.ymult = np.array([0.04,0.008,0.04,0.04])
+        self.yoff = np.zeros(4)
+        self.yzero = np.array([15.0,0.0,15.0,15.0])
+
+        #visa timeout in ms, pyvisa's default
+        self.timeout = 2000
+        self.writes = []
+        self.queries = []
+        self._pending = None
+
+    def _vertical(self):
+        #wider samples get finer steps, unsigned samples get an offset of half the range
+        ymult = self.ymult / 256**(self.width - 1)
+        yoff = self.yoff * 256**(self.width - 1)
+        if self.encoding == 'RPBinary':
+            yoff = yoff + 2**(8*self.width - 1)
+        return ymult,yoff
+
+    def _codes(self):
+        current = 0.0 if self.misfire and self.rng.random() < self.misfire else 60.0
+        shot = synthetic_shot(self.npts,self.xincr,seed=self.rng.integers(2**31),current=current)
+        ymult,yoff = self._vertical()
+        codes = np.rint((shot[1:] - self.yzero[:,None]) / ymult[:,None] + yoff[:,None])
+        if self.encoding == 'RPBinary':
+            codes = np.clip(codes,0,2**(8*self.width) - 1)
+        else:
+            codes = np.clip(codes,-2**(8*self.width - 1),2**(8*self.width - 1) - 1)
+        return codes.astype(np.int64)
+
+    def write(self,cmd):
+        self.writes.append(cmd)
+        name,_,arg = cmd.strip().partition(' ')
+        name = name.upper()
+        if name == 'DATA:SOURCE':
+            self.source = arg
+        elif name == 'DATA:ENCDG':
+            if arg.upper().startswith('ASC') or self.supports_binary:
+                self.encoding = {'RIB':'RIBinary','RPB':'RPBinary'}.get(arg[:3].upper(),'ASCII')
+        elif name == 'DATA:WID':
+            self.width = int(arg)
+        elif name == 'ACQ:STATE' and arg.upper() in ('RUN','ON','1'):
+            self._trigger_at = self._next_trigger()
+        elif name == 'CURV?':
+            self._pending = self._curve()
+
+    def _next_trigger(self):
+        now = time.monotonic()
+        if not self.rep_rate:
+            return now
+        period = 1.0 / self.rep_rate
+        return self._t0 + (np.floor((now - self._t0) / period) + 1)*period
+
+    def _curve(self):
+        if self.encoding == 'ASCII':
+            return (','.join(str(int(c)) for c in self._codes().ravel()) + '\n').encode()
+        kind = 'u' if self.encoding == 'RPBinary' else 'i'
+        payload = self._codes().astype('>{}{}'.format(kind,self.width)).tobytes()
+        length = str(len(payload)).encode()
+        return b'#' + str(len(length)).encode() + length + payload + b'\n'
+
+    def _preamble(self):
+        if self.encoding == 'ASCII':
+            head = [str(self.width),str(8*self.width),'ASC','RI','MSB']
+        else:
+            head = [str(self.width),str(8*self.width),'BIN',self.encoding[:2].upper(),'MSB']
+        ymult,yoff = self._vertical()
+        channels = []
+        for j in range(4):
+            channels += ['"Ch{}, DC coupling"'.format(j+1),str(self.npts),'Y','"s"','{:e}'.format(self.xincr),
+                         '0.0E0','0','{:e}'.format(ymult[j]),'{:e}'.format(yoff[j]),'{:e}'.format(self.yzero[j])]
+        return ';'.join(head + channels) + '\n'
+
+    def read_raw(self):
+        if self._pending is None:
+            raise ValueError('Nothing to read')
+        raw,self._pending = self._pending,None
+        if self.latency:
+            time.sleep(self.latency)
+        return raw
+
+    def read(self):
+        return self.read_raw().decode()
+
+    def query(self,cmd):
+        self.queries.append(cmd)
+        name = cmd.strip().upper()
+        if name == 'WFMPR?':
+            return self._preamble()
+        elif name == '*IDN?':
+            return 'FAKE,TDS,0,0\n'
+        elif name == '*OPC?':
+            if self._trigger_at is not None:
+                time.sleep(max(self._trigger_at - time.monotonic(),0.0))
+            return '1\n'
+        elif name == 'ACQ:STATE?':
+            running = self._trigger_at is not None and time.monotonic() < self._trigger_at
+            return '1\n' if running else '0\n'
+        self.write(cmd)
+        return self.read()
+
+    def query_ascii_values(self,cmd,container=list,separator=','):
+        if self.encoding != 'ASCII':
+            raise ValueError('Scope is sending binary data')
+        values = [float(v) for v in self.query(cmd).strip().split(separator)]
+        return container(values)
+
+    def close(self):
+        pass
+
+class FakeResourceManager:
+    def __init__(self,**kw):
+        self.kw = kw
+
+    def open_resource(self,name):
+        logging.info('Opening fake resource {}'.format(name))
+        return FakeScope(**self.kw)
+
+if __name__=='__main__':
+    import scope
+
+    logging.basicConfig(level=logging.INFO)
+    for encoding,width in [('ASCII',1),('RIBinary',1),('RIBinary',2),('RPBinary',1)]:
+        fake = FakeScope(seed=0)
+        scope.configure(fake,encoding,width)
+        preamble = scope.read_preamble(fake)
+        data = scope.read_curve(fake,preamble)
+        print(encoding,width,data.shape,data[1:].mean(axis=1))
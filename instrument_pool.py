@@ -0,0 +1,124 @@
+#several scopes read as one, every scope is armed, waited on and read on its own thread
+#shots from all of them are stacked into one (5*n_scopes,npts) record so a run holds every probe
+import time
+import logging
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+import scope
+import telemetry
+
+class Instrument:
+    def __init__(self,name,resource,encoding='RIBinary',width=1,check_interval=None):
+        self.name = name
+        self.resource = resource
+        self.session = scope.ScopeSession(resource,encoding,width,check_interval)
+
+    @property
+    def preamble(self):
+        return self.session.preamble
+
+    def setup(self,refresh=False):
+        return self.session.refresh() if refresh else self.session.ensure()
+
+    def capture(self,out,trigger=True,timeout=10.0):
+        #returns when the trigger was seen and when the data was in, both wall clock
+        if trigger:
+            scope.arm(self.resource)
+            scope.wait_for_trigger(self.resource,timeout)
+        triggered = time.time()
+        self.session.read(out)
+        return triggered,time.time()
+
+    def run_continuous(self):
+        scope.run_continuous(self.resource)
+
+    def close(self):
+        self.resource.close()
+
+class InstrumentPool:
+    def __init__(self,manager,resources,encoding='RIBinary',width=1,trigger=True,timeout=10.0,max_skew=None,check_interval=None):
+        #resources is a list of visa addresses or (name,address) pairs, in the order they are stacked
+        #max_skew (s) is how far apart the trigger times may be before a shot is flagged as misaligned
+        self.trigger = trigger
+        self.timeout = timeout
+        self.max_skew = max_skew
+        self.instruments = []
+        for k,resource in enumerate(resources):
+            name,address = resource if isinstance(resource,(tuple,list)) else ('scope{}'.format(k),resource)
+            logging.info('Opening {} at {}'.format(name,address))
+            self.instruments.append(Instrument(name,manager.open_resource(address),encoding,width,check_interval))
+        self.executor = ThreadPoolExecutor(max_workers=max(len(self.instruments),1),thread_name_prefix='scope')
+        self.npts = None
+        self.misaligned = 0
+
+    def __len__(self):
+        return len(self.instruments)
+
+    @property
+    def names(self):
+        return [instrument.name for instrument in self.instruments]
+
+    @property
+    def nchannels(self):
+        return 5*len(self.instruments)
+
+    def setup(self,refresh=False):
+        #refresh re-reads every preamble, as at the start of a run, whatever the sessions' check_interval
+        preambles = list(self.executor.map(lambda instrument: instrument.setup(refresh),self.instruments))
+        npts = {p.npts for p in preambles}
+        if len(npts) != 1:
+            raise ValueError('Scopes record different lengths {}, set them to the same record length'.format(
+                dict(zip(self.names,[p.npts for p in preambles]))))
+        self.npts = npts.pop()
+        return preambles
+
+    def settings(self):
+        #what goes in the run header so the stacked channels can be taken apart again
+        return {'instruments':self.names,'preambles':{i.name:i.preamble.as_dict() for i in self.instruments}}
+
+    def read_shot(self,out=None):
+        #one shot from every scope, wall time is that of the slowest scope rather than the sum
+        if self.npts is None:
+            self.setup()
+        if out is None:
+            out = np.empty((self.nchannels,self.npts))
+        blocks = split(out,len(self))
+        with telemetry.span('pool.read'):
+            futures = [self.executor.submit(instrument.capture,block,self.trigger,self.timeout)
+                       for instrument,block in zip(self.instruments,blocks)]
+            times = [future.result() for future in futures]
+        triggered = [t for t,done in times]
+        meta = {'triggers':dict(zip(self.names,triggered)),'skew':max(triggered) - min(triggered)}
+        if self.max_skew is not None and meta['skew'] > self.max_skew:
+            self.misaligned += 1
+            meta['misaligned'] = True
+            logging.warning('Scope triggers {:.1f} ms apart'.format(1e3*meta['skew']))
+        return out,meta
+
+    def run_continuous(self):
+        list(self.executor.map(lambda instrument: instrument.run_continuous(),self.instruments))
+
+    def close(self):
+        self.executor.shutdown()
+        for instrument in self.instruments:
+            instrument.close()
+
+def split(data,n_scopes):
+    #(5*n_scopes,npts) stacked shot, or a stack of them, to (...,n_scopes,5,npts) views
+    data = np.asarray(data)
+    return data.reshape(data.shape[:-2] + (n_scopes,5,data.shape[-1]))
+
+if __name__=='__main__':
+    import fake_visa
+
+    logging.basicConfig(level=logging.INFO)
+    manager = fake_visa.FakeResourceManager(latency=0.02)
+    for n in (1,2,4):
+        pool = InstrumentPool(manager,['FAKE{}::INSTR'.format(k) for k in range(n)],max_skew=0.005)
+        pool.setup()
+        t = time.perf_counter()
+        for i in range(10):
+            data,meta = pool.read_shot()
+        print('{} scopes: {:.1f} ms per shot, last skew {:.2f} ms'.format(n,100*(time.perf_counter() - t),1e3*meta['skew']))
+        pool.close()
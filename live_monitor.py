@@ -0,0 +1,143 @@
+#live plasma parameters, shots are read on one thread and reduced on another while the gui redraws at its own rate
+import threading
+import queue
+import logging
+import time
+import numpy as np
+
+import probe_math as pmath
+from stats import RollingStats
+
+class LiveMonitor:
+    def __init__(self,read_shot,window=50,analyse=pmath.calc_trace_params_batch,filename=None,prefilter=None,poll=0.05):
+        #analyse takes a (n,5,npts) stack and returns (n,4) rows of T, std T, density, std density,
+        #the default is the same analysis as App.shot_params
+        #prefilter is applied to each stack before analysis, e.g. a pmath.StreamingFilter
+        #a read that returns the frame already seen (a stopped scope) is skipped and the next read waits poll s,
+        #reading never waits on the analysis, the queue is unbounded so no shot is dropped and a worker that
+        #falls behind catches up by reducing everything queued in one call
+        self.read_shot = read_shot
+        self.analyse = analyse
+        self.prefilter = prefilter
+        self.filename = filename
+        self.poll = poll
+
+        self.stats = RollingStats(window,(2,))
+        self.last = None
+        self.shots = 0
+        self.failed = 0
+        self.repeats = 0
+        self.dropped = 0
+        self.error = None
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._reader = threading.Thread(target=self._read,name='live-read',daemon=True)
+        self._worker = threading.Thread(target=self._reduce,name='live-reduce',daemon=True)
+
+    def start(self):
+        self._reader.start()
+        self._worker.start()
+        return self
+
+    def stop(self,timeout=None):
+        #the worker finishes the shots already read first, those still queued when timeout runs out are dropped
+        self._stop.set()
+        self._reader.join(timeout)
+        self._worker.join(timeout)
+        if self._worker.is_alive():
+            self.dropped = self.backlog
+
+    @property
+    def running(self):
+        return self._reader.is_alive()
+
+    @property
+    def backlog(self):
+        return self._queue.qsize()
+
+    def _read(self):
+        previous = None
+        try:
+            while not self._stop.is_set():
+                data = self.read_shot()
+                if previous is not None and np.array_equal(data,previous):
+                    self.repeats += 1
+                    self._stop.wait(self.poll)
+                    continue
+                previous = data
+                self._queue.put((time.time(),data))
+        except Exception as e:
+            logging.exception('Live reader stopped')
+            self.error = e
+        finally:
+            self._queue.put(None)
+
+    def _reduce(self):
+        done = False
+        while not done:
+            batch = [self._queue.get()]
+            #take everything that piled up since the last pass and reduce it in one call
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if any(item is None for item in batch):
+                done = True
+                batch = [item for item in batch if item is not None]
+            if not batch:
+                continue
+
+            times = [t for t,data in batch]
+            try:
+                shots = np.stack([data for t,data in batch])
+                if self.prefilter is not None:
+                    shots = self.prefilter(shots)
+                props = self.analyse(shots)
+            except Exception as e:
+                logging.warning('Live analysis of {} shots failed: {}'.format(len(batch),e))
+                props = np.full((len(batch),4),np.nan)
+            good = np.all(np.isfinite(props),axis=1)
+            with self._lock:
+                for row in props[good]:
+                    self.stats.add((row[2],row[0]))
+                    self.last = row
+                self.shots += len(batch)
+                self.failed += int(np.sum(~good))
+            if self.filename:
+                self._save(times,props)
+
+    def _save(self,times,props):
+        with open(self.filename,'a') as file:
+            for t,(T,std_T,n,std_n) in zip(times,props):
+                file.write('{:.4e},{:.4e},{:.4e},{:.4e},{}\n'.format(n,std_n,T,std_T,t))
+
+    def snapshot(self):
+        #rolling (density,temperature) mean and spread, plus counters, safe to call from the gui
+        with self._lock:
+            return {'mean':self.stats.mean.copy(),'std':self.stats.std.copy(),'sem':self.stats.sem.copy(),
+                    'n':self.stats.n,'shots':self.shots,'failed':self.failed,'backlog':self.backlog,
+                    'repeats':self.repeats,'dropped':self.dropped}
+
+if __name__=='__main__':
+    import fake_visa
+    import scope
+
+    logging.basicConfig(level=logging.INFO)
+    fake = fake_visa.FakeScope(seed=0)
+    scope.configure(fake)
+    preamble = scope.read_preamble(fake)
+    monitor = LiveMonitor(lambda: scope.read_curve(fake,preamble)).start()
+    for i in range(5):
+        time.sleep(0.2)
+        print(monitor.snapshot())
+    monitor.stop()
+
+    #a scope left stopped on one sequence keeps sending the same frame, which is only analysed once
+    frozen = scope.read_curve(fake,preamble)
+    monitor = LiveMonitor(lambda: frozen).start()
+    time.sleep(0.3)
+    monitor.stop()
+    print(monitor.snapshot())
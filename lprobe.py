@@ -0,0 +1,206 @@
+#headless batch analysis, e.g.
+#python lprobe.py analyze scan 02_06_2019 1 --loc 2 80 2 --out scan.csv
+#python lprobe.py analyze time 11_27_2018 0 --shots all --out time.parquet
+#python lprobe.py analyze solenoid 11_01_2018 --runs 3 0 2 1 --values 15 20 25 30 --bootstrap 1000 --sigma A=0.03
+#python lprobe.py analyze archive data/11_27_2018 --workers 8 --out archive.csv
+#python lprobe.py watch data/02_06_2019/scans/scan_1 --out scan.csv
+#matplotlib is only imported when --plot is given, and then with the Agg backend
+import sys
+import logging
+import argparse
+import numpy as np
+
+import catalog
+from analysis_engine import AnalysisEngine,CACHE_FILE
+
+TIME_COLUMNS = ('shot','T','std_T','density','std_density')
+ARCHIVE_COLUMNS = ('folder','shot','T','std_T','density','std_density')
+
+def write_table(path,columns,rows):
+    #csv, or parquet through pandas when the name ends in .parquet, no path writes csv to stdout
+    if path is not None and path.endswith('.parquet'):
+        try:
+            import pandas as pd
+        except ImportError:
+            raise SystemExit('Writing parquet needs pandas and pyarrow, use a .csv name instead')
+        pd.DataFrame(list(rows),columns=list(columns)).to_parquet(path,index=False)
+    else:
+        file = open(path,'w') if path else sys.stdout
+        try:
+            file.write(','.join(columns) + '\n')
+            for row in rows:
+                file.write(','.join(str(v) for v in row) + '\n')
+        finally:
+            if path:
+                file.close()
+    if path:
+        logging.info('Wrote {}'.format(path))
+
+def plot_table(path,table,xlabel,label=None):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    fig,ax = plt.subplots(2,1,sharex=True)
+    ntdata = np.asarray(table,dtype=float).T
+    ax[0].errorbar(ntdata[0],ntdata[3],ntdata[4],fmt='o',capsize = 3,label=label)
+    ax[1].errorbar(ntdata[0],ntdata[1],ntdata[2],fmt='o',capsize = 3,label=label)
+    ax[0].set_ylabel('Plasma Density [$cm^{-3}$]')
+    ax[1].set_ylabel('Electron Temperature [eV]')
+    ax[1].set_xlabel(xlabel)
+    fig.savefig(path)
+    logging.info('Saved {}'.format(path))
+
+def make_engine(args):
+    return AnalysisEngine(cache_path=None if args.no_cache else args.cache,workers=args.workers,
+                          chunk_size=args.chunk,buffer_size=args.buffer_size,threshold=args.threshold)
+
+def make_propagation(args):
+    #None unless --bootstrap is given, --sigma A=0.03 --sigma offset=0.05 adds constants to the draw
+    if not args.bootstrap:
+        return None
+    import uncertainty
+    import windows
+    import calibration
+    sigma = {}
+    for item in args.sigma:
+        name,_,value = item.partition('=')
+        sigma[name] = float(value)
+    diode = {'nominal':calibration.NOMINAL,'bench':calibration.BENCH}.get(args.diode)
+    try:
+        constants = uncertainty.Constants(diode=diode,sigma=sigma)
+    except TypeError as e:
+        raise SystemExit(str(e))
+    return uncertainty.Propagation(args.bootstrap,args.seed,constants,policy=windows.Threshold(args.threshold,args.buffer_size))
+
+def scan(args,engine,cat):
+    import analyze2
+    loc = np.arange(*args.loc) if args.loc else None
+    table = analyze2.longitudinal_table(args.date,args.number,loc,args.shift,args.samples,cat,engine,make_propagation(args))
+    write_table(args.out,analyze2.TABLE_COLUMNS,table.tolist())
+    if args.plot:
+        plot_table(args.plot,table,'Longitudinal Position','scan {}'.format(args.number))
+
+def solenoid(args,engine,cat):
+    import analyze2
+    if len(args.runs) != len(args.values):
+        raise SystemExit('--runs and --values need the same number of entries')
+    table = analyze2.solenoid_table(args.runs,args.date,args.values,args.samples,cat,engine,make_propagation(args))
+    write_table(args.out,analyze2.TABLE_COLUMNS,table.tolist())
+    if args.plot:
+        plot_table(args.plot,table,'Solenoid Current [A]')
+
+def time_series(args,engine,cat):
+    import plot_over_time
+    n_shots = None if args.shots == 'all' else int(args.shots)
+    table,summary = plot_over_time.time_table(args.date,args.number,n_shots,cat,args.stream_chunk,engine)
+    write_table(args.out,TIME_COLUMNS,[[int(row[0])] + row[1:] for row in table.tolist()])
+    logging.info(summary.result())
+    if args.plot:
+        plot_table(args.plot,table,'Shot Number')
+
+def archive(args,engine,cat):
+    #every run and text folder under the roots, one row per shot
+    def rows():
+        for root in args.roots:
+            for folder,(sources,results) in engine.walk(root).items():
+                for k,row in enumerate(results.tolist()):
+                    yield [folder,k] + row
+    write_table(args.out,ARCHIVE_COLUMNS,rows())
+
+def watch_folder(args,engine,cat):
+    #only shots that arrived since the last update are analysed, the table is rewritten after each update
+    import watch
+    import analyze2
+    columns = analyze2.TABLE_COLUMNS if args.mode == 'scan' else TIME_COLUMNS
+    def write(w):
+        if args.mode == 'scan':
+            write_table(args.out,columns,w.table().tolist())
+        else:
+            write_table(args.out,columns,[[int(row[0])] + row[1:] for row in w.shots().tolist()])
+    if args.once:
+        w = watch.FolderWatch(args.folder,engine,settle=0.0)
+        w.update()
+        write(w)
+        w.close()
+        return
+    try:
+        watch.follow(args.folder,args.interval,args.mode,engine,show=args.show,on_update=write)
+    except KeyboardInterrupt:
+        pass
+
+def parser():
+    p = argparse.ArgumentParser(prog='lprobe',description='Langmuir probe batch analysis')
+    commands = p.add_subparsers(dest='command',required=True)
+    analyze = commands.add_parser('analyze',help='analyze shots from the data tree')
+    kinds = analyze.add_subparsers(dest='kind',required=True)
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--root',default='data',help='data tree with the catalog')
+    common.add_argument('--out',default=None,help='.csv or .parquet file, csv to stdout if not given')
+    common.add_argument('--plot',default=None,help='also save a figure to this file')
+    common.add_argument('--workers',type=int,default=None,help='analysis processes, default one per core')
+    common.add_argument('--chunk',type=int,default=64,help='shots per worker task')
+    common.add_argument('--cache',default=CACHE_FILE,help='per shot result cache')
+    common.add_argument('--no-cache',action='store_true')
+    common.add_argument('--buffer-size',type=float,default=0.2,help='fraction of the pulse trimmed off each end')
+    common.add_argument('--threshold',type=float,default=40,help='current (A) that marks the pulse')
+    common.add_argument('-v','--verbose',action='store_true')
+
+    errors = argparse.ArgumentParser(add_help=False)
+    errors.add_argument('--bootstrap',type=int,default=0,metavar='N',help='error bars from N resamples of the shots')
+    errors.add_argument('--seed',type=int,default=0)
+    errors.add_argument('--sigma',action='append',default=[],metavar='NAME=VALUE',
+                        help='uncertainty of A, M, shunt, offset or slope to include in the resampling')
+    errors.add_argument('--diode',choices=('nominal','bench'),default=None,help='shot current from the diode instead of the shunt')
+
+    s = kinds.add_parser('scan',parents=[common,errors],help='longitudinal scan, mean parameters per position')
+    s.add_argument('date')
+    s.add_argument('number',type=int)
+    s.add_argument('--loc',type=float,nargs=3,metavar=('START','STOP','STEP'),help='positions, default every one in the scan')
+    s.add_argument('--shift',type=float,default=0.0)
+    s.add_argument('--samples',type=int,default=10,help='shots per position')
+    s.set_defaults(run=scan)
+
+    t = kinds.add_parser('time',parents=[common],help='parameters of every shot in a raw run')
+    t.add_argument('date')
+    t.add_argument('number',type=int)
+    t.add_argument('--shots',default='30',help='number of shots or all')
+    t.add_argument('--stream-chunk',type=int,default=1024,
+                   help='shots read and analysed per step, split into --chunk shot tasks across the workers')
+    t.set_defaults(run=time_series,buffer_size=0.15)
+
+    o = kinds.add_parser('solenoid',parents=[common,errors],help='mean parameters per solenoid current')
+    o.add_argument('date')
+    o.add_argument('--runs',type=int,nargs='+',required=True)
+    o.add_argument('--values',type=float,nargs='+',required=True,help='solenoid current of each run')
+    o.add_argument('--samples',type=int,default=10,help='shots per run')
+    o.set_defaults(run=solenoid)
+
+    a = kinds.add_parser('archive',parents=[common],help='every shot under one or more folders')
+    a.add_argument('roots',nargs='+')
+    a.set_defaults(run=archive)
+
+    w = commands.add_parser('watch',parents=[common],help='keep a table (and plot) of a folder that is being written up to date')
+    w.add_argument('folder')
+    w.add_argument('--mode',choices=('scan','time'),default='scan',help='per position table or every shot')
+    w.add_argument('--interval',type=float,default=2.0,help='seconds between updates')
+    w.add_argument('--show',action='store_true',help='live errorbar plot')
+    w.add_argument('--once',action='store_true',help='update once and exit')
+    w.set_defaults(run=watch_folder,cache=None)
+    return p
+
+def main(argv=None):
+    args = parser().parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO,stream=sys.stderr)
+    cat = catalog.Catalog(args.root) if args.command == 'analyze' and args.kind != 'archive' else None
+    engine = make_engine(args)
+    try:
+        args.run(args,engine,cat)
+    finally:
+        logging.info('{} shots from cache, {} computed'.format(engine.hits,engine.misses))
+        engine.close()
+        if cat is not None:
+            cat.close()
+
+if __name__=='__main__':
+    main()
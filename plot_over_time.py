@@ -1,12 +1,15 @@
 import numpy as np
-import numpy.ma as ma
-import matplotlib.pyplot as plt
 import probe_math as pmath
-from scipy.ndimage import filters
+import shot_store
+import windows
+import catalog
+import streaming
 import logging
 
-def calc_plasma_prop(fname,plotting=False):
-    data = np.loadtxt(fname).T
+#matplotlib is only imported by the functions that plot
+
+def calc_plasma_prop(fname,plotting=False,policy=None):
+    data = shot_store.load_shot(fname)
     
     t = data[0]
     F = data[1]
@@ -15,66 +18,75 @@ def calc_plasma_prop(fname,plotting=False):
     low = data[4]
 
     #get t range where we want to calculate properties
-    buffer_size = 0.15
-    indicies = np.argwhere(current > 40).flatten()
-    l = len(indicies)
-    indicies = indicies[int(l*buffer_size):-int(l*buffer_size)]
-
-    mask_array = np.ones(len(t))
-    mask_array[indicies] = 0
-    
+    start,stop,mask = (policy or windows.Threshold(40,0.15)).select(data)
+    window = windows.samples(start,stop,mask)
     
-    signals = [t,F,high,low,current]
-    msignals = []
-    for signal in signals:
-        msignals.append(ma.array(signal,mask=mask_array))
-        
-    shunt_current = (msignals[2]-msignals[3])/98
+    shunt_current = (high[window]-low[window])/98
     
     A = 0.66 #mm^2 (probe cross section area
     M = 40 #effective ion weight
     V_bias = 100
         
-    T = pmath.T_e(msignals[2]-msignals[1],V_bias)    
-    density = (M**0.5 / A) * shunt_current*1e6*pmath.f1(msignals[2]-msignals[1],T)
+    T = pmath.T_e(high[window]-F[window],V_bias)    
+    density = (M**0.5 / A) * shunt_current*1e6*pmath.f1(high[window]-F[window],T)
 
 
     if plotting:
+        import matplotlib.pyplot as plt
+        import os
+        import decimate
+        #pyramids of a shot file are kept, so plotting it again only re-decimates
+        key = (fname,os.path.getmtime(fname),int(start),int(stop)) if isinstance(fname,str) else None
         fig,ax = plt.subplots()
         
         labels = ['t','F','high','low','current']
+        signals = [t,F,high,low,current]
         for i in range(1,4):
-            ax.plot(msignals[0],msignals[i],label=labels[i])
+            decimate.plot(ax,t[window],signals[i][window],label=labels[i],key=key and key + (labels[i],))
 
         axa = ax.twinx()
-        axa.plot(t,current)    
+        decimate.plot(axa,t,current,key=key and key + ('current',))    
 #        axa.plot(mask_array*100)
         ax.legend()
         
         fig2,ax2 = plt.subplots()
-        ax2.plot(t,T,'g')
+        decimate.plot(ax2,t[window],T,'g',key=key and key + ('T',))
         ax3 = ax2.twinx()
-        ax3.semilogy(t,density)
+        decimate.semilogy(ax3,t[window],density,key=key and key + ('density',))
 
     return (np.mean(T),np.std(T),np.mean(density),np.std(density))
 
 
-def time_scan(base):
+def time_table(date,number,n_shots=30,cat=None,chunk=256,engine=None):
+    #n_shots=None takes the whole run, shots are read chunk at a time and only the 4 parameters per shot are kept
+    #returns (n,5) rows of shot number, T, std T, density, std density and the running summary
+    cat = cat or catalog.Catalog()
+    records = cat.iter_shots(date=date,kind='raw',number=number)
+    if n_shots is not None:
+        records = (record for k,record in zip(range(n_shots),records))
+    summary = streaming.Summary()
+    props = [np.empty((0,4))]
+    for part,chunk_props in streaming.iter_params(records,chunk,engine,buffer_size=0.15):
+        summary.add(part,chunk_props)
+        props.append(chunk_props)
+        logging.info('{} shots, {}'.format(summary.stats.n + summary.failed,summary.result()['mean']))
+    props = np.concatenate(props)
+    return np.column_stack([np.arange(len(props)),props]),summary
+
+def time_scan(date,number,n_shots=30,cat=None,chunk=256):
+    import matplotlib.pyplot as plt
     fig,ax = plt.subplots(2,1,sharex=True)
-    
-    tdata = []
-    for i in range(30):
-        tdata.append((i,*calc_plasma_prop(base.format(i))))
-    ntdata = np.asfarray(tdata).T
-    logging.info(ntdata)
+    table,summary = time_table(date,number,n_shots,cat,chunk)
+    ntdata = table.T
     ax[0].errorbar(ntdata[0],ntdata[3],ntdata[4],fmt='o',capsize = 3)
     ax[1].errorbar(ntdata[0],ntdata[1],ntdata[2],fmt='o',capsize = 3)
 
-    avg_dens = np.mean(ntdata[3])
-    std_dens = np.std(ntdata[3])
+    result = summary.result()
+    avg_dens = result['mean']['density']
+    std_dens = result['std']['density']
 
-    avg_temp = np.mean(ntdata[1])
-    std_temp = np.std(ntdata[1])
+    avg_temp = result['mean']['T']
+    std_temp = result['std']['T']
     
     ax[0].axhline(avg_dens,ls='-')
     for i in [-1,1]: ax[0].axhline(avg_dens+std_dens*i,ls='--')
@@ -86,8 +98,10 @@ def time_scan(base):
     ax[0].set_ylabel('Plasma Density [$cm^{-3}$]')
     ax[1].set_ylabel('Plasma Temperature [eV]')
     
-logging.basicConfig(level = logging.INFO)
-#calc_plasma_prop('11_19_2018/raw/10/data_0.txt',plotting=True)
-time_scan('data/11_27_2018/raw/0/data_{}.txt')
+if __name__=='__main__':
+    import matplotlib.pyplot as plt
+    logging.basicConfig(level = logging.INFO)
+    #calc_plasma_prop('11_19_2018/raw/10/data_0.txt',plotting=True)
+    time_scan('11_27_2018',0)
 
-plt.show()
+    plt.show()
@@ -1,75 +1,148 @@
 #plasma calculations
+from functools import lru_cache
 import numpy as np
 import scipy.signal as signal
-import matplotlib.pyplot as plt
 
-def apply_filter(data):
-    filter_params = [3,0.05]
-    
-    b,a = signal.butter(filter_params[0],filter_params[1],output='ba')
-    t = data[0]
-    CH1 = signal.filtfilt(b,a,data[1])
-    CH2 = signal.filtfilt(b,a,data[2])
-    CH3 = signal.filtfilt(b,a,data[3])
-    CH4 = signal.filtfilt(b,a,data[4])
-    return [t,CH1,CH2,CH3,CH4]
-
-def calculate_plasma_trace(data):
-    A = 0.66 #mm^2 (probe cross section area
-    M = 40 #effective ion weight
-    V_bias = 60
-    
+import windows
+
+@lru_cache(maxsize=32)
+def filter_design(order=3,cutoff=0.05,btype='lowpass'):
+    #second order sections, designed once per set of parameters
+    return signal.butter(order,cutoff,btype=btype,output='sos')
+
+def apply_filter(data,order=3,cutoff=0.05,btype='lowpass'):
+    #zero phase filter of the scope channels, data is one (5,npts) shot or a (...,5,npts) stack
+    #time (channel 0) is passed through and every other channel and shot is filtered in one call
+    data = np.array(data,dtype=float)
+    data[...,1:,:] = signal.sosfiltfilt(filter_design(order,cutoff,btype),data[...,1:,:],axis=-1)
+    return data
+
+class StreamingFilter:
+    #causal filter for the live path, cheaper than apply_filter's two passes
+    #every shot is its own record and starts from steady state at its first samples, so a shot filters the
+    #same whatever batch it comes in; feed() continues one long record chunk by chunk, carrying the state
+    def __init__(self,order=3,cutoff=0.05,btype='lowpass'):
+        self.sos = filter_design(order,cutoff,btype)
+        self.zi = None
+
+    def reset(self):
+        #the next feed() starts a new record
+        self.zi = None
+
+    def _steady(self,channels):
+        #steady state of every channel at its first sample
+        zi = signal.sosfilt_zi(self.sos)
+        return zi[(slice(None),) + (None,)*(channels.ndim - 1)] * channels[None,...,:1]
+
+    def __call__(self,data):
+        #one (5,npts) shot or a (...,5,npts) stack
+        data = np.array(data,dtype=float)
+        channels = data[...,1:,:]
+        data[...,1:,:] = signal.sosfilt(self.sos,channels,axis=-1,zi=self._steady(channels))[0]
+        return data
+
+    def feed(self,chunk):
+        #the next (5,n) samples of one continuous record
+        chunk = np.array(chunk,dtype=float)
+        channels = chunk[1:]
+        if self.zi is None:
+            self.zi = self._steady(channels)
+        chunk[1:],self.zi = signal.sosfilt(self.sos,channels,axis=-1,zi=self.zi)
+        return chunk
+
+def calculate_plasma_trace(data,conversion=None):
     #channel convention
     #CH1: F,CH2:trigger/current measurement,CH3:+,CH4:-
-    t = data[0]
-    CH1 = data[1]
-    CH2 = data[2]
-    CH3 = data[3]
-    CH4 = data[4]
-                
-    V_d2 = CH3 - CH1
-    T = T_e(V_d2,V_bias)
-    
-    V_d3 = 10**(((CH3 - CH4)-2.65)/0.95)
-    #V_d3 = 10**(((CH3 - CH4)-5.85)/1.0)
-    R = 1.1
-    I_3 = V_d3/R
-        
-    density = (M**0.5 / A) * I_3 * 1e6 * f1(V_d2,T)
-    return density,T
+    #probe area, ion mass and the diode calibration are in a calibration.Conversion,
+    #raw code shots are faster through Conversion.tabulate_codes and trace_codes
+    if conversion is None:
+        import calibration
+        conversion = calibration.DEFAULT
+    return conversion.trace(data)
+
+#middle half of the trigger pulse
+TRIGGER_WINDOW = windows.Threshold(0.1,0.25,windows.trigger,mode='span')
 
-def calculate_plasma_params(n_trace,t_trace,trigger,t,ax2=''):
+def calculate_plasma_params(n_trace,t_trace,trigger,t,ax2='',policy=TRIGGER_WINDOW):
     #get sample range from trigger
-    t_trig = t[np.where(abs(trigger)> 0.1)]
-    t_i = np.min(t_trig)
-    t_f = np.max(t_trig)
-    sample_length = t_f - t_i
+    start,stop = policy.channel_bounds(trigger,t)
+    window = slice(int(start),int(stop))
         
-    sample_range = (t_i + 0.25*sample_length,t_f - 0.25*sample_length)
-        
-    avg_density = np.mean(n_trace[np.where((t > sample_range[0]) & (t < sample_range[1]))])
-    std_density = np.std(n_trace[np.where((t > sample_range[0]) & (t < sample_range[1]))])
+    avg_density = np.mean(n_trace[window])
+    std_density = np.std(n_trace[window])
     
-    avg_temp = np.mean(t_trace[np.where((t > sample_range[0]) & (t < sample_range[1]))])
-    std_temp = np.std(t_trace[np.where((t > sample_range[0]) & (t < sample_range[1]))])
+    avg_temp = np.mean(t_trace[window])
+    std_temp = np.std(t_trace[window])
         
     if ax2: 
-        ax2.axvline(sample_range[0],ls='--')
-        ax2.axvline(sample_range[1],ls='--')
+        import decimate
+        #no lines for a shot without a window, its values are nan
+        if stop > start:
+            ax2.axvline(t[window][0],ls='--')
+            ax2.axvline(t[window][-1],ls='--')
     
-        p1, = ax2.plot(t,t_trace,label='Electron Temp. ${:.2}+/-{:.2}$ eV'.format(avg_temp,std_temp))
-        p3, = ax2.plot(t,trigger,label='Trigger')
+        p1, = decimate.plot(ax2,t,t_trace,label='Electron Temp. ${:.2}+/-{:.2}$ eV'.format(avg_temp,std_temp))
+        p3, = decimate.plot(ax2,t,trigger,label='Trigger')
         ax2.set_ylabel('Electron Temperature (eV)')
         ax2.set_xlabel('Time ($\mu s)$')
         #ax2.set_xlim(sample_range[0],sample_range[1])
         
         ax4 = ax2.twinx()
         ax4.set_ylabel('Plasma Density ($cm^{-3}$)')
-        p2, = ax4.semilogy(t,n_trace,'r',label='Plasma Density ${:.2}+/- {:.2}$ $1/cm^3$'.format(avg_density,std_density))
+        p2, = decimate.semilogy(ax4,t,n_trace,'r',label='Plasma Density ${:.2}+/- {:.2}$ $1/cm^3$'.format(avg_density,std_density))
 
         ax2.legend(handles=[p1,p2,p3])
     return [avg_density,std_density],[avg_temp,std_temp]    
 
+def calc_trace_params_batch(shots,conversion=None,policy=TRIGGER_WINDOW):
+    #calculate_plasma_trace and calculate_plasma_params for a stack of shots (n_shots,5,npts), so batch
+    #reductions agree with the per shot values App.shot_params shows
+    #returns (n_shots,4) rows of mean T, std T, mean density, std density like calc_plasma_props_batch
+    shots = np.asarray(shots,dtype=float)
+    start,stop,mask = policy.select(shots)
+    cols = windows.crop(start,stop)
+    shots = shots[...,cols]
+    mask = None if mask is None else mask[...,cols]
+    start = start - cols.start
+    stop = stop - cols.start
+    with np.errstate(divide='ignore',invalid='ignore'):
+        density,T = calculate_plasma_trace(np.moveaxis(shots,1,0),conversion)
+    result = np.empty((len(shots),4))
+    for k,values in enumerate((T,density)):
+        result[:,2*k],result[:,2*k+1] = windows.window_mean_std(values,start,stop,mask)
+    return result
+
+def calc_plasma_props_batch(shots,buffer_size=0.2,threshold=40,A=0.66,M=40,V_bias=100,conversion=None,policy=None):
+    #same analysis as analyze2.calc_plasma_prop for a stack of shots (n_shots,5,npts)
+    #returns (n_shots,4) rows of mean T, std T, mean density, std density
+    #a tabulated calibration.Conversion can stand in for the f1 evaluation, A and M still come from here
+    #policy is any windows policy, by default the current above threshold with buffer_size trimmed off each end
+    shots = np.asarray(shots,dtype=float)
+    policy = policy or windows.Threshold(threshold,buffer_size)
+    start,stop,mask = policy.select(shots)
+
+    #only the columns some window covers are converted
+    cols = windows.crop(start,stop)
+    shots = shots[...,cols]
+    mask = None if mask is None else mask[...,cols]
+    start = start - cols.start
+    stop = stop - cols.start
+    F = shots[:,1]
+    high = shots[:,3]
+    low = shots[:,4]
+
+    V_d2 = high - F
+    shunt_current = (high - low)/98
+    with np.errstate(divide='ignore',invalid='ignore'):
+        T = T_e(V_d2,V_bias)
+        factor = conversion.f1(V_d2) if conversion is not None else f1(V_d2,T)
+        density = (M**0.5 / A) * shunt_current*1e6*factor
+
+    result = np.empty((len(shots),4))
+    for k,values in enumerate((T,density)):
+        result[:,2*k],result[:,2*k+1] = windows.window_mean_std(values,start,stop,mask)
+    return result
+
 def f1(V_d2,T_e):
     return 1.05e9 * (T_e)**(-0.5) / (np.exp(V_d2/T_e) - 1)
         
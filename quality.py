@@ -0,0 +1,67 @@
+#per shot checks made while acquiring, so a bad shot can be taken again instead of being written
+#and only found later when its analysis comes back nan or with an empty window
+#a check returns the reasons a shot is bad, an empty list for a good one
+import numpy as np
+
+import windows
+
+class ShotCheck:
+    #finite:  no nan or inf samples
+    #clipped: more than clip_fraction of a channel's samples at the end of the digitizer range,
+    #         only checked when the preamble is known (raw code shots always have one)
+    #trigger: the trigger channel (CH2) goes above trigger_level, as probe_math.TRIGGER_WINDOW needs
+    #window:  the analysis window of policy is at least min_window samples, a misfired pulse never reaches
+    #         the threshold; only checked when a policy is given, which has to be the one the shots are analysed
+    #         with (app2_2 passes probe_math.TRIGGER_WINDOW), a threshold meant for other shots rejects every one
+    def __init__(self,policy=None,min_window=10,trigger_level=0.1,clip_fraction=0.001):
+        self.policy = policy
+        self.min_window = min_window
+        self.trigger_level = trigger_level
+        self.clip_fraction = clip_fraction
+
+    def limits(self,preamble):
+        #lowest and highest code the scope can send, and the (4,) volts they scale to
+        info = np.iinfo(preamble.dtype)
+        codes = np.array([info.min,info.max],dtype=float)
+        volts = preamble.ymult[:,None]*(codes[None,:] - preamble.yoff[:,None]) + preamble.yzero[:,None]
+        return codes,volts
+
+    def clipped(self,channels,preamble,codes=False):
+        #1 based numbers of the (4,npts) channels that sit at the end of the range
+        code_limits,volt_limits = self.limits(preamble)
+        if codes:
+            at_limit = (channels <= code_limits[0]) | (channels >= code_limits[1])
+        else:
+            #within half a step of either end of the range
+            volt_limits = np.sort(volt_limits,axis=1)
+            tol = 0.5*np.abs(preamble.ymult)[:,None]
+            at_limit = (channels <= volt_limits[:,:1] + tol) | (channels >= volt_limits[:,1:] - tol)
+        fraction = np.mean(at_limit,axis=-1)
+        return [k + 1 for k in np.flatnonzero(fraction > self.clip_fraction)]
+
+    def probe(self,shot,preamble=None):
+        #checks on one (5,npts) shot in volts
+        reasons = []
+        if not np.all(np.isfinite(shot)):
+            return ['finite']
+        if preamble is not None:
+            reasons += ['clipped CH{}'.format(k) for k in self.clipped(shot[1:5],preamble)]
+        if np.max(windows.trigger(shot)) <= self.trigger_level:
+            reasons.append('trigger')
+            return reasons
+        if self.policy is None:
+            return reasons
+        if windows.window_count(*self.policy.select(shot)) < self.min_window:
+            reasons.append('window')
+        return reasons
+
+    def __call__(self,data,preamble=None):
+        #data is a (4,npts) stack of raw codes, which needs the preamble, or 5 rows of volts per probe
+        data = np.asarray(data)
+        if len(data) == 4:
+            reasons = ['clipped CH{}'.format(k) for k in self.clipped(data,preamble,codes=True)]
+            return reasons + [r for r in self.probe(preamble.scale(data)) if r not in reasons]
+        if len(data) == 5:
+            return self.probe(data,preamble)
+        #a pool shot, the preamble of each scope is not known here
+        return ['probe {}: {}'.format(k,r) for k in range(len(data)//5) for r in self.probe(data[5*k:5*k+5])]
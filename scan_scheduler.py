@@ -0,0 +1,55 @@
+#scan plans, which positions the probe visits, in what order and how many shots at each
+import numpy as np
+
+class ScanPlan:
+    def __init__(self,positions,samples=1,return_to=None):
+        #positions are absolute (mm), None means take the shots wherever the probe is
+        self.positions = list(positions)
+        self.samples = samples
+        self.return_to = return_to
+
+    @classmethod
+    def stationary(cls,samples):
+        return cls([None],samples)
+
+    @classmethod
+    def uniform(cls,start,length,points,samples=1,return_to_origin=True):
+        #the original scan, first point one step away from the start
+        step = length / points
+        positions = [start + step*(i+1) for i in range(points)]
+        return cls(positions,samples,start if return_to_origin else None)
+
+    @classmethod
+    def serpentine(cls,positions,passes=2,samples=1,return_to=None):
+        #passes alternate direction so the probe never has to run back to the first point
+        positions = list(positions)
+        order = []
+        for k in range(passes):
+            order += positions if k % 2 == 0 else positions[::-1]
+        return cls(order,samples,return_to)
+
+    def __iter__(self):
+        return iter(self.positions)
+
+    def __len__(self):
+        return len(self.positions)
+
+    @property
+    def total(self):
+        return len(self.positions)*self.samples
+
+    def travel(self,start):
+        #total probe travel (mm) from start, including the return
+        points = [start] + [p for p in self.positions if p is not None]
+        if self.return_to is not None:
+            points.append(self.return_to)
+        return float(np.sum(np.abs(np.diff(points))))
+
+    def estimate(self,start,mm_per_second,rep_rate):
+        #lower bound on wall time when shots are trigger limited and saving overlaps motion
+        return self.travel(start) / mm_per_second + self.total / rep_rate
+
+def move_to(stepper,position):
+    if hasattr(stepper,'move_to'):
+        return stepper.move_to(position)
+    return stepper.go_to(position - stepper.mm_loc)
@@ -0,0 +1,288 @@
+#tektronix scope waveform transfer
+import logging
+import time
+import numpy as np
+
+import telemetry
+
+try:
+    import pyvisa
+    VISA_ERRORS = (pyvisa.errors.VisaIOError,)
+except ImportError:
+    VISA_ERRORS = ()
+#anything reading a scope can raise, for callers that carry on when the scope goes away
+TRANSFER_ERRORS = VISA_ERRORS + (ValueError,)
+
+class TransferError(ValueError):
+    #a CURV? response that could not be decoded, e.g. a truncated or garbled binary block
+    pass
+
+class SizeMismatch(TransferError):
+    #a CURV? response that decoded but does not have the preamble's length, the preamble is out of date
+    pass
+
+NSETTINGS = 10 #number of WFMPR? fields per channel
+CHANNELS = 'CH1,CH2,CH3,CH4'
+ENCODINGS = ('RIBinary','RPBinary','ASCII')
+
+class Preamble:
+    #parsed WFMPR? response, channel fields are picked the same way read_scope always has
+    def __init__(self,text):
+        self.text = text.strip()
+        fields = self.text.split(';')
+        self.byte_nr = int(fields[0])
+        self.encoding = fields[2].strip().upper()
+        self.binary_format = fields[3].strip().upper()
+        self.byte_order = fields[4].strip().upper()
+
+        self.channel_settings = []
+        for j in range(4):
+            self.channel_settings.append(fields[5+j*NSETTINGS:5+(j+1)*NSETTINGS])
+
+        self.npts = int(self.channel_settings[0][-9])
+        self.xincr = float(self.channel_settings[0][-6])
+        self.ymult = np.array([float(setting[-3]) for setting in self.channel_settings])
+        self.yoff = np.array([float(setting[-2]) for setting in self.channel_settings])
+        self.yzero = np.array([float(setting[-1]) for setting in self.channel_settings])
+
+    @property
+    def binary(self):
+        return not self.encoding.startswith('ASC')
+
+    @property
+    def dtype(self):
+        kind = 'i' if self.binary_format.startswith('RI') else 'u'
+        order = '>' if self.byte_order.startswith('MSB') else '<'
+        return np.dtype('{}{}{}'.format(order,kind,self.byte_nr))
+
+    def time_axis(self):
+        #the same for every shot, so it is built once
+        if getattr(self,'_time_axis',None) is None:
+            self._time_axis = np.linspace(0.0,self.npts*self.xincr,self.npts)
+        return self._time_axis
+
+    @property
+    def code_dtype(self):
+        #native order samples as they came off the scope, ascii codes fit in 16 bits
+        return self.dtype.newbyteorder('=') if self.binary else np.dtype('i2')
+
+    def scaling(self):
+        #what a run of raw codes needs to turn them back into volts
+        return {'xincr':self.xincr,'ymult':self.ymult.tolist(),'yoff':self.yoff.tolist(),'yzero':self.yzero.tolist()}
+
+    def scale(self,codes,dtype=float):
+        #(4,npts) codes to a (5,npts) shot with the time axis in front
+        out = np.empty((5,self.npts),dtype=dtype)
+        out[0] = self.time_axis()
+        return scale_codes(codes,self,out)
+
+    def as_dict(self):
+        return {'npts':self.npts,'xincr':self.xincr,'byte_nr':self.byte_nr,
+                'encoding':self.encoding,'binary_format':self.binary_format,'byte_order':self.byte_order,
+                'ymult':self.ymult.tolist(),'yoff':self.yoff.tolist(),'yzero':self.yzero.tolist()}
+
+def configure(scope,encoding='RIBinary',width=1):
+    if not encoding in ENCODINGS:
+        raise ValueError('Unknown encoding {}'.format(encoding))
+    if not width in (1,2):
+        raise ValueError('DATA:WID must be 1 or 2, got {}'.format(width))
+    scope.write('DATA:SOURCE {}'.format(CHANNELS))
+    scope.write('DATA:ENCDG {}'.format(encoding))
+    scope.write('DATA:WID {}'.format(width))
+
+def read_preamble(scope):
+    preamble = Preamble(scope.query('WFMPR?'))
+    logging.debug('Preamble: {}'.format(preamble.as_dict()))
+    return preamble
+
+def arm(scope):
+    #single sequence, the scope stops after the next trigger
+    scope.write('ACQ:STOPAFTER SEQUENCE')
+    scope.write('ACQ:STATE RUN')
+
+def run_continuous(scope):
+    #undoes arm once a run is over, otherwise the scope stays stopped on the last sequence and
+    #every later read (the live monitor) gets that same frame
+    scope.write('ACQ:STOPAFTER RUNSTOP')
+    scope.write('ACQ:STATE RUN')
+
+def wait_for_trigger(scope,timeout=10.0,poll=None):
+    #*OPC? returns once the sequence is done, the visa timeout (ms) is set to timeout while it waits so a
+    #missing trigger fails after timeout s instead of at the transfer timeout, with poll set ACQ:STATE? is polled instead
+    if poll is None:
+        previous = scope.timeout
+        scope.timeout = 1000*timeout
+        try:
+            scope.query('*OPC?')
+        finally:
+            scope.timeout = previous
+        return True
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if int(scope.query('ACQ:STATE?').strip()) == 0:
+            return True
+        time.sleep(poll)
+    raise TimeoutError('No trigger within {} s'.format(timeout))
+
+class ScopeSession:
+    #configures the scope once and keeps the parsed preamble, so a shot is a single CURV? transfer
+    #check_interval (s) re-reads WFMPR? every so often in case someone changed the scope by hand, refresh()
+    #re-reads it whatever the interval and is meant for the start of a run
+    #a curve of the wrong length re-reads the preamble and is read again, a binary transfer that fails
+    #(visa error or undecodable block) drops the session to ASCII when fallback is set
+    def __init__(self,resource,encoding='RIBinary',width=1,check_interval=None,fallback=True):
+        self.resource = resource
+        self.fallback = fallback
+        self.encoding = encoding
+        self.width = width
+        self.check_interval = check_interval
+        self.preamble = None
+        self.buffer = None
+        self.checked = None
+        self.setups = 0
+
+    def invalidate(self):
+        self.preamble = None
+
+    def set(self,encoding=None,width=None):
+        encoding = encoding or self.encoding
+        width = width or self.width
+        if (encoding,width) != (self.encoding,self.width):
+            self.encoding,self.width = encoding,width
+            self.invalidate()
+
+    def write(self,cmd):
+        #anything other than acquisition control may change the waveform settings
+        self.resource.write(cmd)
+        if not cmd.strip().upper().startswith(('ACQ','*')):
+            self.invalidate()
+
+    def setup(self):
+        configure(self.resource,self.encoding,self.width)
+        self._parse(read_preamble(self.resource))
+        self.setups += 1
+        return self.preamble
+
+    def _parse(self,preamble):
+        self.preamble = preamble
+        self.checked = time.monotonic()
+        if self.buffer is None or self.buffer.shape != (5,preamble.npts):
+            self.buffer = np.empty((5,preamble.npts))
+
+    def check(self):
+        #one WFMPR? query, only parsed again if the text changed
+        text = self.resource.query('WFMPR?').strip()
+        self.checked = time.monotonic()
+        if text != self.preamble.text:
+            logging.info('Scope settings changed, preamble updated')
+            self._parse(Preamble(text))
+        telemetry.count('scope.checks')
+
+    def ensure(self):
+        if self.preamble is None:
+            self.setup()
+        elif self.check_interval is not None and time.monotonic() - self.checked > self.check_interval:
+            self.check()
+        return self.preamble
+
+    def refresh(self):
+        if self.preamble is None:
+            return self.setup()
+        self.check()
+        return self.preamble
+
+    @property
+    def npts(self):
+        return self.ensure().npts
+
+    def _read(self,read,*args):
+        try:
+            return read(self.resource,self.ensure(),*args)
+        except SizeMismatch as e:
+            logging.warning('{}, reading the preamble again'.format(e))
+            self.check()
+            return read(self.resource,self.preamble,*args)
+        except VISA_ERRORS + (TransferError,) as e:
+            #an error while setting up has no preamble to fall back from
+            if not (self.fallback and self.preamble is not None and self.preamble.binary):
+                raise
+            logging.warning('Binary transfer failed ({}), falling back to ASCII'.format(e))
+            self.set('ASCII')
+            return read(self.resource,self.ensure(),*args)
+
+    def read(self,out=None):
+        #a new array per shot unless out is given, shots are usually kept
+        return self._read(read_curve,out)
+
+    def read_codes(self):
+        #unscaled (4,npts) samples, preamble.scale turns them into a shot
+        return self._read(read_codes)
+
+    def read_buffered(self):
+        #into the session's own buffer, only valid until the next read
+        #the buffer is looked up per attempt since a new preamble can resize it
+        return self._read(lambda resource,preamble: read_curve(resource,preamble,self.buffer))
+
+def parse_blocks(raw):
+    #split a response into IEEE 488.2 definite length blocks, scopes send one block or one per source
+    blocks = []
+    pos = 0
+    while pos < len(raw):
+        if raw[pos:pos+1] in (b';',b',',b'\n',b'\r',b' '):
+            pos += 1
+            continue
+        if raw[pos:pos+1] != b'#':
+            raise ValueError('Expected block header at byte {}'.format(pos))
+        ndigits = int(raw[pos+1:pos+2])
+        if ndigits == 0:
+            raise ValueError('Indefinite length blocks are not supported')
+        length = int(raw[pos+2:pos+2+ndigits])
+        start = pos + 2 + ndigits
+        if start + length > len(raw):
+            raise ValueError('Truncated block, expected {} bytes'.format(length))
+        blocks.append(raw[start:start+length])
+        pos = start + length
+    return blocks
+
+def scale_codes(codes,preamble,out):
+    #codes is (4,npts), result goes to out[1:5] without temporaries
+    np.subtract(codes,preamble.yoff[:,None],out=out[1:5])
+    out[1:5] *= preamble.ymult[:,None]
+    out[1:5] += preamble.yzero[:,None]
+    return out
+
+def _transfer(scope,preamble):
+    #ascii values are parsed inside the visa query so that all counts as transfer
+    if preamble.binary:
+        with telemetry.span('scope.transfer'):
+            scope.write('CURV?')
+            raw = scope.read_raw()
+        telemetry.count('scope.bytes',len(raw))
+        with telemetry.span('scope.decode'):
+            try:
+                codes = np.frombuffer(b''.join(parse_blocks(raw)),dtype=preamble.dtype)
+            except ValueError as e:
+                raise TransferError(str(e))
+    else:
+        with telemetry.span('scope.transfer'):
+            codes = np.asarray(scope.query_ascii_values('CURV?',container=np.array,separator=','),dtype=float)
+
+    if codes.size != 4*preamble.npts:
+        raise SizeMismatch('Got {} samples from CURV?, expected {}'.format(codes.size,4*preamble.npts))
+    return codes.reshape(4,preamble.npts)
+
+def read_codes(scope,preamble):
+    #(4,npts) unscaled samples in preamble.code_dtype, a quarter to an eighth of the memory of read_curve
+    return _transfer(scope,preamble).astype(preamble.code_dtype)
+
+def read_curve(scope,preamble,out=None):
+    npts = preamble.npts
+    if out is None:
+        out = np.empty((5,npts))
+    elif out.shape != (5,npts):
+        raise ValueError('Output buffer has shape {}, expected {}'.format(out.shape,(5,npts)))
+
+    codes = _transfer(scope,preamble)
+    with telemetry.span('scope.scale'):
+        out[0] = preamble.time_axis()
+        return scale_codes(codes,preamble,out)
@@ -0,0 +1,321 @@
+#append-only binary run files, one file of stacked shots plus a json lines index per run
+import os
+import re
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+import numpy as np
+
+import telemetry
+import text_loader
+
+RUN_NAME = 'run'
+DATA_EXT = '.dat'
+INDEX_EXT = '.jsonl'
+VERSION = 1
+
+#data_<j>.txt for raw shots, data_<mm>mm_<j>.txt for scans
+TEXT_SHOT = re.compile(r'data_(?:(?P<position>-?[\d.]+)mm_)?(?P<shot>\d+)\.txt$')
+
+def run_base(path):
+    #accepts a run folder, the base name or either of the two files
+    if os.path.isdir(path):
+        return os.path.join(path,RUN_NAME)
+    for ext in (DATA_EXT,INDEX_EXT):
+        if path.endswith(ext):
+            return path[:-len(ext)]
+    return path
+
+def is_run(path):
+    return os.path.isfile(run_base(path) + INDEX_EXT)
+
+class RunWriter:
+    #with scaling (Preamble.scaling()) the run holds raw (4,npts) scope codes in dtype, e.g. 'i1',
+    #and readers get them back as scaled shots through ScaledShots
+    def __init__(self,path,npts,nchannels=5,dtype='<f4',listener=None,scaling=None,**settings):
+        self.base = run_base(path)
+        self.listener = listener
+        self.npts = npts
+        self.nchannels = nchannels
+        self.dtype = np.dtype(dtype)
+        self.count = 0
+
+        folder = os.path.dirname(self.base)
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder)
+        if os.path.exists(self.base + INDEX_EXT):
+            raise FileExistsError('Run {} already exists'.format(self.base))
+        if os.path.exists(self.base + DATA_EXT) and os.path.getsize(self.base + DATA_EXT):
+            #samples of a run that never got its index, appending would put them in front of the new shots
+            raise FileExistsError('{} holds samples but has no index, move it out of the way'.format(self.base + DATA_EXT))
+
+        self.header = {'version':VERSION,'dtype':self.dtype.str,'nchannels':nchannels,'npts':npts,
+                       'created':time.time(),'settings':settings}
+        if scaling is not None:
+            self.header['scaling'] = scaling
+        self._data = open(self.base + DATA_EXT,'wb')
+        self._index = open(self.base + INDEX_EXT,'a')
+        self._index.write(json.dumps(self.header) + '\n')
+        self._index.flush()
+
+    def append(self,data,**meta):
+        data = np.asarray(data)
+        if data.shape != (self.nchannels,self.npts):
+            raise ValueError('Shot has shape {}, run expects {}'.format(data.shape,(self.nchannels,self.npts)))
+        meta.setdefault('timestamp',time.time())
+        meta['shot'] = self.count
+
+        #data goes out before its index line so a reader never sees an index without samples
+        raw = data.astype(self.dtype,copy=False).tobytes()
+        self._data.write(raw)
+        telemetry.count('bytes.written',len(raw))
+        self._data.flush()
+        self._index.write(json.dumps(meta) + '\n')
+        self._index.flush()
+        self.count += 1
+        if self.listener is not None:
+            self.listener(self.count - 1,meta)
+        return self.count - 1
+
+    def close(self):
+        self._data.close()
+        self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*args):
+        self.close()
+
+class ScaledShots:
+    #read only view of raw code shots that scales to (…,5,npts) floats when indexed
+    def __init__(self,codes,scaling,dtype=np.float64):
+        self.codes = codes
+        self.scaling = scaling
+        self.dtype = np.dtype(dtype)
+        self.npts = codes.shape[-1]
+        self.ymult = np.asarray(scaling['ymult'],dtype=self.dtype)[:,None]
+        self.yoff = np.asarray(scaling['yoff'],dtype=self.dtype)[:,None]
+        self.yzero = np.asarray(scaling['yzero'],dtype=self.dtype)[:,None]
+        self.time = np.linspace(0.0,self.npts*scaling['xincr'],self.npts).astype(self.dtype)
+
+    @property
+    def shape(self):
+        return self.codes.shape[:-2] + (5,self.npts)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self,index):
+        codes = self.codes[index]
+        out = np.empty(codes.shape[:-2] + (5,self.npts),dtype=self.dtype)
+        out[...,0,:] = self.time
+        np.subtract(codes,self.yoff,out=out[...,1:,:],dtype=self.dtype)
+        out[...,1:,:] *= self.ymult
+        out[...,1:,:] += self.yzero
+        return out
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __array__(self,dtype=None,copy=None):
+        return self[:] if dtype is None else self[:].astype(dtype)
+
+    def astype(self,dtype):
+        #same codes, scaled to another float type, e.g. float32 to halve the memory of a chunk
+        return ScaledShots(self.codes,self.scaling,dtype)
+
+    def chunks(self,size=256):
+        for start in range(0,len(self),size):
+            yield self[start:start+size]
+
+class RunIndex:
+    #the header and shot metadata of a run's json lines index, update() only parses what was appended since
+    #the last call so a run that is still growing is not read from the start every time it is opened
+    def __init__(self,base):
+        self.path = base + INDEX_EXT
+        self.inode = None
+        self.offset = 0
+        self.header = None
+        self.meta = []
+
+    def update(self):
+        st = os.stat(self.path)
+        if st.st_ino != self.inode or st.st_size < self.offset:
+            #a new file under the same name
+            self.__init__(self.path[:-len(INDEX_EXT)])
+            self.inode = st.st_ino
+        with open(self.path,'rb') as f:
+            f.seek(self.offset)
+            raw = f.read()
+        #a line without its newline is still being written
+        end = raw.rfind(b'\n') + 1
+        for line in raw[:end].splitlines():
+            if not line.strip():
+                continue
+            if self.header is None:
+                self.header = json.loads(line)
+            else:
+                self.meta.append(json.loads(line))
+        self.offset += end
+        return self
+
+#indices of the runs opened last, open_run picks up where they left off
+INDEX_CACHE = OrderedDict()
+INDEX_CACHE_SIZE = 16
+_index_lock = threading.Lock()
+
+def run_index(base):
+    with _index_lock:
+        index = INDEX_CACHE.pop(base,None) or RunIndex(base)
+        INDEX_CACHE[base] = index
+        while len(INDEX_CACHE) > INDEX_CACHE_SIZE:
+            INDEX_CACHE.popitem(last=False)
+        return index.update()
+
+class Run:
+    def __init__(self,path):
+        self.base = run_base(path)
+        index = run_index(self.base)
+        if index.header is None:
+            raise ValueError('Run {} has no header yet'.format(self.base))
+        lines = [index.header] + index.meta
+        self.header = lines[0]
+        self.dtype = np.dtype(self.header['dtype'])
+        self.nchannels = self.header['nchannels']
+        self.npts = self.header['npts']
+
+        #a run that is still being written may have a partial last shot
+        shot_bytes = self.dtype.itemsize*self.nchannels*self.npts
+        n = min(len(lines) - 1,os.path.getsize(self.base + DATA_EXT) // shot_bytes)
+        self.meta = lines[1:n+1]
+        if n:
+            self.shots = np.memmap(self.base + DATA_EXT,dtype=self.dtype,mode='r',shape=(n,self.nchannels,self.npts))
+        else:
+            self.shots = np.empty((0,self.nchannels,self.npts),dtype=self.dtype)
+        #raw code runs keep the codes in .codes and scale on access
+        self.codes = None
+        if 'scaling' in self.header:
+            self.codes = self.shots
+            self.shots = ScaledShots(self.codes,self.header['scaling'])
+
+    @property
+    def settings(self):
+        return self.header['settings']
+
+    def __len__(self):
+        return len(self.meta)
+
+    def __getitem__(self,index):
+        return self.shots[index]
+
+    def __iter__(self):
+        return iter(self.shots)
+
+    def field(self,name,default=np.nan):
+        return np.array([m.get(name,default) for m in self.meta],dtype=float)
+
+    @property
+    def positions(self):
+        return self.field('position')
+
+    @property
+    def timestamps(self):
+        return self.field('timestamp')
+
+    @property
+    def created(self):
+        return self.header['created']
+
+    def at_position(self,position,atol=1e-3):
+        return self.shots[np.isclose(self.positions,position,rtol=0.0,atol=atol)]
+
+def open_run(path):
+    return Run(path)
+
+def load_shot(source,runs=None,skiprows=0):
+    #a shot as (channels,npts), from an array, a legacy text file or (run,index)
+    #skiprows is the number of header lines of text files, 1 for the 08_03_2018 shots
+    #text files are parsed exactly like np.loadtxt, bulk loads go through text_loader.load_text instead
+    if isinstance(source,np.ndarray):
+        return np.asarray(source,dtype=float)
+    if isinstance(source,tuple):
+        path,index = source
+        if runs is None:
+            return np.asarray(open_run(path)[index],dtype=float)
+        if not path in runs:
+            runs[path] = open_run(path)
+        return np.asarray(runs[path][index],dtype=float)
+    return text_loader.read_text(source,skiprows=skiprows,exact=True)
+
+def load_shots(sources,skiprows=0,runs=None):
+    #stack shots from any mix of sources into (n_shots,channels,npts), each run is opened once,
+    #or once for several calls when they share a runs dict
+    runs = {} if runs is None else runs
+    return np.stack([load_shot(source,runs,skiprows) for source in sources])
+
+def text_shots(folder):
+    #legacy text shots in a folder as [(position,shot,path)], sorted
+    shots = []
+    for name in os.listdir(folder):
+        match = TEXT_SHOT.match(name)
+        if match:
+            position = match.group('position')
+            position = float(position) if position is not None else None
+            shots.append((position,int(match.group('shot')),os.path.join(folder,name)))
+    shots.sort(key=lambda s: (s[0] if s[0] is not None else 0.0,s[1]))
+    return shots
+
+def folder_shots(folder,position=None,atol=1e-3):
+    #shot sources in a run or legacy text folder, optionally only those at one position
+    if is_run(folder):
+        run = open_run(folder)
+        if position is None:
+            return [(run.base,i) for i in range(len(run))]
+        return [(run.base,int(i)) for i in np.flatnonzero(np.isclose(run.positions,position,rtol=0.0,atol=atol))]
+    return [path for pos,shot,path in text_shots(folder)
+            if position is None or (pos is not None and abs(pos - position) <= atol)]
+
+def convert_text_archive(folder,dest=None,dtype='<f4',workers=None):
+    shots = text_shots(folder)
+    if not shots:
+        return None
+    dest = dest or folder
+
+    #corrupt or truncated files are left out of the run, load_text logs them
+    loaded,index,errors = text_loader.load_text([path for position,shot,path in shots],workers=workers)
+    writer = None
+    for position,shot,path in shots:
+        if not path in index:
+            continue
+        data = loaded[index[path]]
+        if writer is None:
+            writer = RunWriter(dest,data.shape[1],data.shape[0],dtype=dtype,source=os.path.abspath(folder))
+        meta = {'timestamp':os.path.getmtime(path),'source':os.path.basename(path),'source_shot':shot}
+        if position is not None:
+            meta['position'] = position
+        writer.append(data,**meta)
+    if writer is None:
+        return None
+    writer.close()
+    logging.info('Converted {} shots in {}, {} skipped'.format(len(index),folder,len(errors)))
+    return writer.base
+
+def convert_tree(root,dtype='<f4'):
+    converted = []
+    for folder,dirs,files in os.walk(root):
+        dirs.sort()
+        if is_run(folder):
+            continue
+        if any(TEXT_SHOT.match(name) for name in files):
+            converted.append(convert_text_archive(folder,dtype=dtype))
+    return converted
+
+if __name__=='__main__':
+    import sys
+    logging.basicConfig(level=logging.INFO)
+    for root in sys.argv[1:] or ['data']:
+        convert_tree(root)
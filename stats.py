@@ -0,0 +1,72 @@
+#incremental statistics, Welford updates so nothing has to be kept per shot
+import numpy as np
+from collections import deque
+
+class RunningStats:
+    #mean and variance over everything added so far, x can be a scalar or an array of quantities
+    def __init__(self,shape=()):
+        self.n = 0
+        self.mean = np.zeros(shape)
+        self.m2 = np.zeros(shape)
+
+    def add(self,x):
+        x = np.asarray(x,dtype=float)
+        self.n += 1
+        delta = x - self.mean
+        self.mean = self.mean + delta / self.n
+        self.m2 = self.m2 + delta*(x - self.mean)
+
+    def add_many(self,xs):
+        #merge a block of samples along the first axis (Chan et al.)
+        xs = np.asarray(xs,dtype=float)
+        n = xs.shape[0]
+        if n == 0:
+            return
+        mean = xs.mean(axis=0)
+        m2 = ((xs - mean)**2).sum(axis=0)
+        total = self.n + n
+        delta = mean - self.mean
+        self.mean = self.mean + delta*n/total
+        self.m2 = self.m2 + m2 + delta**2*self.n*n/total
+        self.n = total
+
+    @property
+    def var(self):
+        return self.m2 / self.n if self.n else np.full(np.shape(self.mean),np.nan)
+
+    @property
+    def std(self):
+        return np.sqrt(self.var)
+
+    @property
+    def sem(self):
+        return self.std / np.sqrt(self.n) if self.n else self.std
+
+class RollingStats(RunningStats):
+    #same estimates over the last window samples only
+    def __init__(self,window,shape=()):
+        RunningStats.__init__(self,shape)
+        self.window = window
+        self.samples = deque()
+
+    def add(self,x):
+        x = np.asarray(x,dtype=float)
+        self.samples.append(x)
+        RunningStats.add(self,x)
+        if len(self.samples) > self.window:
+            self.remove(self.samples.popleft())
+
+    def add_many(self,xs):
+        for x in xs:
+            self.add(x)
+
+    def remove(self,x):
+        if self.n <= 1:
+            self.n = 0
+            self.mean = np.zeros_like(self.mean)
+            self.m2 = np.zeros_like(self.m2)
+            return
+        delta = x - self.mean
+        self.n -= 1
+        self.mean = self.mean - delta / self.n
+        self.m2 = np.maximum(self.m2 - delta*(x - self.mean),0.0)
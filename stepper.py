@@ -1,7 +1,10 @@
 import serial
 import logging
+import struct
 import time
 
+import telemetry
+
 class Stepper:
     def __init__(self,channel='COM4'):
         logging.info('Starting stepper controller')
@@ -17,6 +20,9 @@ class Stepper:
     def zero_location(self):
         self.mm_loc = 0.0
         self.step_loc = 0.0
+
+    def move_to(self,mm):
+        return self.go_to(mm - self.mm_loc)
         
     def go_to(self,disp): 
         logging.debug('Displacing by {:.2} mm'.format(disp))
@@ -41,13 +47,16 @@ class Stepper:
                 self.step_loc += step_interval
             
             msg = self.ser.readline()
+            telemetry.count('stepper.round_trips')
             logging.debug('stepping status: {}'.format(msg))
             if 'pos_limit' in msg.decode():
+                telemetry.count('stepper.limits')
                 end_condition = 'pos_limit'
                 logging.info('Hit positive limit switch')
                 self.mm_loc = 100.0
                 break
             elif 'neg_limit' in msg.decode():
+                telemetry.count('stepper.limits')
                 end_condition = 'neg_limit'
                 logging.info('Hit negitive limit switch')
                 self.mm_loc = 0.0
@@ -62,4 +71,179 @@ class Stepper:
             self.mm_loc += disp
         
         return end_condition
-        
\ No newline at end of file
+
+#framed binary protocol spoken by SM_Controller_v2
+#frame: SYNC cmd len payload checksum, checksum is the xor of cmd, len and payload
+SYNC = 0xA5
+CMD_MOVE_TO = 0x01
+CMD_STOP = 0x02
+CMD_ZERO = 0x03
+CMD_STATUS = 0x04
+EVT_ACK = 0x81
+EVT_PROGRESS = 0x82
+EVT_DONE = 0x83
+EVT_LIMIT = 0x84
+EVT_ERROR = 0x85
+EVT_POSITION = 0x86
+LIMIT_POS = 1
+LIMIT_ZERO = 2
+FRAMED_BAUD = 115200
+STEPS_PER_SECOND = 500
+STEPS_PER_MM = 150000/75.6
+
+def frame(cmd,payload=b''):
+    checksum = cmd ^ len(payload)
+    for b in payload:
+        checksum ^= b
+    return bytes([SYNC,cmd,len(payload)]) + payload + bytes([checksum])
+
+class FrameReader:
+    #incremental parser, bytes that do not make a valid frame are skipped
+    def __init__(self):
+        self.buffer = bytearray()
+        self.errors = 0
+
+    def feed(self,data):
+        self.buffer += data
+        frames = []
+        while True:
+            start = self.buffer.find(SYNC)
+            if start < 0:
+                self.buffer.clear()
+                break
+            del self.buffer[:start]
+            if len(self.buffer) < 3 or len(self.buffer) < 4 + self.buffer[2]:
+                break
+            cmd,length = self.buffer[1],self.buffer[2]
+            payload = bytes(self.buffer[3:3+length])
+            checksum = cmd ^ length
+            for b in payload:
+                checksum ^= b
+            if checksum != self.buffer[3+length]:
+                self.errors += 1
+                del self.buffer[:1]
+                continue
+            del self.buffer[:4+length]
+            frames.append((cmd,payload))
+        return frames
+
+class FramedStepper(Stepper):
+    #one absolute move per displacement, the controller reports progress and limit switches as it goes
+    def __init__(self,channel='COM4',baud=FRAMED_BAUD,ser=None,margin=2.0):
+        logging.info('Starting framed stepper controller')
+        self.ser = ser if ser is not None else serial.Serial(channel,baud,timeout=0.1)
+        self.reader = FrameReader()
+        self.frames = []
+        self.margin = margin
+        self.zero_location()
+
+    def send(self,cmd,payload=b''):
+        self.ser.write(frame(cmd,payload))
+        telemetry.count('stepper.frames_sent')
+
+    def read_frame(self,timeout):
+        deadline = time.monotonic() + timeout
+        while not self.frames:
+            if time.monotonic() > deadline:
+                return None
+            data = self.ser.read(max(1,getattr(self.ser,'in_waiting',0)))
+            if data:
+                self.frames += self.reader.feed(data)
+        telemetry.count('stepper.frames_received')
+        return self.frames.pop(0)
+
+    def _set_steps(self,steps):
+        self.step_loc = steps
+        self.mm_loc = self.steps_to_mm(steps)
+
+    def _stale(self,msg):
+        #a frame left over from an earlier command only updates the position
+        if msg[0] in (EVT_PROGRESS,EVT_POSITION,EVT_DONE):
+            self._set_steps(struct.unpack('<i',msg[1])[0])
+        elif msg[0] == EVT_LIMIT:
+            self._set_steps(struct.unpack('<Bi',msg[1])[1])
+
+    def _drain(self):
+        #frames already received before a command is sent belong to earlier ones (the ack and done that
+        #follow stop, a move that timed out)
+        waiting = getattr(self.ser,'in_waiting',0)
+        if waiting:
+            self.frames += self.reader.feed(self.ser.read(waiting))
+        for msg in self.frames:
+            self._stale(msg)
+        self.frames = []
+
+    def _ack(self,cmd,timeout):
+        #reads up to the controller's ack of cmd, frames still arriving for an earlier command come first,
+        #returns the ack, an EVT_ERROR frame or None when nothing came within timeout
+        while True:
+            msg = self.read_frame(timeout)
+            if msg is None or msg[0] == EVT_ERROR:
+                return msg
+            if msg[0] == EVT_ACK and msg[1][:1] == bytes([cmd]):
+                return msg
+            self._stale(msg)
+
+    def zero_location(self):
+        self._drain()
+        self.send(CMD_ZERO)
+        msg = self._ack(CMD_ZERO,self.margin)
+        if msg is None or msg[0] != EVT_ACK:
+            raise IOError('Stepper controller did not acknowledge zeroing')
+        self.mm_loc = 0.0
+        self.step_loc = 0
+
+    def position(self):
+        self.send(CMD_STATUS)
+        while True:
+            msg = self.read_frame(self.margin)
+            if msg is None:
+                raise IOError('No position from stepper controller')
+            if msg[0] == EVT_POSITION:
+                self._set_steps(struct.unpack('<i',msg[1])[0])
+                return self.mm_loc
+
+    def move_to(self,mm):
+        goal = int(round(self.mm_to_steps(mm)))
+        logging.debug('Moving to {:.2f} mm ({} steps)'.format(mm,goal))
+        self._drain()
+        self.send(CMD_MOVE_TO,struct.pack('<i',goal))
+        #silence longer than one progress interval plus margin means the controller is gone
+        timeout = 500.0 / STEPS_PER_SECOND + self.margin
+        msg = self._ack(CMD_MOVE_TO,timeout)
+        if msg is None:
+            logging.error('Stepper controller stopped responding at {:.2f} mm'.format(self.mm_loc))
+            return None
+        if msg[0] == EVT_ERROR:
+            logging.error('Stepper controller rejected a frame, code {}'.format(msg[1][0]))
+            return None
+        while True:
+            msg = self.read_frame(timeout)
+            if msg is None:
+                logging.error('Stepper controller stopped responding at {:.2f} mm'.format(self.mm_loc))
+                return None
+            cmd,payload = msg
+            if cmd in (EVT_PROGRESS,EVT_POSITION):
+                self._set_steps(struct.unpack('<i',payload)[0])
+            elif cmd == EVT_DONE:
+                self._set_steps(struct.unpack('<i',payload)[0])
+                return 'normal'
+            elif cmd == EVT_LIMIT:
+                which,steps = struct.unpack('<Bi',payload)
+                self._set_steps(steps)
+                telemetry.count('stepper.limits')
+                if which == LIMIT_POS:
+                    logging.info('Hit positive limit switch')
+                    return 'pos_limit'
+                logging.info('Hit negitive limit switch')
+                return 'neg_limit'
+            elif cmd == EVT_ERROR:
+                logging.error('Stepper controller rejected a frame, code {}'.format(payload[0]))
+                return None
+
+    def go_to(self,disp):
+        logging.debug('Displacing by {:.2f} mm'.format(disp))
+        return self.move_to(self.mm_loc + disp)
+
+    def stop(self):
+        self.send(CMD_STOP)
@@ -0,0 +1,182 @@
+#host side simulators of the stepper controllers, they stand in for serial.Serial
+import struct
+import time
+import threading
+
+import stepper
+
+class SimulatedController:
+    #SM_Controller_v2 in software, motion runs on a clock that can be sped up with speed
+    def __init__(self,steps_per_second=stepper.STEPS_PER_SECOND,progress_steps=500,start_mm=10.0,
+                 travel_mm=100.0,speed=1.0,timeout=0.1):
+        self.rate = steps_per_second
+        self.progress_steps = progress_steps
+        self.speed = speed
+        self.timeout = timeout
+        #hardware coordinate, the zero switch is at 0 and the positive switch at travel
+        self.hw = int(round(start_mm*stepper.STEPS_PER_MM))
+        self.hw_max = int(round(travel_mm*stepper.STEPS_PER_MM))
+        self.origin = 0
+
+        self.reader = stepper.FrameReader()
+        self.out = bytearray()
+        self.events = []
+        self.move = None
+        self.bytes_written = 0
+        self.frames_received = 0
+        self._t0 = time.monotonic()
+        self._lock = threading.Lock()
+
+    def now(self):
+        return (time.monotonic() - self._t0)*self.speed
+
+    def _emit(self,cmd,payload=b''):
+        self.out += stepper.frame(cmd,payload)
+
+    def _position(self):
+        return self.hw - self.origin
+
+    def _hw_at(self,t):
+        start_t,start_hw,direction,length = self.move
+        return start_hw + direction*min(int((t - start_t)*self.rate),length)
+
+    def _plan(self,target):
+        #events of one move as (time,cmd,payload builder), limits cut the move short
+        now = self.now()
+        goal = target + self.origin
+        direction = 1 if goal > self.hw else -1
+        length = abs(goal - self.hw)
+        limit = None
+        if goal > self.hw_max:
+            length,limit = self.hw_max - self.hw,stepper.LIMIT_POS
+        elif goal < 0:
+            length,limit = self.hw,stepper.LIMIT_ZERO
+        self.move = (now,self.hw,direction,length)
+        self.events = [(now + k/self.rate,stepper.EVT_PROGRESS,None)
+                       for k in range(self.progress_steps,length,self.progress_steps)]
+        self.events.append((now + length/self.rate,stepper.EVT_LIMIT if limit else stepper.EVT_DONE,limit))
+
+    def _advance(self):
+        now = self.now()
+        while self.events and self.events[0][0] <= now:
+            t,cmd,limit = self.events.pop(0)
+            self.hw = self._hw_at(t)
+            if cmd == stepper.EVT_PROGRESS:
+                self._emit(cmd,struct.pack('<i',self._position()))
+                continue
+            self.move = None
+            if cmd == stepper.EVT_LIMIT:
+                #the firmware backs off the switch, and the zero switch is the origin
+                if limit == stepper.LIMIT_ZERO:
+                    self.origin = self.hw
+                self._emit(cmd,struct.pack('<Bi',limit,self._position()))
+            else:
+                self._emit(cmd,struct.pack('<i',self._position()))
+
+    def _handle(self,cmd,payload):
+        self.frames_received += 1
+        if cmd == stepper.CMD_MOVE_TO and len(payload) == 4:
+            self._emit(stepper.EVT_ACK,bytes([cmd]))
+            target = struct.unpack('<i',payload)[0]
+            if self.move is not None:
+                self.hw = self._hw_at(self.now())
+            if target == self._position():
+                self.move,self.events = None,[]
+                self._emit(stepper.EVT_DONE,struct.pack('<i',self._position()))
+            else:
+                self._plan(target)
+        elif cmd == stepper.CMD_STOP:
+            self._emit(stepper.EVT_ACK,bytes([cmd]))
+            if self.move is not None:
+                self.hw = self._hw_at(self.now())
+                self.move,self.events = None,[]
+                self._emit(stepper.EVT_DONE,struct.pack('<i',self._position()))
+        elif cmd == stepper.CMD_ZERO:
+            if self.move is not None:
+                self.hw = self._hw_at(self.now())
+            self.move,self.events = None,[]
+            self.origin = self.hw
+            self._emit(stepper.EVT_ACK,bytes([cmd]))
+        elif cmd == stepper.CMD_STATUS:
+            self._emit(stepper.EVT_POSITION,struct.pack('<i',self._position()))
+        else:
+            self._emit(stepper.EVT_ERROR,bytes([3]))
+
+    def write(self,data):
+        with self._lock:
+            self._advance()
+            self.bytes_written += len(data)
+            for cmd,payload in self.reader.feed(data):
+                self._handle(cmd,payload)
+        return len(data)
+
+    @property
+    def in_waiting(self):
+        with self._lock:
+            self._advance()
+            return len(self.out)
+
+    def read(self,size=1):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._lock:
+                self._advance()
+                if self.out or time.monotonic() >= deadline:
+                    data = bytes(self.out[:size])
+                    del self.out[:size]
+                    return data
+                wait = deadline - time.monotonic()
+                if self.events:
+                    wait = min(wait,(self.events[0][0] - self.now())/self.speed)
+            time.sleep(max(wait,0.0))
+
+    def close(self):
+        pass
+
+class SimulatedLegacyController:
+    #the original SM_Controller, Serial.readString waits out its 1 s timeout before every chunk
+    def __init__(self,steps_per_second=stepper.STEPS_PER_SECOND,read_timeout=1.0,speed=1.0,timeout=10):
+        self.rate = steps_per_second
+        self.read_timeout = read_timeout
+        self.speed = speed
+        self.timeout = timeout
+        self.pending = []
+
+    def write(self,data):
+        steps = abs(float(data.decode()))
+        self.pending.append((self.read_timeout + steps/self.rate)/self.speed)
+        return len(data)
+
+    def readline(self):
+        if not self.pending:
+            time.sleep(self.timeout)
+            return b''
+        time.sleep(self.pending.pop(0))
+        return b'normal\r\n'
+
+    def close(self):
+        pass
+
+class SimulatedStepper(stepper.FramedStepper):
+    def __init__(self,**kw):
+        stepper.FramedStepper.__init__(self,ser=SimulatedController(**kw))
+
+if __name__=='__main__':
+    import logging
+    logging.basicConfig(level=logging.INFO)
+
+    #a 20 mm scan step at 100x real time, both protocols
+    framed = SimulatedStepper(speed=100.0)
+    t = time.monotonic()
+    print(framed.go_to(20.0),framed.mm_loc,'framed: {:.2f} s real time'.format((time.monotonic() - t)*100.0))
+
+    legacy = stepper.Stepper.__new__(stepper.Stepper)
+    legacy.ser = SimulatedLegacyController()
+    legacy.zero_location()
+    #Stepper.go_to sleeps on its own, so the legacy run is sped up by scaling time.sleep
+    sleep,time.sleep = time.sleep,lambda s: sleep(s/100.0)
+    t = time.monotonic()
+    print(legacy.go_to(20.0),legacy.mm_loc,'legacy: {:.2f} s real time'.format((time.monotonic() - t)*100.0))
+    time.sleep = sleep
+
+    print(framed.go_to(-1000.0),framed.mm_loc)
@@ -0,0 +1,160 @@
+#constant memory analysis of long runs, shots are read a chunk at a time and reduced into online aggregators
+#records are anything with a .source (catalog.Shot) or plain shot sources
+import logging
+import numpy as np
+
+import shot_store
+import probe_math as pmath
+from stats import RunningStats
+
+#columns of the per shot parameters, as returned by probe_math.calc_plasma_props_batch
+COLUMNS = ('T','std_T','density','std_density')
+
+def source_of(record):
+    return getattr(record,'source',record)
+
+def chunks(records,size=256):
+    #lists of at most size records, records can be a generator
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def iter_shots(records,chunk=256):
+    #(records,(k,5,npts) stack) pairs, only one chunk of samples is in memory at a time
+    #runs are opened once for the whole stream, their shots are memory mapped so that costs no memory
+    runs = {}
+    for part in chunks(records,chunk):
+        yield part,shot_store.load_shots([source_of(record) for record in part],runs=runs)
+
+def iter_params(records,chunk=256,engine=None,**params):
+    #(records,(k,4) parameters) pairs, through an AnalysisEngine when one is given so results are cached
+    if engine is not None:
+        for part in chunks(records,chunk):
+            yield part,engine.analyze([source_of(record) for record in part])
+        return
+    for part,shots in iter_shots(records,chunk):
+        yield part,pmath.calc_plasma_props_batch(shots,**params)
+
+class Summary:
+    #running mean and spread of every parameter column, shots with a failed window are counted and skipped
+    def __init__(self,columns=(0,2)):
+        self.columns = list(columns)
+        self.stats = RunningStats((len(self.columns),))
+        self.failed = 0
+
+    def add(self,records,props):
+        values = props[:,self.columns]
+        good = np.all(np.isfinite(values),axis=1)
+        self.failed += int(np.sum(~good))
+        self.stats.add_many(values[good])
+
+    def result(self):
+        #nan means before any good shot
+        names = [COLUMNS[c] for c in self.columns]
+        mean = self.stats.mean if self.stats.n else np.full(len(names),np.nan)
+        return {'n':self.stats.n,'failed':self.failed,'mean':dict(zip(names,mean.tolist())),
+                'std':dict(zip(names,self.stats.std.tolist())),'sem':dict(zip(names,self.stats.sem.tolist()))}
+
+class Histogram:
+    #fixed edges so counts can be added chunk by chunk, values outside the edges are counted separately
+    def __init__(self,edges,column=2):
+        self.edges = np.asarray(edges,dtype=float)
+        self.column = column
+        self.counts = np.zeros(len(self.edges) - 1,dtype=int)
+        self.under = 0
+        self.over = 0
+
+    @classmethod
+    def log(cls,low,high,bins=50,column=2):
+        #density spans decades, so its bins are log spaced
+        return cls(np.logspace(np.log10(low),np.log10(high),bins + 1),column)
+
+    def add(self,records,props):
+        values = props[:,self.column]
+        values = values[np.isfinite(values)]
+        self.counts += np.histogram(values,self.edges)[0]
+        self.under += int(np.sum(values < self.edges[0]))
+        self.over += int(np.sum(values > self.edges[-1]))
+
+    def result(self):
+        return {'edges':self.edges.tolist(),'counts':self.counts.tolist(),'under':self.under,'over':self.over}
+
+class BinnedStats:
+    #running stats of the parameter columns per key, key maps a record to a bin (position, solenoid current, ...)
+    #with edges the key value is put in the bin it falls in, otherwise every distinct key is its own bin
+    def __init__(self,key,edges=None,columns=(0,2)):
+        self.key = key
+        self.edges = None if edges is None else np.asarray(edges,dtype=float)
+        self.columns = list(columns)
+        self.bins = {}
+
+    def _bin(self,record):
+        value = self.key(record)
+        if value is None or self.edges is None:
+            return value
+        k = int(np.searchsorted(self.edges,value,side='right')) - 1
+        if k < 0 or k >= len(self.edges) - 1:
+            return None
+        return 0.5*(self.edges[k] + self.edges[k+1])
+
+    def add(self,records,props):
+        keys = [self._bin(record) for record in records]
+        values = props[:,self.columns]
+        good = np.all(np.isfinite(values),axis=1)
+        for key in set(keys):
+            if key is None:
+                continue
+            rows = np.array([k == key for k in keys]) & good
+            if not np.any(rows):
+                continue
+            if key not in self.bins:
+                self.bins[key] = RunningStats((len(self.columns),))
+            self.bins[key].add_many(values[rows])
+
+    def table(self):
+        #(n_bins,2 + 2*columns) rows of key, n, then mean and std of each column, sorted by key
+        rows = [[key,s.n] + [v for pair in zip(s.mean,s.std) for v in pair] for key,s in self.bins.items()]
+        rows.sort(key=lambda row: row[0])
+        return np.array(rows,dtype=float).reshape(len(rows),2 + 2*len(self.columns))
+
+    def result(self):
+        return {'columns':[COLUMNS[c] for c in self.columns],'table':self.table().tolist()}
+
+def stream(records,aggregators,chunk=256,every=1,engine=None,**params):
+    #feeds every chunk of parameters to the aggregators and yields
+    #(shots so far,{name:partial result}) every `every` chunks and once more at the end if needed
+    count = 0
+    emitted = True
+    for k,(part,props) in enumerate(iter_params(records,chunk,engine,**params)):
+        for aggregator in aggregators.values():
+            aggregator.add(part,props)
+        count += len(part)
+        emitted = (k + 1) % every == 0
+        if emitted:
+            yield count,{name:aggregator.result() for name,aggregator in aggregators.items()}
+    if not emitted:
+        yield count,{name:aggregator.result() for name,aggregator in aggregators.items()}
+
+def run(records,aggregators,chunk=256,engine=None,**params):
+    #only the final results
+    for part,props in iter_params(records,chunk,engine,**params):
+        for aggregator in aggregators.values():
+            aggregator.add(part,props)
+    return {name:aggregator.result() for name,aggregator in aggregators.items()}
+
+if __name__=='__main__':
+    import sys
+    import catalog
+
+    logging.basicConfig(level=logging.INFO)
+    date = sys.argv[1] if len(sys.argv) > 1 else '11_27_2018'
+    cat = catalog.Catalog()
+    aggregators = {'summary':Summary(),'density':Histogram.log(1e9,1e14),
+                   'position':BinnedStats(lambda shot: shot.position,np.arange(0,101,2.0))}
+    for count,partial in stream(cat.by_date(date),aggregators,chunk=128):
+        logging.info('{} shots: {}'.format(count,partial['summary']))
@@ -0,0 +1,113 @@
+#timing spans and counters for the acquisition hot path, cheap enough to leave on all the time
+#modules record into the shared recorder with telemetry.span('name') and telemetry.count('name')
+import json
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+LOG_FILE = 'telemetry.jsonl'
+
+class Telemetry:
+    def __init__(self,window=100):
+        #window is how many recent durations the rolling mean of each span is taken over
+        self.window = window
+        self.lock = threading.Lock()
+        self.spans = {}
+        self.counters = {}
+        self.log = None
+        self.log_path = None
+
+    def reset(self):
+        with self.lock:
+            self.spans = {}
+            self.counters = {}
+
+    @contextmanager
+    def span(self,name,**fields):
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name,time.perf_counter() - t,**fields)
+
+    def record(self,name,seconds,**fields):
+        with self.lock:
+            entry = self.spans.get(name)
+            if entry is None:
+                entry = self.spans[name] = [0,0.0,deque(maxlen=self.window)]
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2].append(seconds)
+            if self.log is not None:
+                fields.update(span=name,time=time.time(),seconds=seconds)
+                self.log.write(json.dumps(fields) + '\n')
+
+    def count(self,name,n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name,0) + n
+
+    def summary(self):
+        #per span count, total and mean seconds plus the rolling mean and last duration, and the counters
+        with self.lock:
+            spans = {name:{'n':n,'total':total,'mean':total/n,'rolling':sum(recent)/len(recent),'last':recent[-1]}
+                     for name,(n,total,recent) in self.spans.items()}
+            return {'spans':spans,'counters':dict(self.counters)}
+
+    def format_summary(self):
+        summary = self.summary()
+        lines = ['{:<24} {:>6} x {:>8.1f} ms'.format(name,s['n'],1e3*s['rolling'])
+                 for name,s in sorted(summary['spans'].items())]
+        lines += ['{:<24} {:>6}'.format(name,n) for name,n in sorted(summary['counters'].items())]
+        return '\n'.join(lines)
+
+    def start_log(self,path,**header):
+        #spans are written one per line as they finish, the counters and summary go in the last line
+        self.stop_log()
+        self.reset()
+        with self.lock:
+            self.log = open(path,'a')
+            self.log_path = path
+            header.update(start=time.time())
+            self.log.write(json.dumps(header) + '\n')
+        logging.info('Writing telemetry to {}'.format(path))
+
+    def stop_log(self):
+        if self.log is None:
+            return
+        summary = self.summary()
+        with self.lock:
+            summary.update(end=time.time())
+            self.log.write(json.dumps(summary) + '\n')
+            self.log.close()
+            self.log = None
+
+current = Telemetry()
+
+def span(name,**fields):
+    return current.span(name,**fields)
+
+def record(name,seconds,**fields):
+    current.record(name,seconds,**fields)
+
+def count(name,n=1):
+    current.count(name,n)
+
+def read_log(path):
+    #header, span records and the closing summary of one log
+    with open(path) as file:
+        lines = [json.loads(line) for line in file if line.strip()]
+    header = lines[0] if lines else {}
+    summary = lines[-1] if len(lines) > 1 and 'spans' in lines[-1] else None
+    records = [line for line in lines[1:] if 'span' in line]
+    return header,records,summary
+
+if __name__=='__main__':
+    import sys
+    header,records,summary = read_log(sys.argv[1] if len(sys.argv) > 1 else LOG_FILE)
+    print(header)
+    for name,s in sorted((summary or {}).get('spans',{}).items(),key=lambda item: -item[1]['total']):
+        print('{:<24} {:>6} x {:>8.2f} ms = {:>8.2f} s'.format(name,s['n'],1e3*s['mean'],s['total']))
+    for name,n in sorted((summary or {}).get('counters',{}).items()):
+        print('{:<24} {:>6}'.format(name,n))
@@ -0,0 +1,94 @@
+#the analysis as it was before the optimisations, copied from the first commit of probe_math.py,
+#the regression tests compare the new code against these
+import numpy as np
+import scipy.signal as signal
+
+def apply_filter(data):
+    filter_params = [3,0.05]
+
+    b,a = signal.butter(filter_params[0],filter_params[1],output='ba')
+    t = data[0]
+    CH1 = signal.filtfilt(b,a,data[1])
+    CH2 = signal.filtfilt(b,a,data[2])
+    CH3 = signal.filtfilt(b,a,data[3])
+    CH4 = signal.filtfilt(b,a,data[4])
+    return [t,CH1,CH2,CH3,CH4]
+
+def calculate_plasma_trace(data):
+    A = 0.66 #mm^2 (probe cross section area
+    M = 40 #effective ion weight
+    V_bias = 60
+
+    #channel convention
+    #CH1: F,CH2:trigger/current measurement,CH3:+,CH4:-
+    t = data[0]
+    CH1 = data[1]
+    CH2 = data[2]
+    CH3 = data[3]
+    CH4 = data[4]
+
+    V_d2 = CH3 - CH1
+    T = T_e(V_d2,V_bias)
+
+    V_d3 = 10**(((CH3 - CH4)-2.65)/0.95)
+    R = 1.1
+    I_3 = V_d3/R
+
+    density = (M**0.5 / A) * I_3 * 1e6 * f1(V_d2,T)
+    return density,T
+
+def calculate_plasma_params(n_trace,t_trace,trigger,t):
+    #get sample range from trigger
+    t_trig = t[np.where(abs(trigger)> 0.1)]
+    t_i = np.min(t_trig)
+    t_f = np.max(t_trig)
+    sample_length = t_f - t_i
+
+    sample_range = (t_i + 0.25*sample_length,t_f - 0.25*sample_length)
+
+    avg_density = np.mean(n_trace[np.where((t > sample_range[0]) & (t < sample_range[1]))])
+    std_density = np.std(n_trace[np.where((t > sample_range[0]) & (t < sample_range[1]))])
+
+    avg_temp = np.mean(t_trace[np.where((t > sample_range[0]) & (t < sample_range[1]))])
+    std_temp = np.std(t_trace[np.where((t > sample_range[0]) & (t < sample_range[1]))])
+    return [avg_density,std_density],[avg_temp,std_temp]
+
+def f1(V_d2,T_e):
+    return 1.05e9 * (T_e)**(-0.5) / (np.exp(V_d2/T_e) - 1)
+
+def T_e(V_d2,V_d3):
+    return V_d2/np.log(2)
+
+def calc_plasma_prop(data,buffer_size=0.2):
+    #analyze2.calc_plasma_prop (plot_over_time's copy has buffer_size 0.15) on a loaded shot
+    import numpy.ma as ma
+    t = data[0]
+    F = data[1]
+    current = -1*100*data[2]
+    high = data[3]
+    low = data[4]
+
+    #get t range where we want to calculate properties
+    indicies = np.argwhere(current > 40)
+    l = len(indicies)
+    indicies = indicies[int(l*buffer_size):-int(l*buffer_size)]
+
+    mask_array = np.ones(len(t))
+    mask_array[indicies] = 0
+
+    signals = [t,F,high,low,current]
+    msignals = []
+    for signal in signals:
+        msignals.append(ma.array(signal,mask=mask_array))
+
+    shunt_current = (msignals[2]-msignals[3])/98
+
+    A = 0.66 #mm^2 (probe cross section area
+    M = 40 #effective ion weight
+    V_bias = 100
+
+    T = T_e(msignals[2]-msignals[1],V_bias)
+    density = (M**0.5 / A) * shunt_current*1e6*f1(msignals[2]-msignals[1],T)
+    result = (np.mean(T),np.std(T),np.mean(density),np.std(density))
+    #a fully masked window gives masked means, nan in the new code
+    return tuple(np.nan if v is ma.masked else float(v) for v in result)
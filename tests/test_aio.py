@@ -0,0 +1,64 @@
+#the awaitable scope and stepper against fake_visa and stepper_sim
+import asyncio
+import struct
+import numpy as np
+import pytest
+
+import aio
+import fake_visa
+import stepper
+import stepper_sim
+
+def run(coro):
+    return asyncio.run(coro)
+
+def test_move_while_capturing():
+    async def main():
+        scope_io = aio.AsyncScope(fake_visa.FakeScope(seed=0,rep_rate=20.0))
+        preamble = await scope_io.setup()
+        motor = aio.AsyncFramedStepper(stepper_sim.SimulatedController(speed=100.0))
+        result,shot = await asyncio.gather(motor.move_to(4.0),scope_io.capture())
+        scope_io.close()
+        return result,motor.mm_loc,shot,preamble
+    result,mm,shot,preamble = run(main())
+    assert result == 'normal' and abs(mm - 4.0) < 1e-3
+    assert shot.shape == (5,preamble.npts) and np.all(np.isfinite(shot))
+
+def test_timed_out_move_stops_the_controller():
+    async def main():
+        controller = stepper_sim.SimulatedController(speed=100.0)
+        motor = aio.AsyncFramedStepper(controller)
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(motor.move_to(50.0),0.05)
+        await asyncio.sleep(0.05)
+        stopped = controller.move is None and motor.mm_loc < 50.0
+        #the ack and done of that stop must not end the next move early
+        result = await motor.move_to(2.0)
+        return stopped,result,motor.mm_loc
+    stopped,result,mm = run(main())
+    assert stopped
+    assert result == 'normal' and abs(mm - 2.0) < 1e-3
+
+def test_unread_frames_do_not_end_the_next_move():
+    #a move cancelled before its ack was read leaves that ack, progress and the stop's frames behind
+    async def main():
+        controller = stepper_sim.SimulatedController(speed=100.0)
+        motor = aio.AsyncFramedStepper(controller)
+        motor.transport.send(stepper.CMD_MOVE_TO,struct.pack('<i',int(50.0*stepper.STEPS_PER_MM)))
+        await asyncio.sleep(0.02)
+        motor.transport.send(stepper.CMD_STOP)
+        result = await motor.move_to(3.0)
+        return result,motor.mm_loc
+    result,mm = run(main())
+    assert result == 'normal' and abs(mm - 3.0) < 1e-3
+
+def test_missing_trigger_times_out():
+    async def main():
+        scope_io = aio.AsyncScope(fake_visa.FakeScope(seed=0,rep_rate=0.01))
+        await scope_io.setup()
+        try:
+            with pytest.raises(asyncio.TimeoutError):
+                await scope_io.capture(timeout=0.1)
+        finally:
+            scope_io.close()
+    run(main())
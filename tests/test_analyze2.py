@@ -0,0 +1,37 @@
+#the summary tables of analyze2 over the shots in data/
+import os
+
+import analyze2
+import catalog
+from analysis_engine import AnalysisEngine
+
+DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),'data')
+
+class CountingEngine(AnalysisEngine):
+    #an engine without an on disk cache that remembers whether it was closed
+    made = []
+    def __init__(self,**kwargs):
+        kwargs['cache_path'] = None
+        AnalysisEngine.__init__(self,**kwargs)
+        self.closed = False
+        CountingEngine.made.append(self)
+
+    def close(self):
+        self.closed = True
+        AnalysisEngine.close(self)
+
+def test_tables_close_their_own_engine(tmp_path,monkeypatch):
+    monkeypatch.setattr(analyze2,'AnalysisEngine',CountingEngine)
+    CountingEngine.made = []
+    cat = catalog.Catalog(DATA,str(tmp_path / 'catalog.sqlite'))
+    table = analyze2.solenoid_table([0,1],'07_31_2018',(15,20),cat=cat)
+    assert table.shape == (2,5) and list(table[:,0]) == [15,20]
+    assert len(CountingEngine.made) == 1 and CountingEngine.made[0].closed
+
+    #an engine that is passed in belongs to the caller and stays open
+    engine = CountingEngine()
+    CountingEngine.made = []
+    analyze2.solenoid_table([0,1],'07_31_2018',(15,20),cat=cat,engine=engine)
+    assert not engine.closed and CountingEngine.made == []
+    engine.close()
+    cat.close()
@@ -0,0 +1,56 @@
+#conversion of shots to density and temperature against the original formula
+import copy
+import numpy as np
+
+import calibration
+import fake_visa
+import probe_math as pmath
+import scope
+from tests import baseline
+
+def preamble_and_codes(nshots=10,npts=2000):
+    fake = fake_visa.FakeScope(npts=npts,seed=0)
+    scope.configure(fake)
+    preamble = scope.read_preamble(fake)
+    return preamble,np.stack([scope.read_codes(fake,preamble) for i in range(nshots)])
+
+def volts(preamble,codes):
+    #(5,n) shot of (4,n) codes of any length, preamble.scale only takes preamble.npts
+    channels = preamble.ymult[:,None]*(codes - preamble.yoff[:,None]) + preamble.yzero[:,None]
+    return np.vstack([np.arange(codes.shape[-1]),channels])
+
+def assert_same(result,expected):
+    for a,b in zip(result,expected):
+        assert np.allclose(a,b,rtol=1e-12,atol=0,equal_nan=True)
+
+def test_formula_matches_baseline_off_grid():
+    #filtered traces take voltages between the scope's steps, they go through the formula
+    shot = fake_visa.synthetic_shot(5000,seed=1)
+    filtered = np.array(baseline.apply_filter(shot))
+    with np.errstate(divide='ignore',invalid='ignore'):
+        assert_same(pmath.calculate_plasma_trace(filtered),baseline.calculate_plasma_trace(filtered))
+        assert_same(pmath.calculate_plasma_trace(filtered + 1e-4*np.pi),baseline.calculate_plasma_trace(filtered + 1e-4*np.pi))
+
+def test_code_tables_are_exact():
+    preamble,codes = preamble_and_codes()
+    conversion = calibration.Conversion().tabulate_codes(preamble)
+    assert conversion.current_codes is not None and conversion.f1_codes is not None
+    with np.errstate(divide='ignore',invalid='ignore'):
+        for shot in codes:
+            assert_same(conversion.trace_codes(shot),baseline.calculate_plasma_trace(preamble.scale(shot)))
+        #every code the scope can send, not only those the fake happens to produce
+        info = np.iinfo(preamble.dtype)
+        rng = np.random.default_rng(0)
+        every = rng.integers(info.min,info.max + 1,(4,20000)).astype(preamble.dtype)
+        every[:,0] = info.min
+        every[:,1] = info.max
+        assert_same(conversion.trace_codes(every),baseline.calculate_plasma_trace(volts(preamble,every)))
+
+def test_different_scales_use_the_formula():
+    preamble,codes = preamble_and_codes(nshots=2)
+    preamble = copy.copy(preamble)
+    preamble.ymult = preamble.ymult*np.array([2.0,1.0,1.0,1.0])
+    conversion = calibration.Conversion().tabulate_codes(preamble)
+    assert conversion.f1_codes is None
+    with np.errstate(divide='ignore',invalid='ignore'):
+        assert_same(conversion.trace_codes(codes[0]),baseline.calculate_plasma_trace(preamble.scale(codes[0])))
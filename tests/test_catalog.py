@@ -0,0 +1,84 @@
+#the catalog only goes back to the file system when a date's run folders change
+import os
+import numpy as np
+
+import catalog
+
+DATE = '10_01_2018'
+
+def make_run(root,number,nshots=2):
+    folder = os.path.join(root,DATE,'raw',str(number))
+    os.makedirs(folder)
+    for j in range(nshots):
+        np.savetxt(os.path.join(folder,'data_{}.txt'.format(j)),np.zeros((10,5)))
+    return folder
+
+def write_key(root,rows,stamp):
+    path = os.path.join(root,DATE,'run_key.txt')
+    np.savetxt(path,rows,header='index pressure gas current')
+    os.utime(path,(stamp,stamp))
+
+def age(root,stamp):
+    #mtimes of the date folders set back, so a change made in the same clock tick still shows
+    for folder in (os.path.join(root,DATE),os.path.join(root,DATE,'raw')):
+        os.utime(folder,(stamp,stamp))
+
+class Counter:
+    def __init__(self,monkeypatch,module,name):
+        self.calls = 0
+        original = getattr(module,name)
+        def counted(*args,**kwargs):
+            self.calls += 1
+            return original(*args,**kwargs)
+        monkeypatch.setattr(module,name,counted)
+
+def test_queries_do_not_walk_an_unchanged_date(tmp_path,monkeypatch):
+    root = str(tmp_path / 'data')
+    make_run(root,0)
+    write_key(root,[[0,1e-3,0,15]],1000.0)
+    age(root,1000.0)
+    cat = catalog.Catalog(root)
+    walks = Counter(monkeypatch,catalog.os,'walk')
+    keys = Counter(monkeypatch,catalog.np,'loadtxt')
+
+    assert len(cat.shots(date=DATE)) == 2
+    assert cat.runs(date=DATE)[0].solenoid_current == 15
+    assert (walks.calls,keys.calls) == (1,1)
+    for k in range(5):
+        cat.runs(date=DATE)
+        list(cat.iter_shots(date=DATE))
+    assert (walks.calls,keys.calls) == (1,1)
+
+    #a run made through the catalog is recorded without a walk
+    run_id,number,folder = cat.new_run('raw',DATE)
+    assert number == 1
+    cat.runs(date=DATE)
+    assert walks.calls == 1
+
+    #a run folder made by something else changes the date's stamp
+    make_run(root,2)
+    age(root,2000.0)
+    assert [run.number for run in cat.runs(date=DATE)] == [0,1,2]
+    assert walks.calls == 2 and keys.calls == 2
+
+    #shots added to an old folder by hand need a refresh
+    np.savetxt(os.path.join(root,DATE,'raw','0','data_2.txt'),np.zeros((10,5)))
+    assert len(cat.shots(date=DATE,number=0)) == 2
+    cat.refresh(DATE)
+    assert len(cat.shots(date=DATE,number=0)) == 3
+
+    #a changed key is imported again
+    write_key(root,[[0,1e-3,0,25]],3000.0)
+    assert cat.runs(date=DATE,number=0)[0].solenoid_current == 25
+    cat.close()
+
+def test_index_tree_stamps_dates(tmp_path,monkeypatch):
+    root = str(tmp_path / 'data')
+    make_run(root,0)
+    age(root,1000.0)
+    cat = catalog.Catalog(root)
+    assert cat.index_tree() == 1
+    walks = Counter(monkeypatch,catalog.os,'walk')
+    assert len(cat.shots(date=DATE)) == 2
+    assert walks.calls == 0
+    cat.close()
@@ -0,0 +1,38 @@
+#decimated lines keep every spike and re-decimate when zoomed
+import numpy as np
+import pytest
+
+import decimate
+import fake_visa
+
+matplotlib = pytest.importorskip('matplotlib')
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+def test_envelope_keeps_extremes():
+    rng = np.random.default_rng(0)
+    y = rng.normal(size=100000)
+    y[12345] = 50.0
+    y[54321] = -50.0
+    x = np.arange(len(y),dtype=float)
+    p = decimate.Pyramid(x,y)
+    index = p.indices(0,len(y),500)
+    assert len(index) < 5000 and np.all(np.diff(index) >= 0)
+    assert 12345 in index and 54321 in index
+    #every bin's extremes are kept, so the decimated range is the full range
+    assert y[index].min() == y.min() and y[index].max() == y.max()
+
+def test_zoom_re_decimates():
+    shot = fake_visa.synthetic_shot(100000,seed=0)
+    fig,ax = plt.subplots()
+    line, = decimate.plot(ax,shot[0],shot[3])
+    fig.canvas.draw()
+    before = len(line.get_xdata())
+    assert before < 10*ax.bbox.width
+    ax.set_xlim(shot[0][29000],shot[0][31000])
+    fig.canvas.draw()
+    x = line.get_xdata()
+    inside = np.sum((x >= shot[0][29000]) & (x <= shot[0][31000]))
+    #the view then gets about two points per pixel again
+    assert len(x) != before and inside >= ax.bbox.width
+    plt.close(fig)
@@ -0,0 +1,50 @@
+#the live monitor against a reader that is much faster than its analysis
+import time
+import numpy as np
+
+import fake_visa
+import scope
+from live_monitor import LiveMonitor
+
+def test_slow_analysis_keeps_every_shot(tmp_path):
+    #200 distinct shots as fast as they can be read, each one's number in every sample, then the last one
+    #repeated like a stopped scope; the analysis takes 20 ms a call and returns the shot number as density
+    nshots = 200
+    read = [0]
+    def read_shot():
+        k = min(read[0],nshots - 1)
+        read[0] += 1
+        return np.full((5,10),float(k))
+    calls = []
+    def analyse(shots):
+        time.sleep(0.02)
+        calls.append(len(shots))
+        k = shots[:,0,0]
+        return np.column_stack([np.ones_like(k),np.zeros_like(k),k,np.zeros_like(k)])
+
+    filename = str(tmp_path / 'live.csv')
+    monitor = LiveMonitor(read_shot,analyse=analyse,filename=filename,poll=0.001).start()
+    deadline = time.time() + 10
+    while monitor.snapshot()['shots'] < nshots and time.time() < deadline:
+        time.sleep(0.01)
+    monitor.stop()
+    snapshot = monitor.snapshot()
+
+    assert snapshot['dropped'] == 0
+    assert snapshot['shots'] == nshots
+    #it fell behind and caught up by reducing the backlog in batches
+    assert max(calls) > 1 and len(calls) < nshots
+    saved = np.loadtxt(filename,delimiter=',',ndmin=2)
+    assert sorted(saved[:,0]) == list(range(nshots))
+
+def test_frozen_frame_is_analysed_once():
+    fake = fake_visa.FakeScope(seed=0)
+    scope.configure(fake)
+    preamble = scope.read_preamble(fake)
+    frozen = scope.read_curve(fake,preamble)
+    monitor = LiveMonitor(lambda: frozen).start()
+    time.sleep(0.3)
+    monitor.stop()
+    snapshot = monitor.snapshot()
+    assert snapshot['shots'] == 1 and snapshot['repeats'] > 0
+    assert snapshot['n'] == 1
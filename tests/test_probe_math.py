@@ -0,0 +1,50 @@
+#the shared filters against the per channel filtfilt of the first commit
+import glob
+import os
+import numpy as np
+import scipy.signal as signal
+
+import fake_visa
+import probe_math as pmath
+import shot_store
+from tests import baseline
+
+DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),'data','07_31_2018')
+
+def archived():
+    paths = sorted(glob.glob(os.path.join(DATA,'*','data_*.txt')))
+    assert paths
+    return shot_store.load_shots(paths)
+
+def test_apply_filter_matches_baseline():
+    stack = archived()
+    for shot in stack:
+        assert np.allclose(pmath.apply_filter(shot),baseline.apply_filter(shot),rtol=1e-10,atol=1e-9)
+    #a whole stack filters as its shots one by one
+    assert np.array_equal(pmath.apply_filter(stack),np.stack([pmath.apply_filter(shot) for shot in stack]))
+
+def test_streaming_shots_do_not_depend_on_the_batch():
+    shots = np.stack([fake_visa.synthetic_shot(2000,seed=k) for k in range(6)])
+    f = pmath.StreamingFilter()
+    whole = f(shots)
+    assert np.array_equal(whole[:,0],shots[:,0])
+    for k,shot in enumerate(shots):
+        assert np.allclose(f(shot),whole[k],rtol=0,atol=1e-12)
+    assert np.allclose(np.concatenate([f(shots[:2]),f(shots[2:])]),whole,rtol=0,atol=1e-12)
+
+def test_streaming_shot_starts_from_steady_state():
+    #a constant shot comes out unchanged, there is no start up transient
+    shot = np.ones((5,500))*np.arange(5)[:,None]
+    assert np.allclose(pmath.StreamingFilter()(shot),shot,rtol=0,atol=1e-12)
+
+def test_feed_matches_one_record():
+    record = np.concatenate([fake_visa.synthetic_shot(1000,seed=k) for k in range(3)],axis=1)
+    f = pmath.StreamingFilter()
+    whole = f(record)
+    sos = pmath.filter_design()
+    expected = signal.sosfilt(sos,record[1:],axis=-1,zi=signal.sosfilt_zi(sos)[:,None]*record[None,1:,:1])[0]
+    assert np.allclose(whole[1:],expected,rtol=0,atol=1e-12)
+    for size in (1,7,500,3000):
+        f.reset()
+        fed = np.concatenate([f.feed(record[:,i:i+size]) for i in range(0,record.shape[1],size)],axis=1)
+        assert np.allclose(fed,whole,rtol=0,atol=1e-12)
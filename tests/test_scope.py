@@ -0,0 +1,61 @@
+#scope sessions against fake_visa
+import numpy as np
+import pytest
+
+import fake_visa
+import scope
+
+class DeadScope(fake_visa.FakeScope):
+    #a scope whose first WFMPR? fails in transfer, before the session ever had a preamble
+    def query(self,cmd):
+        if cmd.strip().upper() == 'WFMPR?':
+            raise scope.TransferError('no response')
+        return fake_visa.FakeScope.query(self,cmd)
+
+def test_setup_error_is_not_hidden():
+    session = scope.ScopeSession(DeadScope(seed=0))
+    with pytest.raises(scope.TransferError):
+        session.read()
+    assert session.preamble is None
+
+@pytest.mark.parametrize('encoding,width',[('RIBinary',1),('RIBinary',2),('RPBinary',1),('RPBinary',2)])
+def test_binary_matches_ascii(encoding,width):
+    #the same shots through a binary and an ASCII transfer
+    binary = scope.ScopeSession(fake_visa.FakeScope(seed=0),encoding,width)
+    ascii = scope.ScopeSession(fake_visa.FakeScope(seed=0),'ASCII',width)
+    for k in range(3):
+        shot = binary.read()
+        assert shot.shape == (5,500)
+        assert np.allclose(shot,ascii.read(),rtol=0,atol=1e-9)
+    codes = binary.read_codes()
+    assert codes.dtype == binary.preamble.code_dtype
+    assert np.allclose(binary.preamble.scale(codes),ascii.read(),rtol=0,atol=1e-9)
+
+def test_shots_look_like_the_synthetic_ones():
+    session = scope.ScopeSession(fake_visa.FakeScope(seed=0))
+    shot = session.read()
+    assert np.all(np.diff(shot[0]) > 0)
+    #the current pulse is in the middle 40% of the shot, to within a code of 8 mV
+    assert np.all(np.abs(-100*shot[2,200:350] - 60.0) < 5.0)
+
+def test_changed_record_length_is_read_again():
+    fake = fake_visa.FakeScope(seed=0)
+    session = scope.ScopeSession(fake)
+    assert session.read().shape == (5,500)
+    fake.npts = 800
+    assert session.read().shape == (5,800)
+    assert session.npts == 800
+
+class BrokenBinaryScope(fake_visa.FakeScope):
+    #binary curves arrive without their block header
+    def read_raw(self):
+        raw = fake_visa.FakeScope.read_raw(self)
+        return raw[4:] if self.encoding != 'ASCII' else raw
+
+def test_failed_binary_transfer_falls_back_to_ascii():
+    session = scope.ScopeSession(BrokenBinaryScope(seed=0))
+    assert session.read().shape == (5,500)
+    assert session.encoding == 'ASCII' and not session.preamble.binary
+    strict = scope.ScopeSession(BrokenBinaryScope(seed=0),fallback=False)
+    with pytest.raises(scope.TransferError):
+        strict.read()
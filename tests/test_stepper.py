@@ -0,0 +1,39 @@
+#the framed stepper protocol against stepper_sim, at 100x real time
+import struct
+import time
+
+import stepper
+import stepper_sim
+
+def goal(mm):
+    return struct.pack('<i',int(round(mm*stepper.STEPS_PER_MM)))
+
+def test_zero_ack_is_read():
+    motor = stepper_sim.SimulatedStepper(speed=100.0)
+    assert motor.frames == [] and motor.ser.in_waiting == 0
+    assert motor.position() == 0.0
+    assert motor.move_to(1.0) == 'normal'
+    assert abs(motor.mm_loc - 1.0) < 1e-3
+
+def test_stop_does_not_end_next_move():
+    #the ack and done that follow a stop are still waiting when the next move starts
+    motor = stepper_sim.SimulatedStepper(speed=100.0)
+    motor.send(stepper.CMD_MOVE_TO,goal(50.0))
+    time.sleep(0.02)
+    motor.stop()
+    time.sleep(0.01)
+    assert motor.move_to(2.0) == 'normal'
+    assert abs(motor.mm_loc - 2.0) < 1e-3
+    assert motor.ser.move is None
+
+def test_unread_done_does_not_end_next_move():
+    motor = stepper_sim.SimulatedStepper(speed=100.0)
+    motor.send(stepper.CMD_MOVE_TO,goal(1.0))
+    time.sleep(0.05)
+    assert motor.move_to(3.0) == 'normal'
+    assert abs(motor.mm_loc - 3.0) < 1e-3
+
+def test_limit_switch():
+    motor = stepper_sim.SimulatedStepper(speed=100.0)
+    assert motor.go_to(-1000.0) == 'neg_limit'
+    assert motor.go_to(1.0) == 'normal'
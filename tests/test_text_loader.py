@@ -0,0 +1,71 @@
+#the %.18e decoder of text_loader against np.loadtxt
+import io
+import numpy as np
+import pytest
+
+import text_loader
+
+def saved(values,**kwargs):
+    f = io.BytesIO()
+    np.savetxt(f,values,**kwargs)
+    return f.getvalue()
+
+def table(seed=0,rows=200):
+    #values over the whole exponent range, both signs and exact zeros
+    rng = np.random.default_rng(seed)
+    values = rng.normal(size=(rows,5))*10.0**rng.integers(-99,99,size=(rows,5))
+    values[::7,2] = 0.0
+    return values
+
+def test_matches_loadtxt():
+    for seed in range(5):
+        raw = saved(table(seed))
+        expected = np.loadtxt(io.BytesIO(raw)).T
+        fast = text_loader.parse(raw)
+        assert fast.shape == expected.shape
+        assert np.all(np.abs(fast - expected) <= 1e-15*np.abs(expected))
+        assert np.array_equal(text_loader.parse(raw,exact=True),expected)
+
+def test_crlf_and_header():
+    values = table(1,20)
+    raw = saved(values,header='t ch1 ch2 ch3 ch4').replace(b'\n',b'\r\n')
+    assert np.allclose(text_loader.parse(raw,skiprows=1),values.T,rtol=1e-15,atol=0)
+
+#one byte changed in the first field of the second row, every position of a field in turn
+RAW = saved(table(2,3))
+FIELD = RAW.index(b'\n') + 1
+
+@pytest.mark.parametrize('offset,byte',[(0,b','),(1,b'/'),(1,b':'),(2,b','),(5,b'/'),(22,b'e'),(22,b','),(23,b'*'),
+                                        (24,b'.'),(25,b','),(25,b'e')])
+def test_malformed_field_is_not_decoded(offset,byte):
+    first = RAW[FIELD:FIELD+26]
+    #a positive field has no sign byte, so its separator is the byte before it
+    start = FIELD - 1 if first[0:1] != b'-' else FIELD
+    raw = RAW[:start+offset] + byte + RAW[start+offset+1:]
+    with pytest.raises(ValueError):
+        text_loader.parse(raw)
+
+def test_double_sign_is_not_decoded():
+    raw = RAW.replace(b' -',b' --',1) if b' -' in RAW else RAW.replace(b' ',b' --',1)
+    with pytest.raises(ValueError):
+        text_loader.parse(raw)
+
+def test_other_formats_fall_back():
+    values = table(3,10)
+    for fmt in ('%.6e','%g','%.18f'):
+        raw = saved(values,fmt=fmt)
+        assert np.array_equal(text_loader.parse(raw),np.loadtxt(io.BytesIO(raw)).T)
+
+def test_truncated_file(tmp_path):
+    paths = []
+    for j in range(3):
+        path = str(tmp_path / 'data_{}.txt'.format(j))
+        np.savetxt(path,table(j,50))
+        paths.append(path)
+    with open(paths[1],'r+b') as f:
+        f.truncate(len(f.read()) - 40)
+    shots,index,errors = text_loader.load_text(paths,workers=1)
+    assert list(errors) == [paths[1]] and sorted(index) == [paths[0],paths[2]]
+    assert np.array_equal(shots[index[paths[2]]],text_loader.read_text(paths[2]))
+    with pytest.raises(ValueError):
+        text_loader.load_text(paths,workers=1,strict=True)
@@ -0,0 +1,51 @@
+#incremental analysis of a folder that is still being written
+import os
+import numpy as np
+
+import fake_visa
+import scope
+import watch
+from analysis_engine import AnalysisEngine
+
+def write_shots(folder,fake,preamble,position,n):
+    for j in range(n):
+        np.savetxt(os.path.join(folder,'data_{}mm_{}.txt'.format(position,j)),scope.read_curve(fake,preamble).T)
+
+def test_state_stays_out_of_the_folder(tmp_path,monkeypatch):
+    monkeypatch.setattr(watch,'STATE_DIR',str(tmp_path / 'state'))
+    folder = str(tmp_path / 'scan_0')
+    os.makedirs(folder)
+    fake = fake_visa.FakeScope(seed=0)
+    scope.configure(fake)
+    preamble = scope.read_preamble(fake)
+    write_shots(folder,fake,preamble,2.0,3)
+    os.utime(folder,(1000.0,1000.0))
+    before = sorted(os.listdir(folder))
+
+    engine = AnalysisEngine(cache_path=None,buffer_size=0.2)
+    w = watch.FolderWatch(folder,engine,settle=0.0)
+    assert w.update() == 3
+    assert w.update() == 0
+    w.close()
+    engine.close()
+    #the folder is as it was, so the catalog's stamp of it did not move
+    assert sorted(os.listdir(folder)) == before
+    assert os.path.getmtime(folder) == 1000.0
+    assert os.path.isfile(watch.state_path(folder))
+
+def test_deleted_shot_is_taken_out(tmp_path,monkeypatch):
+    monkeypatch.setattr(watch,'STATE_DIR',str(tmp_path / 'state'))
+    folder = str(tmp_path / 'scan_1')
+    os.makedirs(folder)
+    fake = fake_visa.FakeScope(seed=1)
+    scope.configure(fake)
+    preamble = scope.read_preamble(fake)
+    write_shots(folder,fake,preamble,2.0,3)
+    engine = AnalysisEngine(cache_path=None,buffer_size=0.2)
+    w = watch.FolderWatch(folder,engine,settle=0.0)
+    w.update()
+    os.remove(os.path.join(folder,'data_2.0mm_2.txt'))
+    assert w.update() == 1
+    assert len(w) == 2
+    w.close()
+    engine.close()
@@ -0,0 +1,78 @@
+#the shared windows against the windows the analysis scripts used to pick for themselves
+import glob
+import os
+import numpy as np
+import pytest
+
+import analyze2
+import fake_visa
+import plot_over_time
+import probe_math as pmath
+import shot_store
+import windows
+from tests import baseline
+
+DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),'data','07_31_2018')
+
+def shots():
+    #a clean pulse, one with dips below threshold, one too short to trim and one without a pulse
+    rng = np.random.default_rng(0)
+    clean = fake_visa.synthetic_shot(2000,seed=0)
+    gaps = fake_visa.synthetic_shot(2000,seed=1)
+    dips = 600 + rng.choice(800,80,replace=False)
+    gaps[2,dips] = 0.0
+    short = fake_visa.synthetic_shot(2000,seed=2)
+    short[2,:] = 0.0
+    short[2,1000:1003] = -1.0
+    flat = fake_visa.synthetic_shot(2000,seed=3)
+    flat[2,:] = 0.0
+    return [clean,gaps,short,flat]
+
+def same(a,b):
+    #rows of (mean,std) pairs, a std is compared to its mean since the spread of a constant is rounding noise
+    a = np.asarray(a,dtype=float).reshape(-1,2)
+    b = np.asarray(b,dtype=float).reshape(-1,2)
+    scale = 1e-10*np.abs(b[:,:1])
+    return bool(np.all(np.isclose(a[:,0],b[:,0],rtol=1e-10,atol=0,equal_nan=True)) and
+                np.all((np.abs(a[:,1:] - b[:,1:]) <= scale) | (np.isnan(a[:,1:]) & np.isnan(b[:,1:]))))
+
+@pytest.mark.parametrize('k',range(4))
+def test_calc_plasma_prop_matches_baseline(k):
+    shot = shots()[k]
+    with np.errstate(divide='ignore',invalid='ignore'):
+        expected = baseline.calc_plasma_prop(shot,0.2)
+        assert same(analyze2.calc_plasma_prop(shot),expected)
+        assert same(pmath.calc_plasma_props_batch(shot[None])[0],expected)
+        assert same(plot_over_time.calc_plasma_prop(shot),baseline.calc_plasma_prop(shot,0.15))
+
+def test_batch_matches_baseline():
+    stack = np.stack(shots())
+    with np.errstate(divide='ignore',invalid='ignore'):
+        expected = [baseline.calc_plasma_prop(shot) for shot in stack]
+        assert same(pmath.calc_plasma_props_batch(stack),expected)
+    #the short and flat shots have no window
+    assert np.all(np.isnan(expected[2])) and np.all(np.isnan(expected[3]))
+
+def test_count_window_only_uses_samples_above_threshold():
+    gaps = shots()[1]
+    start,stop,mask = windows.Threshold(40,0.2).select(gaps)
+    used = windows.samples(start,stop,mask)
+    assert np.all(-100*gaps[2,used] > 40)
+    assert windows.window_count(start,stop,mask) < stop - start
+
+def test_trace_params_match_baseline():
+    #calc_trace_params_batch against calculate_plasma_trace and calculate_plasma_params of the first commit,
+    #on the archived shots and on synthetic ones
+    paths = sorted(glob.glob(os.path.join(DATA,'*','data_*.txt')))
+    assert paths
+    for stack in (shot_store.load_shots(paths),np.stack(shots()[:2])):
+        check_trace_params(stack)
+
+def check_trace_params(stack):
+    with np.errstate(divide='ignore',invalid='ignore'):
+        result = pmath.calc_trace_params_batch(stack)
+        for shot,row in zip(stack,result):
+            density,T = baseline.calculate_plasma_trace(shot)
+            (n,std_n),(t,std_t) = baseline.calculate_plasma_params(density,T,shot[2],shot[0])
+            assert same(row,[t,std_t,n,std_n])
+            assert same(pmath.calculate_plasma_params(density,T,shot[2],shot[0]),[[n,std_n],[t,std_t]])
@@ -0,0 +1,185 @@
+#bulk loading of the legacy np.savetxt shot archives (data_<j>.txt and data_<mm>mm_<j>.txt)
+#np.savetxt writes every value as %.18e, so a value is always one digit, a point, 18 digits and a two digit
+#exponent around its 'e' and can be decoded with array indexing instead of a strtod per value
+#every byte of a field is checked against what %.18e can put at its position and the fields must cover
+#the whole file, so anything np.savetxt did not write goes to the strict parser
+#files in any other format fall back to np.fromstring, the result is (n_shots,channels,npts)
+#the decoded values can be an ulp or two off np.loadtxt, exact=True always goes through np.fromstring
+import os
+import logging
+import warnings
+import numpy as np
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor,ThreadPoolExecutor
+from numpy.lib.stride_tricks import sliding_window_view
+
+#a field is 26 bytes around its 'e': separator or minus sign, digit, point, 18 digits, e, sign, 2 digits, separator
+SEPARATOR = b' \t\n'
+def _allowed(chars):
+    table = np.zeros(256,dtype=bool)
+    table[np.frombuffer(chars,dtype=np.uint8)] = True
+    return table
+LEAD = _allowed(SEPARATOR + b'-')
+SIGN = _allowed(b'+-')
+TRAIL = _allowed(SEPARATOR)
+NINE = 10.0**np.arange(8,-1,-1)
+#10**k for the exponents of both mantissa halves, k from -99-18 to 99-9
+POWER = 10.0**np.arange(-117,91)
+
+def _fixed(b,e,nchannels):
+    #values of the %.18e fields with their 'e' at e, None unless b is exactly rows of nchannels such fields,
+    #one separator apart and each row ended by a newline, so anything else goes to the strict parser
+    if e[0] < 21 or e[-1] + 4 >= len(b):
+        return None
+    fields = sliding_window_view(b,26)[e - 21]
+    #bytes below '0' wrap around to above 9
+    digits = fields - np.uint8(48)
+    if (digits[:,1].max() > 9 or digits[:,3:21].max() > 9 or digits[:,23:25].max() > 9 or
+            np.any(fields[:,2] != ord('.')) or not (LEAD[fields[:,0]].all() and SIGN[fields[:,22]].all() and TRAIL[fields[:,25]].all())):
+        return None
+    #each field starts at the separator the one before it ended with, a minus sign moves that back a byte
+    negative = fields[:,0] == ord('-')
+    start = e - 21 - negative
+    end = e + 4
+    if start[0] != 0 or np.any(start[1:] != end[:-1]):
+        return None
+    #the last field ends the data, only the newline padding may follow
+    if np.any(b[end[-1] + 1:] != ord('\n')):
+        return None
+    newline = fields[:,25] == ord('\n')
+    if np.any(newline != (np.arange(len(e)) % nchannels == nchannels - 1)):
+        return None
+    exponent = digits[:,23].astype(np.intp)*10 + digits[:,24]
+    exponent[fields[:,22] == ord('-')] *= -1
+    digits = digits.astype(float)
+    #the 19 digit mantissa does not fit a double, so it is split in two exact halves,
+    #the result is within an ulp or two of strtod
+    high = digits[:,1]*1e9 + digits[:,3:12] @ NINE
+    low = digits[:,12:21] @ NINE
+    values = high*POWER[exponent + 108] + low*POWER[exponent + 99]
+    values[negative] *= -1
+    return values
+
+def skip_lines(raw,skiprows):
+    #raw without its first skiprows lines, e.g. the header line some days' files start with
+    pos = 0
+    for k in range(skiprows):
+        pos = raw.find(b'\n',pos) + 1
+        if not pos:
+            return b''
+    return raw[pos:]
+
+def parse(raw,nchannels=5,skiprows=0,exact=False):
+    #(channels,npts) from the bytes of one file, ValueError if it is not whole rows of nchannels numbers
+    if skiprows:
+        raw = skip_lines(raw,skiprows)
+    if b'\r' in raw:
+        raw = raw.replace(b'\r\n',b'\n')
+    rows = raw.count(b'\n') + (not raw.endswith(b'\n'))
+    #padded so the first and last fields have their separators too
+    b = np.frombuffer(b' ' + raw + b'\n',dtype=np.uint8)
+    e = np.flatnonzero(b == ord('e'))
+    values = _fixed(b,e,nchannels) if len(e) == rows*nchannels and len(e) and not exact else None
+    if values is None:
+        with warnings.catch_warnings():
+            #fromstring only warns when it stops at something that is not a number
+            warnings.simplefilter('error',DeprecationWarning)
+            try:
+                values = np.fromstring(raw,sep=' ')
+            except (DeprecationWarning,ValueError):
+                raise ValueError('not a table of numbers')
+    if not len(values) or len(values) % nchannels:
+        raise ValueError('{} values is not a whole number of {} column rows, truncated?'.format(len(values),nchannels))
+    return values.reshape(-1,nchannels).T
+
+def read_text(path,nchannels=5,skiprows=0,exact=False):
+    with open(path,'rb') as f:
+        return parse(f.read(),nchannels,skiprows,exact)
+
+def _read_chunk(paths,nchannels,skiprows=0):
+    #(shot or None,error or None) per path, errors are returned rather than raised so one bad file
+    #does not lose the rest of the chunk
+    result = []
+    for path in paths:
+        try:
+            result.append((read_text(path,nchannels,skiprows),None))
+        except (OSError,ValueError) as err:
+            result.append((None,str(err)))
+    return result
+
+def load_text(paths,workers=None,chunk=32,nchannels=5,threads=False,strict=False,skiprows=0):
+    #returns (shots,index,errors), shots stacked as (n,nchannels,npts), index {path:row in shots} and
+    #errors {path:reason} for files that could not be read or whose npts differs from the most common one
+    #files are parsed chunk by chunk in worker processes, threads=True uses threads instead
+    #(enough when the archive is on a slow network drive), strict=True raises on any bad file,
+    #skiprows header lines are skipped at the top of every file
+    paths = list(paths)
+    workers = workers or os.cpu_count() or 1
+    chunks = [paths[i:i+chunk] for i in range(0,len(paths),chunk)]
+    if len(chunks) <= 1 or workers == 1:
+        parts = [_read_chunk(part,nchannels,skiprows) for part in chunks]
+    else:
+        with (ThreadPoolExecutor if threads else ProcessPoolExecutor)(workers) as pool:
+            parts = list(pool.map(_read_chunk,chunks,[nchannels]*len(chunks),[skiprows]*len(chunks)))
+    loaded = [item for part in parts for item in part]
+
+    errors = {path:err for path,(shot,err) in zip(paths,loaded) if err is not None}
+    sizes = Counter(shot.shape[1] for shot,err in loaded if shot is not None)
+    npts = sizes.most_common(1)[0][0] if sizes else 0
+    index = {}
+    for path,(shot,err) in zip(paths,loaded):
+        if shot is None:
+            continue
+        if shot.shape[1] != npts:
+            errors[path] = '{} points where the other files have {}'.format(shot.shape[1],npts)
+        else:
+            index[path] = len(index)
+
+    for path,err in errors.items():
+        logging.warning('Skipped {}: {}'.format(path,err))
+    if strict and errors:
+        raise ValueError('{} of {} files could not be loaded'.format(len(errors),len(paths)))
+    shots = np.empty((len(index),nchannels,npts))
+    for path,(shot,err) in zip(paths,loaded):
+        if path in index:
+            shots[index[path]] = shot
+    return shots,index,errors
+
+def load_text_folder(folder,**kwargs):
+    #every text shot in a folder in shot_store.text_shots order, plus the (position,shot) of each row
+    import shot_store
+    listed = shot_store.text_shots(folder)
+    shots,index,errors = load_text([path for position,shot,path in listed],**kwargs)
+    keys = [(position,shot) for position,shot,path in listed if path in index]
+    return shots,keys,errors
+
+if __name__=='__main__':
+    import sys
+    import time
+    import glob
+    import tempfile
+
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) > 1:
+        paths = sorted(glob.glob(os.path.join(sys.argv[1],'*.txt')))
+    else:
+        #a 400 shot scan like the ones under scans/, with one truncated file
+        folder = tempfile.mkdtemp()
+        rng = np.random.default_rng(0)
+        paths = []
+        for j in range(400):
+            path = os.path.join(folder,'data_{}mm_{}.txt'.format(2*(j//10),j % 10))
+            np.savetxt(path,rng.normal(size=(500,5)))
+            paths.append(path)
+        with open(paths[7],'r+b') as f:
+            f.truncate(os.path.getsize(paths[7]) - 40)
+
+    t = time.perf_counter()
+    shots,index,errors = load_text(paths)
+    t_bulk = time.perf_counter() - t
+    t = time.perf_counter()
+    serial = np.stack([np.loadtxt(path).T for path in index])
+    t_loadtxt = time.perf_counter() - t
+    print('loadtxt {:.2f} s, load_text {:.2f} s ({:.1f}x), {} shots, {} skipped'.format(
+        t_loadtxt,t_bulk,t_loadtxt/t_bulk,len(shots),len(errors)))
+    print('largest difference {:.1e} relative'.format(np.max(np.abs(shots - serial)/np.maximum(np.abs(serial),1e-300))))
@@ -0,0 +1,146 @@
+#error bars by resampling, shots are drawn with replacement (bootstrap) and the constants of the density
+#formula from their uncertainties (Monte Carlo) in the same draw, with draws along an extra leading axis
+#so a whole position is a handful of array operations instead of a python loop per resample
+#the error of a position is the spread of its resampled mean, which includes the shot to shot scatter
+#and the calibration, unlike analyze2.summarize which adds the within shot spreads in quadrature
+import logging
+import numpy as np
+
+import probe_math as pmath
+import shot_store
+import windows
+
+class Constants:
+    #nominal values and one sigma uncertainties of the density constants, drawn as independent normals
+    #with a diode the shot current comes from its calibration instead of the 98 Ohm shunt, the diode offset
+    #and slope are drawn jointly from diode.cov when it was fitted, otherwise from sigma offset and slope
+    def __init__(self,A=0.66,M=40,shunt=98,diode=None,sigma=None):
+        self.A = A
+        self.M = M
+        self.shunt = shunt
+        self.diode = diode
+        self.sigma = {'A':0.0,'M':0.0,'shunt':0.0,'offset':0.0,'slope':0.0}
+        unknown = set(sigma or {}) - set(self.sigma)
+        if unknown:
+            raise TypeError('Unknown constants {}'.format(sorted(unknown)))
+        self.sigma.update(sigma or {})
+
+    def draw(self,rng,n):
+        #{name:(n,) values}, the first draw is always the nominal one
+        drawn = {}
+        for name in ('A','M','shunt'):
+            drawn[name] = getattr(self,name) + self.sigma[name]*rng.standard_normal(n)
+        if self.diode is not None:
+            mean = [self.diode.offset,self.diode.slope]
+            cov = self.diode.cov if self.diode.cov is not None else np.diag([self.sigma['offset']**2,self.sigma['slope']**2])
+            drawn['offset'],drawn['slope'] = rng.multivariate_normal(mean,cov,n).T
+            drawn['offset'][0],drawn['slope'][0] = mean
+        for name in ('A','M','shunt'):
+            drawn[name][0] = getattr(self,name)
+        return drawn
+
+class Propagation:
+    #n resamples per position from a generator seeded with seed, so tables are reproducible
+    #chunk bounds how many draws of the diode current are held at once, each is (shots,window) doubles
+    def __init__(self,n=1000,seed=0,constants=None,V_bias=100,policy=None,chunk=64):
+        self.n = n
+        self.seed = seed
+        self.constants = constants or Constants()
+        self.V_bias = V_bias
+        self.policy = policy or windows.Threshold(40,0.2)
+        self.chunk = chunk
+
+    def shot_values(self,shots,drawn):
+        #(n_shots,) window mean T and (n,n_shots) window mean density for every draw of the constants
+        shots = np.asarray(shots,dtype=float)
+        start,stop,mask = self.policy.select(shots)
+        cols = windows.crop(start,stop)
+        shots = shots[...,cols]
+        start = start - cols.start
+        stop = stop - cols.start
+        index = np.arange(shots.shape[-1])
+        inside = (index >= start[:,None]) & (index < stop[:,None])
+        if mask is not None:
+            inside &= mask[...,cols]
+        count = np.sum(inside,axis=-1).astype(float)
+
+        V_d2 = shots[:,3] - shots[:,1]
+        dV = shots[:,3] - shots[:,4]
+        with np.errstate(divide='ignore',invalid='ignore'):
+            T = pmath.T_e(V_d2,self.V_bias)
+            factor = pmath.f1(V_d2,T)
+            T = np.sum(np.where(inside,T,0.0),axis=-1) / count
+            scale = drawn['M']**0.5 / drawn['A'] * 1e6
+            if self.constants.diode is None:
+                #the shunt current is linear in dV, so the constants only scale the per shot mean
+                mean = np.sum(np.where(inside,dV*factor,0.0),axis=-1) / count
+                return T,(scale/drawn['shunt'])[:,None]*mean
+            density = np.empty((self.n,len(shots)))
+            R = self.constants.diode.R
+            for a in range(0,self.n,self.chunk or self.n):
+                b = min(a + (self.chunk or self.n),self.n)
+                offset = drawn['offset'][a:b,None,None]
+                slope = drawn['slope'][a:b,None,None]
+                current = 10**((dV - offset)/slope) / R
+                density[a:b] = np.sum(np.where(inside,current*factor,0.0),axis=-1) / count
+            return T,scale[:,None]*density
+
+    def resample(self,values,rng):
+        #(n,) bootstrap means, draw r resamples the shots of row r of values (or of values if it is 1d)
+        values = np.atleast_2d(values)
+        pick = rng.integers(0,values.shape[1],(self.n,values.shape[1]))
+        rows = np.broadcast_to(values,(self.n,values.shape[1]))
+        return np.mean(np.take_along_axis(rows,pick,axis=1),axis=1)
+
+    def position(self,shots,rng):
+        #{'T':(mean,err),'density':(mean,err)} of one position, shots whose window failed are left out
+        drawn = self.constants.draw(rng,self.n)
+        T,density = self.shot_values(shots,drawn)
+        good = np.isfinite(T) & np.all(np.isfinite(density),axis=0)
+        if not np.any(good):
+            return {'T':(np.nan,np.nan),'density':(np.nan,np.nan)}
+        T = T[good]
+        density = density[:,good]
+        return {'T':(np.mean(T),np.std(self.resample(T,rng),ddof=1)),
+                'density':(np.mean(density[0]),np.std(self.resample(density,rng),ddof=1))}
+
+    def table(self,groups):
+        #groups is [(key,shot sources)], rows are (key,T,err T,density,err density) like analyze2.summarize
+        rng = np.random.default_rng(self.seed)
+        rows = []
+        for key,sources in groups:
+            if not len(sources):
+                rows.append((key,np.nan,np.nan,np.nan,np.nan))
+                continue
+            result = self.position(shot_store.load_shots(sources),rng)
+            rows.append((key,) + result['T'] + result['density'])
+            logging.debug('{}: {}'.format(key,result))
+        return np.array(rows,dtype=float).reshape(-1,5)
+
+if __name__=='__main__':
+    import time
+    import fake_visa
+    import scope
+    import calibration
+
+    logging.basicConfig(level=logging.INFO)
+    #40 positions of 10 shots
+    fake = fake_visa.FakeScope(npts=2000,seed=0)
+    scope.configure(fake)
+    preamble = scope.read_preamble(fake)
+    groups = [(position,[scope.read_curve(fake,preamble) for j in range(10)]) for position in np.arange(2,82,2.0)]
+
+    shunt = Propagation(constants=Constants(sigma={'A':0.03,'shunt':1.0}))
+    diode = Propagation(constants=Constants(diode=calibration.NOMINAL,sigma={'A':0.03,'offset':0.05,'slope':0.02}))
+    for name,propagation in (('shunt',shunt),('diode',diode)):
+        t = time.perf_counter()
+        table = propagation.table(groups)
+        print('{}: {} positions x {} resamples in {:.2f} s, density {:.3e} +- {:.1e}'.format(
+            name,len(table),propagation.n,time.perf_counter() - t,table[0,3],table[0,4]))
+
+    #the same bootstrap of one position as a python loop, for comparison
+    rng = np.random.default_rng(0)
+    shots = np.stack(groups[0][1])
+    t = time.perf_counter()
+    means = [np.mean(pmath.calc_plasma_props_batch(shots[rng.integers(0,len(shots),len(shots))])[:,2]) for r in range(200)]
+    print('loop: 200 resamples of one position in {:.2f} s, density err {:.1e}'.format(time.perf_counter() - t,np.std(means,ddof=1)))
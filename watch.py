@@ -0,0 +1,252 @@
+#incremental analysis of a run or scan folder that is still being written
+#every processed shot is remembered in a small sqlite file in the folder, keyed by inode, mtime and size for
+#text files and by index for binary runs, so each update only analyses shots that arrived since the last one
+#per position sums are kept next to them so the summary table never has to go back over old shots,
+#a text file that is deleted takes its shot back out of them
+#the state lives outside the data tree, a file in the run folder would change the folder's mtime on every
+#commit and make the catalog index the folder again
+import os
+import time
+import hashlib
+import sqlite3
+import logging
+import numpy as np
+
+import shot_store
+from analysis_engine import AnalysisEngine
+
+STATE_DIR = os.path.join(os.path.expanduser('~'),'.lprobe','watch')
+
+def state_path(folder):
+    #one state file per watched folder, named after the folder and a hash of its absolute path
+    folder = os.path.abspath(folder)
+    key = hashlib.sha1(folder.encode()).hexdigest()[:16]
+    return os.path.join(STATE_DIR,'{}_{}.sqlite'.format(os.path.basename(folder),key))
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS shots (name TEXT PRIMARY KEY, inode INTEGER, mtime REAL, size INTEGER,
+    position REAL, shot INTEGER, T REAL, std_T REAL, density REAL, std_density REAL);
+CREATE TABLE IF NOT EXISTS positions (position REAL PRIMARY KEY, n INTEGER, bad INTEGER,
+    sum_T REAL, sum_var_T REAL, sum_density REAL, sum_var_density REAL);
+CREATE TABLE IF NOT EXISTS params (name TEXT PRIMARY KEY, value REAL);
+'''
+
+#position key of shots without one (raw runs), so they still have a row in positions
+NO_POSITION = -1e300
+
+class FolderWatch:
+    def __init__(self,folder,engine=None,state=None,settle=1.0):
+        #files modified less than settle seconds ago may still be being written and are left for the next update
+        self.folder = folder
+        self.own_engine = engine is None
+        self.engine = engine or AnalysisEngine(cache_path=None,buffer_size=0.2)
+        self.settle = settle
+        if state is None:
+            state = state_path(folder)
+            os.makedirs(STATE_DIR,exist_ok=True)
+        self.db = sqlite3.connect(state)
+        columns = [row[1] for row in self.db.execute('PRAGMA table_info(positions)')]
+        if columns and not 'bad' in columns:
+            #state from an older version, it is only a cache of the analysis so it is started again
+            logging.info('Old watch state in {}, reprocessing'.format(self.folder))
+            self.db.executescript('DROP TABLE shots; DROP TABLE positions; DROP TABLE params;')
+        self.db.executescript(SCHEMA)
+        self._check_params()
+
+    def _check_params(self):
+        #results made with other analysis parameters cannot be mixed with new ones
+        params = dict(self.engine.params)
+        saved = dict(self.db.execute('SELECT name,value FROM params'))
+        if saved and saved != params:
+            logging.info('Analysis parameters changed, reprocessing {}'.format(self.folder))
+            self.db.executescript('DELETE FROM shots; DELETE FROM positions; DELETE FROM params;')
+        self.db.executemany('INSERT OR REPLACE INTO params (name,value) VALUES (?,?)',params.items())
+        self.db.commit()
+
+    def _known(self):
+        return {name:(inode,mtime,size) for name,inode,mtime,size in self.db.execute('SELECT name,inode,mtime,size FROM shots')}
+
+    def pending(self):
+        #([(name,source,position,shot,(inode,mtime,size))] of shots that are new or changed since they were
+        #processed,[names of processed text files that are gone])
+        found = []
+        if shot_store.is_run(self.folder):
+            #run shots are appended and never rewritten, only indices past the last processed one are new,
+            #open_run only parses the index lines appended since the last update
+            done = self.db.execute("SELECT COUNT(*) FROM shots WHERE name LIKE 'run#%'").fetchone()[0]
+            run = shot_store.open_run(self.folder)
+            for i in range(done,len(run)):
+                position = run.meta[i].get('position')
+                found.append(('run#{}'.format(i),(run.base,i),None if position is None else float(position),i,(None,None,None)))
+            return found,[]
+        known = self._known()
+        now = time.time()
+        present = set()
+        for position,shot,path in shot_store.text_shots(self.folder):
+            name = os.path.basename(path)
+            present.add(name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            version = (st.st_ino,st.st_mtime,st.st_size)
+            if known.get(name) != version and now - st.st_mtime >= self.settle:
+                found.append((name,path,position,shot,version))
+        return found,[name for name in known if not name in present]
+
+    def _analyze(self,sources):
+        #a file that cannot be read gets nan parameters, it is kept so it is only retried once it changes
+        try:
+            return self.engine.analyze(sources)
+        except (OSError,ValueError):
+            rows = []
+            for source in sources:
+                try:
+                    rows.append(self.engine.analyze([source])[0])
+                except (OSError,ValueError) as e:
+                    logging.warning('Could not analyze {}: {}'.format(source,e))
+                    rows.append(np.full(4,np.nan))
+            return np.array(rows).reshape(-1,4)
+
+    def _add(self,position,row,sign):
+        #adds (sign 1) or takes back (sign -1) one shot's parameters from its position's sums,
+        #a shot without finite parameters is only counted in bad
+        key = NO_POSITION if position is None else position
+        self.db.execute('INSERT OR IGNORE INTO positions VALUES (?,0,0,0,0,0,0)',(key,))
+        if not np.all(np.isfinite(row)):
+            self.db.execute('UPDATE positions SET n=n+?,bad=bad+? WHERE position=?',(sign,sign,key))
+            return
+        T,std_T,density,std_density = (float(v) for v in row)
+        self.db.execute('UPDATE positions SET n=n+?,sum_T=sum_T+?,sum_var_T=sum_var_T+?,sum_density=sum_density+?,'
+                        'sum_var_density=sum_var_density+? WHERE position=?',
+                        (sign,sign*T,sign*std_T**2,sign*density,sign*std_density**2,key))
+
+    def _remove(self,name):
+        #takes a processed shot back out, returns whether there was one
+        old = self.db.execute('SELECT position,T,std_T,density,std_density FROM shots WHERE name=?',(name,)).fetchone()
+        if old is None:
+            return False
+        self._add(old[0],np.array(old[1:],dtype=float),-1)
+        self.db.execute('DELETE FROM shots WHERE name=?',(name,))
+        return True
+
+    def update(self):
+        #analyses the shots that arrived since the last call and drops those whose files were deleted,
+        #returns how many shots changed
+        found,gone = self.pending()
+        if not found and not gone:
+            return 0
+        for name in gone:
+            self._remove(name)
+        props = self._analyze([source for name,source,position,shot,version in found])
+        for (name,source,position,shot,version),row in zip(found,props):
+            #a rewritten file replaces its old contribution
+            self._remove(name)
+            self._add(position,row,1)
+            self.db.execute('INSERT OR REPLACE INTO shots VALUES (?,?,?,?,?,?,?,?,?,?)',
+                            (name,) + version + (position,shot) + tuple(float(v) for v in row))
+        self.db.execute('DELETE FROM positions WHERE n <= 0')
+        self.db.commit()
+        logging.info('{}: {} new shots, {} removed, {} in total'.format(self.folder,len(found),len(gone),len(self)))
+        return len(found) + len(gone)
+
+    def __len__(self):
+        return self.db.execute('SELECT COUNT(*) FROM shots').fetchone()[0]
+
+    def table(self):
+        #same rows as analyze2.summarize over every shot so far, (position,T,std T,density,std density),
+        #like summarize a position with a shot whose analysis failed is all nan
+        rows = self.db.execute('SELECT position,n,bad,sum_T,sum_var_T,sum_density,sum_var_density FROM positions '
+                               'WHERE position != ? ORDER BY position',(NO_POSITION,)).fetchall()
+        rows = np.array(rows,dtype=float).reshape(-1,7)
+        n = np.where(rows[:,2] > 0,np.nan,rows[:,1])
+        return np.column_stack([rows[:,0],rows[:,3]/n,np.sqrt(rows[:,4])/n,rows[:,5]/n,np.sqrt(rows[:,6])/n])
+
+    def shots(self):
+        #(shot,T,std T,density,std density) of every processed shot in shot order, like plot_over_time.time_table
+        rows = self.db.execute('SELECT shot,T,std_T,density,std_density FROM shots ORDER BY shot').fetchall()
+        return np.array(rows,dtype=float).reshape(-1,5)
+
+    def close(self):
+        self.db.close()
+        if self.own_engine:
+            self.engine.close()
+
+class LivePlot:
+    #density and temperature errorbars that are updated in place, mode 'scan' plots the per position table
+    #and 'time' every shot against its number
+    def __init__(self,watch,ax=None,mode='scan'):
+        import matplotlib.pyplot as plt
+        if ax is None:
+            fig,ax = plt.subplots(2,1,sharex=True)
+        self.watch = watch
+        self.ax = ax
+        self.mode = mode
+        #drawn once with a placeholder point, empty data would leave the bars without caps to update
+        self.bars = [a.errorbar([np.nan],[np.nan],[np.nan],fmt='o',capsize = 3) for a in ax]
+        ax[0].set_ylabel('Plasma Density [$cm^{-3}$]')
+        ax[1].set_ylabel('Electron Temperature [eV]')
+        ax[1].set_xlabel('Longitudinal Position' if mode == 'scan' else 'Shot Number')
+
+    def data(self):
+        return self.watch.table() if self.mode == 'scan' else self.watch.shots()
+
+    def refresh(self):
+        ntdata = self.data().T
+        for ax,bars,(y,err) in zip(self.ax,self.bars,((ntdata[3],ntdata[4]),(ntdata[1],ntdata[2]))):
+            x = ntdata[0]
+            line,caps,cols = bars
+            line.set_data(x,y)
+            caps[0].set_data(x,y - err)
+            caps[1].set_data(x,y + err)
+            cols[0].set_segments([[(a,b - e),(a,b + e)] for a,b,e in zip(x,y,err)])
+            ax.relim()
+            ax.autoscale_view()
+        self.ax[0].figure.canvas.draw_idle()
+
+def follow(folder,interval=2.0,mode='scan',engine=None,show=True,stop=None,on_update=None):
+    #updates and redraws every interval seconds until the window is closed or stop() returns True,
+    #on_update(watch) is called after every update that found new shots
+    watch = FolderWatch(folder,engine)
+    plot = None
+    if show:
+        import matplotlib.pyplot as plt
+        plot = LivePlot(watch,mode=mode)
+        plt.ion()
+    try:
+        while not (stop is not None and stop()):
+            if watch.update():
+                if plot is not None:
+                    plot.refresh()
+                if on_update is not None:
+                    on_update(watch)
+            if plot is not None:
+                if not plt.fignum_exists(plot.ax[0].figure.number):
+                    break
+                plt.pause(interval)
+            else:
+                time.sleep(interval)
+    finally:
+        watch.close()
+    return watch
+
+if __name__=='__main__':
+    import tempfile
+    import fake_visa
+    import scope
+
+    logging.basicConfig(level=logging.INFO)
+    #a scan that grows by one position of text shots between updates
+    folder = tempfile.mkdtemp()
+    fake = fake_visa.FakeScope(seed=0)
+    scope.configure(fake)
+    preamble = scope.read_preamble(fake)
+    watch = FolderWatch(folder,settle=0.0)
+    for position in np.arange(2,12,2.0):
+        for j in range(5):
+            np.savetxt(os.path.join(folder,'data_{}mm_{}.txt'.format(position,j)),scope.read_curve(fake,preamble).T)
+        t = time.perf_counter()
+        new = watch.update()
+        print('{} new shots analysed in {:.3f} s'.format(new,time.perf_counter() - t))
+    print(watch.table())
+    watch.close()
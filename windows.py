@@ -0,0 +1,201 @@
+#integration window detection for a batch of shots at once
+#a policy gives (start,stop) sample bounds per shot, stop exclusive and start == stop for no window,
+#so a shot's window is the contiguous view values[i,start[i]:stop[i]]
+#policies find it from a whole shot (bounds) or, when their signal is a Channel, from that channel and the
+#time axis alone (channel_bounds)
+#a policy that only takes some samples of its window (Threshold by count, like calc_plasma_prop's mask)
+#also gives a (...,npts) mask from select, the reductions then only see samples inside the window and the mask
+import numpy as np
+
+class Channel:
+    #a signal computed from one scope channel, called on shots it picks the channel out first
+    def __init__(self,index,transform):
+        self.index = index
+        self.transform = transform
+
+    def __call__(self,shots):
+        return self.transform(np.asarray(shots)[...,self.index,:])
+
+def _current(ch2):
+    return -100*ch2
+
+#discharge current (A) from the CH2 shunt, the signal the analysis scripts window on
+pulse_current = Channel(2,_current)
+trigger = Channel(2,np.abs)
+
+class Policy:
+    #subclasses define signal_bounds(s,t), the window from the signal s and the (...,npts) time axis t
+    def bounds(self,shots):
+        shots = np.asarray(shots)
+        return self.signal_bounds(self.signal(shots),shots[...,0,:])
+
+    def select(self,shots):
+        #(start,stop,mask), mask is None when every sample of the window is used
+        start,stop = self.bounds(shots)
+        return start,stop,None
+
+    def channel_bounds(self,channel,t):
+        #window from the raw channel the signal is computed from, e.g. calculate_plasma_params' trigger
+        if not isinstance(self.signal,Channel):
+            raise TypeError('{} windows on a signal that needs the whole shot'.format(type(self).__name__))
+        return self.signal_bounds(self.signal.transform(np.asarray(channel)),np.asarray(t))
+
+class Threshold(Policy):
+    #samples where signal > level, trimmed at both ends
+    #mode='count' drops int(l*trim) of the l samples above level off each end and uses only the samples above
+    #level in between (calc_plasma_prop), with no window when trim > 0 and that drops none, as its
+    #[cut:-cut] slice was empty then
+    #mode='span' uses every sample strictly inside the trimmed time between the first and last of them
+    #(calculate_plasma_params)
+    def __init__(self,level=40,trim=0.2,signal=pulse_current,mode='count'):
+        if not mode in ('count','span'):
+            raise ValueError('Unknown trim mode {}'.format(mode))
+        self.level = level
+        self.trim = trim
+        self.signal = signal
+        self.mode = mode
+
+    def signal_bounds(self,s,t):
+        above = s > self.level
+        if self.mode == 'span':
+            return span_bounds(above,t,self.trim)
+        return count_bounds(above,self.trim)
+
+    def select(self,shots):
+        if self.mode == 'span':
+            return Policy.select(self,shots)
+        shots = np.asarray(shots)
+        above = self.signal(shots) > self.level
+        start,stop = count_bounds(above,self.trim)
+        return start,stop,above
+
+class Hysteresis(Policy):
+    #starts where signal first goes above high and ends where it next drops below low, then trimmed by count
+    def __init__(self,high=40,low=20,trim=0.2,signal=pulse_current):
+        self.high = high
+        self.low = low
+        self.trim = trim
+        self.signal = signal
+
+    def signal_bounds(self,s,t=None):
+        npts = s.shape[-1]
+        start = first(s > self.high,npts)
+        after = np.arange(npts) >= start[...,None]
+        stop = first(after & (s < self.low),npts)
+        length = np.maximum(stop - start,0)
+        cut = (length*self.trim).astype(int)
+        return start + cut,np.maximum(stop - cut,start + cut)
+
+class Edge(Policy):
+    #between the steepest rise and the steepest fall of the signal, for pulses without a fixed level
+    def __init__(self,trim=0.2,signal=pulse_current,smooth=1):
+        self.trim = trim
+        self.signal = signal
+        self.smooth = smooth
+
+    def signal_bounds(self,s,t=None):
+        s = np.asarray(s,dtype=float)
+        if self.smooth > 1:
+            kernel = np.ones(self.smooth)/self.smooth
+            s = np.apply_along_axis(np.convolve,-1,s,kernel,mode='same')
+        d = np.diff(s,axis=-1)
+        rise = np.argmax(d,axis=-1) + 1
+        fall = np.argmin(d,axis=-1) + 1
+        length = np.maximum(fall - rise,0)
+        cut = (length*self.trim).astype(int)
+        start = rise + cut
+        return start,np.maximum(fall - cut,start)
+
+def first(mask,default):
+    #index of the first True along the last axis, default where there is none
+    index = np.argmax(mask,axis=-1)
+    return np.where(mask[...,0] | (index > 0),index,default)
+
+def count_bounds(above,trim):
+    #from the first to the last of the above-threshold samples left after dropping int(l*trim) off each end of l,
+    #empty when trim > 0 and that drops none
+    count = np.cumsum(above,axis=-1)
+    l = count[...,-1]
+    cut = (l*trim).astype(int)
+    npts = above.shape[-1]
+    #the (cut+1)th sample above threshold starts the window, the (l-cut)th ends it
+    start = np.sum(count <= cut[...,None],axis=-1)
+    stop = np.sum(count < (l - cut)[...,None],axis=-1) + 1
+    empty = (l - 2*cut <= 0) | ((cut == 0) & (trim > 0))
+    start = np.where(empty,0,np.minimum(start,npts))
+    return start,np.where(empty,0,np.minimum(stop,npts))
+
+def span_bounds(above,t,trim):
+    #samples strictly inside (t_i + trim*L, t_f - trim*L) of the first and last sample above threshold
+    npts = above.shape[-1]
+    any_above = np.any(above,axis=-1)
+    i = first(above,0)
+    f = npts - 1 - first(above[...,::-1],npts - 1)
+    t_i = np.take_along_axis(t,i[...,None],-1)
+    t_f = np.take_along_axis(t,f[...,None],-1)
+    length = t_f - t_i
+    start = np.sum(t <= t_i + trim*length,axis=-1)
+    stop = np.sum(t < t_f - trim*length,axis=-1)
+    start = np.where(any_above,start,0)
+    return start,np.where(any_above,np.maximum(stop,start),0)
+
+def crop(start,stop):
+    #columns every window falls inside, so a batch only has to be converted over these
+    if not np.size(start) or np.all(stop <= start):
+        return slice(0,0)
+    used = stop > start
+    return slice(int(np.min(start[used])),int(np.max(stop[used])))
+
+def window_sum(values,start,stop):
+    #sum of values[...,start:stop] per row, 0 for empty windows
+    #one np.add.reduceat over the flattened rows, alternately summing a window and the gap up to the next one,
+    #so samples outside the windows are never added and nan or huge values there cannot reach the sums
+    values = np.asarray(values)
+    shape = values.shape[:-1]
+    flat = values.reshape(-1)
+    start = np.broadcast_to(start,shape)
+    stop = np.broadcast_to(stop,shape)
+    if not flat.size:
+        return np.zeros(shape)
+    offset = values.shape[-1]*np.arange(int(np.prod(shape))).reshape(shape)
+    index = np.stack([start + offset,stop + offset],axis=-1).ravel()
+    #the last window may end at the end of the array, where reduceat's last segment ends anyway
+    if index[-1] == flat.size:
+        index = index[:-1]
+    #only empty windows can start at the end, their sums are replaced below
+    index = np.minimum(index,flat.size - 1)
+    sums = np.add.reduceat(flat,index)[::2].reshape(shape)
+    return np.where(stop > start,sums,0)
+
+def window_count(start,stop,mask=None):
+    #number of samples each window uses
+    if mask is None:
+        return stop - start
+    return window_sum(mask.astype(float),start,stop).astype(int)
+
+def window_mean_std(values,start,stop,mask=None):
+    #mean and std of values[...,start:stop] per row, only where mask is set when one is given,
+    #nan for empty windows
+    n = window_count(start,stop,mask).astype(float)
+    with np.errstate(divide='ignore',invalid='ignore',over='ignore'):
+        if mask is not None:
+            values = np.where(mask,values,0.0)
+        mean = window_sum(values,start,stop) / n
+        #second pass about the mean keeps the variance accurate for large, nearly constant values
+        deviation = values - mean[...,None]
+        np.square(deviation,out=deviation)
+        if mask is not None:
+            deviation[~mask] = 0.0
+        var = window_sum(deviation,start,stop) / n
+    return mean,np.sqrt(var)
+
+def samples(start,stop,mask=None):
+    #index of one shot's window, a slice when it uses every sample in it
+    if mask is None:
+        return slice(int(start),int(stop))
+    return int(start) + np.flatnonzero(mask[int(start):int(stop)])
+
+def views(values,start,stop):
+    #contiguous per shot views of the windows
+    for row,a,b in zip(values,start,stop):
+        yield row[a:b]